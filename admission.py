@@ -0,0 +1,188 @@
+"""Admission control: separate, adaptive concurrency limits per endpoint class.
+
+Every request is admitted into the pool of its endpoint's class before the
+view runs. Planning (itineraries, AI streams) is expensive and upstream-
+bound, so a burst of it used to hold every worker thread while lists of
+countries and the health check waited behind it. Each class now has its
+own limit, and a request over its class's limit gets an immediate 503
+with Retry-After instead of queueing. Health checks are never limited.
+
+The limits adapt to observed latency (the gradient scheme of Netflix's
+concurrency-limits): a short moving average of request latency is compared
+with a long one. While they agree the limit grows by about sqrt(limit);
+when recent requests slow down - upstreams are struggling, or the worker is
+CPU bound - it shrinks in proportion, down to the class's minimum.
+
+Each class's limit stays within its bounds, and planning and downloads
+together are held to HEAVY_SLOTS - the worker's threads minus
+RESERVED_THREADS - so slow requests can never occupy every thread while
+health checks and cheap lookups queue behind them.
+
+A planning pool close to its limit is "degraded": /generate, the multi-city
+planner and the AI stream then skip the LLM and serve catalog tips, which
+takes a fraction of the time and keeps the pool draining. DEGRADED_MODE=1
+forces this.
+"""
+import math
+import os
+import threading
+import time
+
+# Endpoint (Flask view name) -> class; anything not listed is 'light'
+ENDPOINT_CLASSES = {
+    'health': 'health',
+    'generate': 'planning',
+    'generate_multi_city': 'planning',
+    'stream_ai_content': 'planning',
+    'export_saved_trip': 'downloads',
+    'saved_trip_tiles': 'downloads',
+}
+
+# Request threads per worker (gunicorn.conf.py); RESERVED_THREADS of them are kept for light and health requests
+WORKER_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+RESERVED_THREADS = int(os.environ.get('RESERVED_THREADS', 2))
+# Planning and downloads hold a thread for seconds; together they never take the reserved ones
+HEAVY_CLASSES = ('planning', 'downloads')
+HEAVY_SLOTS = max(1, WORKER_THREADS - RESERVED_THREADS)
+
+PLANNING_CONCURRENCY = min(int(os.environ.get('PLANNING_CONCURRENCY', 4)), HEAVY_SLOTS)
+
+# Starting limit and the bounds it adapts within, per class; classes absent here are unlimited
+POOL_LIMITS = {
+    'light': {'limit': 32, 'min_limit': 8, 'max_limit': 128},
+    'planning': {'limit': PLANNING_CONCURRENCY, 'min_limit': 1, 'max_limit': HEAVY_SLOTS},
+    'downloads': {'limit': min(4, HEAVY_SLOTS), 'min_limit': 1, 'max_limit': HEAVY_SLOTS},
+}
+
+# Share of the planning limit in use at which new plans are made without AI content
+DEGRADE_AT = float(os.environ.get('DEGRADE_AT', 0.75))
+DEGRADED_MODE = os.environ.get('DEGRADED_MODE', '0') == '1'
+
+SHORT_WINDOW = 10
+LONG_WINDOW = 500
+# Recent latency may run this much above the long-term average before the limit shrinks
+TOLERANCE = 1.5
+
+
+class AdaptiveLimiter:
+    """Non-blocking concurrency limit that follows the latency of the requests it admits"""
+
+    def __init__(self, name, limit, min_limit=1, max_limit=None, smoothing=0.2):
+        self.name = name
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit
+        self.smoothing = smoothing
+        self.inflight = 0
+        self.short_latency = None
+        self.long_latency = None
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.inflight >= int(self.limit):
+                self.rejected += 1
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self, latency=None):
+        """Free a slot; latency (seconds) of a completed request feeds the limit"""
+        with self._lock:
+            self.inflight -= 1
+            if latency is not None:
+                self._update(latency)
+
+    def _update(self, latency):
+        if self.long_latency is None:
+            self.short_latency = self.long_latency = latency
+            return
+        self.short_latency += (latency - self.short_latency) / SHORT_WINDOW
+        self.long_latency += (latency - self.long_latency) / LONG_WINDOW
+        gradient = max(0.5, min(1.0, TOLERANCE * self.long_latency / self.short_latency))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit + (target - self.limit) * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def pressure(self):
+        """Share of the current limit in use"""
+        return self.inflight / int(self.limit)
+
+    def retry_after(self):
+        """Whole seconds a rejected client should wait: about one recent request's latency"""
+        return max(1, math.ceil(self.short_latency or 1))
+
+    def snapshot(self):
+        return {'limit': int(self.limit), 'inflight': self.inflight, 'rejected': self.rejected,
+                'latency_ms': round((self.short_latency or 0) * 1000, 1)}
+
+
+class Permit:
+    """An admitted request's slot in its class's pool (and in the shared heavy slots)"""
+
+    def __init__(self, limiter, degraded=False, on_release=None):
+        self.limiter = limiter
+        self.degraded = degraded
+        self.on_release = on_release
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self, completed=True):
+        """Give the slot back; only completed requests count towards the latency the limit follows"""
+        if self.released or self.limiter is None:
+            return
+        self.released = True
+        self.limiter.release(time.monotonic() - self.started if completed else None)
+        if self.on_release:
+            self.on_release()
+
+
+class AdmissionController:
+    """One AdaptiveLimiter per endpoint class"""
+
+    def __init__(self, endpoint_classes=ENDPOINT_CLASSES, pool_limits=POOL_LIMITS,
+                 degrade_at=DEGRADE_AT, degraded_mode=DEGRADED_MODE, heavy_slots=HEAVY_SLOTS):
+        self.endpoint_classes = endpoint_classes
+        self.limiters = {name: AdaptiveLimiter(name, **limits) for name, limits in pool_limits.items()}
+        self.degrade_at = degrade_at
+        self.degraded_mode = degraded_mode
+        self.heavy_slots = heavy_slots
+        self.heavy_inflight = 0
+        self._lock = threading.Lock()
+
+    def limiter_for(self, endpoint):
+        return self.limiters.get(self.endpoint_classes.get(endpoint, 'light'))
+
+    def admit(self, endpoint):
+        """A Permit for a request to endpoint, or None when its class is saturated"""
+        limiter = self.limiter_for(endpoint)
+        if limiter is None:
+            return Permit(None)
+        # Pressure is read before taking the slot, so a lone request is never degraded
+        degraded = self.degraded_mode or limiter.pressure() >= self.degrade_at
+        heavy = limiter.name in HEAVY_CLASSES
+        if heavy and not self._take_heavy_slot():
+            limiter.rejected += 1
+            return None
+        if not limiter.try_acquire():
+            if heavy:
+                self._free_heavy_slot()
+            return None
+        return Permit(limiter, degraded, self._free_heavy_slot if heavy else None)
+
+    def _take_heavy_slot(self):
+        with self._lock:
+            if self.heavy_inflight >= self.heavy_slots:
+                return False
+            self.heavy_inflight += 1
+            return True
+
+    def _free_heavy_slot(self):
+        with self._lock:
+            self.heavy_inflight -= 1
+
+    def snapshot(self):
+        report = {name: limiter.snapshot() for name, limiter in self.limiters.items()}
+        report['heavy'] = {'slots': self.heavy_slots, 'inflight': self.heavy_inflight}
+        return report
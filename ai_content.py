@@ -0,0 +1,266 @@
+"""AI content orchestration for itineraries.
+
+Tips and destination insights used to be two chat completions sent back to
+back with nearly the same context. The orchestrator asks for both in one
+JSON-mode completion under a fixed token budget, and concurrent requests
+with the same trip context share a single in-flight completion. Parts the
+model fails to deliver come back as None so callers apply their fallbacks.
+
+For streaming, the same content is requested as plain text - the overview
+first, then one tip per line - and StreamParser turns the deltas into
+events as they arrive. trip_content_from_corpus() serves precomputed
+content from insights_corpus.py, tailored by a much shorter completion.
+"""
+import hashlib
+import json
+import os
+import logging
+
+from cache import SingleFlight
+from request_context import RequestCancelled, check_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Six ~80 character tips plus a ~120 word overview, with room for the JSON wrapping
+COMBINED_MAX_TOKENS = int(os.environ.get('AI_MAX_TOKENS', 400))
+# Free-text preferences are trimmed so a long aiPrompt cannot blow up the prompt
+PREFERENCE_CHAR_LIMIT = 200
+TIP_COUNT = 6
+TIPS_MARKER = 'TIPS:'
+BUDGET_LABELS = ('budget', 'mid-range', 'luxury')
+# Tailoring precomputed content to preferences asks for a couple of extra tips and sentences only
+PERSONALIZE_MAX_TOKENS = 160
+PERSONAL_TIP_COUNT = 2
+
+SYSTEM_PROMPT = (
+    "You are a local travel expert and travel writer. Give practical, specific advice that "
+    "saves money and enhances the trip, tailored to the traveller's preferences. Reply with JSON only."
+)
+
+TIPS_SPEC = (f"{TIP_COUNT} practical tips, each one actionable sentence under 80 characters starting with an emoji, "
+             "covering money-saving, local food (respecting any dietary restrictions), transport, etiquette, "
+             "activities matching the interests and style, and safety")
+INSIGHTS_SPEC = ("an inspiring overview under 120 words covering what makes the destination special, "
+                 "the best time to visit and why, and one must-try local experience tourists often miss")
+
+
+_flights = SingleFlight()
+
+
+def budget_label(daily_budget):
+    if daily_budget < 75:
+        return "budget"
+    if daily_budget < 150:
+        return "mid-range"
+    return "luxury"
+
+
+def _trimmed(text):
+    text = (text or '').strip()
+    return text if len(text) <= PREFERENCE_CHAR_LIMIT else text[:PREFERENCE_CHAR_LIMIT].rstrip() + '...'
+
+
+def _preference_lines(preferences):
+    preferences = preferences or {}
+    labels = (('travelStyle', 'Travel style'), ('interests', 'Special interests'),
+              ('dietary', 'Dietary restrictions'), ('aiPrompt', 'Special instructions'))
+    return [f"{label}: {_trimmed(preferences[key])}" for key, label in labels if preferences.get(key)]
+
+
+def _trip_context(days, people, budget, country, city, preferences=None):
+    context = f"Trip to {city}, {country}: {days} days, {people} people, {budget_label(budget / days)} budget."
+    return '\n'.join([context] + _preference_lines(preferences))
+
+
+def build_messages(days, people, budget, country, city, preferences=None):
+    """Chat messages asking for tips and insights as one JSON object"""
+    prompt = _trip_context(days, people, budget, country, city, preferences) + f"""
+
+Return a JSON object with:
+- "tips": exactly {TIPS_SPEC}
+- "insights": {INSIGHTS_SPEC}"""
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_base_messages(country, city, label):
+    """Chat messages for a city's preference-free content at one budget level (offline corpus)"""
+    prompt = f"""Trip to {city}, {country} on a {label} budget.
+
+Return a JSON object with:
+- "tips": exactly {TIPS_SPEC}
+- "insights": {INSIGHTS_SPEC}"""
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_personalize_messages(base, city, country, preferences):
+    """Chat messages asking for a short preference-specific addition to precomputed content"""
+    preference_lines = '\n'.join(_preference_lines(preferences))
+    prompt = f"""Destination: {city}, {country}
+Traveller preferences:
+{preference_lines}
+
+Existing overview: {base['insights']}
+
+Return a JSON object with:
+- "tips": exactly {PERSONAL_TIP_COUNT} extra tips for these preferences, each under 80 characters starting with an emoji
+- "insights": one or two sentences to add to the overview for these preferences"""
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_stream_messages(days, people, budget, country, city, preferences=None):
+    """Chat messages for a streamed answer: insights first, then one tip per line"""
+    prompt = _trip_context(days, people, budget, country, city, preferences) + f"""
+
+First write {INSIGHTS_SPEC}, as a single paragraph.
+Then write a line containing only {TIPS_MARKER} followed by {TIPS_SPEC}, one per line, without numbering."""
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT.replace(" Reply with JSON only.", " Reply in plain text.")},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_content(content):
+    """(tips, insights) from a completion; either is None when missing or malformed"""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        # Some models wrap the object in prose or code fences
+        start, end = (content or '').find('{'), (content or '').rfind('}')
+        try:
+            data = json.loads(content[start:end + 1]) if start != -1 and end > start else {}
+        except ValueError:
+            data = {}
+    if not isinstance(data, dict):
+        data = {}
+
+    tips = [tip.strip() for tip in data.get('tips') or [] if isinstance(tip, str) and len(tip.strip()) > 10]
+    insights = data.get('insights')
+    insights = insights.strip() if isinstance(insights, str) and insights.strip() else None
+    return tips[:TIP_COUNT] or None, insights
+
+
+def generate_trip_content(complete, days, people, budget, country, city, preferences=None):
+    """Tips and insights from one completion, shared by identical concurrent requests.
+
+    complete(messages, max_tokens, temperature, json_mode) returns the
+    completion text. Errors propagate so the caller can fall back; a
+    follower whose leader was cancelled makes the completion itself.
+    """
+    messages = build_messages(days, people, budget, country, city, preferences)
+    key = hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def run():
+        content = complete(messages, max_tokens=COMBINED_MAX_TOKENS, temperature=0.7, json_mode=True)
+        tips, insights = parse_content(content)
+        if tips is None or insights is None:
+            logger.warning(f"Combined completion for {city} was incomplete (tips: {bool(tips)}, insights: {bool(insights)})")
+        return tips, insights
+
+    try:
+        return _flights.do(key, run)
+    except RequestCancelled:
+        # The shared completion belonged to a request that was cancelled; this one is still live
+        check_cancelled()
+        return run()
+
+
+class StreamParser:
+    """Turns streamed completion text into insights deltas and complete tips.
+
+    feed() takes each text delta as it arrives and returns events:
+    ('insights', {'text': delta}) while the overview streams, then
+    ('tip', {'index': i, 'text': tip}) as each tip line completes.
+    """
+
+    def __init__(self):
+        self.section = 'insights'
+        self.buffer = ''
+        self.insights = ''
+        self.tips = []
+
+    def feed(self, delta):
+        self.buffer += delta or ''
+        events = []
+        if self.section == 'insights':
+            marker = self.buffer.find(TIPS_MARKER)
+            if marker == -1:
+                # Hold back enough text to recognise a marker split across deltas
+                ready = self.buffer[:max(0, len(self.buffer) - len(TIPS_MARKER))]
+                self.buffer = self.buffer[len(ready):]
+                events.extend(self._insights(ready))
+                return events
+            events.extend(self._insights(self.buffer[:marker]))
+            self.buffer = self.buffer[marker + len(TIPS_MARKER):]
+            self.section = 'tips'
+
+        *lines, self.buffer = self.buffer.split('\n')
+        for line in lines:
+            events.extend(self._tip(line))
+        return events
+
+    def finish(self):
+        """Events for whatever text is left once the stream ends"""
+        remainder, self.buffer = self.buffer, ''
+        if self.section == 'insights':
+            return self._insights(remainder)
+        return self._tip(remainder)
+
+    def _insights(self, text):
+        if not text:
+            return []
+        if not self.insights:
+            text = text.lstrip()
+        self.insights += text
+        return [('insights', {'text': text})] if text else []
+
+    def _tip(self, line):
+        tip = line.strip().lstrip('-*').strip()
+        if len(tip) <= 10 or len(self.tips) >= TIP_COUNT:
+            return []
+        self.tips.append(tip)
+        return [('tip', {'index': len(self.tips) - 1, 'text': tip})]
+
+
+def has_preferences(preferences):
+    return any((value or '').strip() for value in (preferences or {}).values())
+
+
+def trip_content_from_corpus(corpus, complete, days, people, budget, country, city, preferences=None):
+    """(tips, insights) built from precomputed content, or None when the corpus has no entry.
+
+    Without preferences the stored content is returned as is; with them one
+    short completion adds tailored tips and sentences (complete may be None
+    to skip that). A failed personalization still returns the base content.
+    """
+    if corpus is None:
+        return None
+    base = corpus.get(country, city, budget_label(budget / days))
+    if not base:
+        return None
+    if not has_preferences(preferences) or complete is None:
+        return list(base['tips']), base['insights']
+
+    try:
+        content = complete(build_personalize_messages(base, city, country, preferences),
+                           max_tokens=PERSONALIZE_MAX_TOKENS, temperature=0.7, json_mode=True)
+        extra_tips, addition = parse_content(content)
+    except Exception as e:
+        logger.warning(f"Personalizing precomputed content for {city} failed: {e}")
+        extra_tips, addition = None, None
+
+    tips = (extra_tips or [])[:PERSONAL_TIP_COUNT] + [tip for tip in base['tips'] if tip not in (extra_tips or [])]
+    insights = f"{base['insights']} {addition}" if addition else base['insights']
+    return tips[:TIP_COUNT], insights
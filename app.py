@@ -1,12 +1,39 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, session, stream_with_context
 import requests
 import json
 import random
 from datetime import datetime, timedelta
 import os
 from urllib.parse import quote
-from functools import wraps
+from functools import partial, wraps
+import copy
 import logging
+import itertools
+
+from admission import AdmissionController
+from ai_content import (COMBINED_MAX_TOKENS, TIP_COUNT, StreamParser, build_stream_messages, generate_trip_content,
+                        trip_content_from_corpus)
+from auth_tokens import TOKEN_TTL, authority_from_env, looks_like_token
+from cache import TTLCache
+from catalog import get_catalog
+from compact import select_fields, to_compact
+from budget_optimizer import optimize_selection, place_cost
+from cost_model import estimate_trip_costs, get_cost_table, place_price_tables
+from exports import EXPORT_FORMATS, export_trip, iter_chunks, reset_export_pool
+from hotel_ranking import CANDIDATES_PER_RESULT, HOTELS_SHOWN, rank_hotels
+from insights_corpus import get_insights_corpus, reset_corpus
+from llm_providers import provider_from_env
+from multi_city import MAX_CITIES, build_legs, choose_cities, plan_route, transfer
+from place_planner import CallCounter, acquire_places
+from place_scoring import place_value, rank_places
+from request_context import (REQUEST_DEADLINE, ContextExecutor, RequestCancelled, cancellable_sleep, check_cancelled,
+                             client_socket, request_scope, upstream_timeout, wait_result)
+from response_cache import PlanCache, data_versions, plan_key
+from scheduler import schedule_itinerary
+from serialization import FastJSONProvider, compress_response
+from tile_packs import PACK_FORMATS, get_tile_pack_builder, reset_tile_pack_builder
+from trip_store import TripStore
+from trip_editor import extend_trip, fixed_cost, new_planning, replace_day, reroll_place, update_totals
 
 # Load environment variables
 try:
@@ -17,37 +44,98 @@ except ImportError:
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
+# None without a real signing key: session tokens are then neither issued nor accepted
+token_authority = authority_from_env(app.secret_key)
+app.json = FastJSONProvider(app)
+app.after_request(compress_response)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+if token_authority is None:
+    logger.warning("Neither AUTH_TOKEN_KEYS nor a real SECRET_KEY is set; session tokens are disabled")
 
 # API Keys - ALL FROM ENVIRONMENT VARIABLES (NO HARDCODED KEYS)
 GOOGLE_PLACES_API_KEY = os.environ.get('GOOGLE_PLACES_API_KEY')
 OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY') 
-OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 
-# Configure OpenAI - Compatible with both old and new versions
-try:
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
-    USE_NEW_OPENAI = True
-    logger.info("Using new OpenAI client")
-except ImportError:
-    try:
-        import openai
-        openai.api_key = OPENAI_API_KEY
-        client = None
-        USE_NEW_OPENAI = False
-        logger.info("Using legacy OpenAI client")
-    except ImportError:
-        client = None
-        USE_NEW_OPENAI = False
-        logger.warning("OpenAI not available")
+# Upstream base URLs - overridable so benchmarks can target mock_upstream.py
+OPENWEATHER_BASE_URL = os.environ.get('OPENWEATHER_BASE_URL', 'http://api.openweathermap.org')
+GOOGLE_PLACES_BASE_URL = os.environ.get('GOOGLE_PLACES_BASE_URL', 'https://maps.googleapis.com')
+RESTCOUNTRIES_BASE_URL = os.environ.get('RESTCOUNTRIES_BASE_URL', 'https://restcountries.com')
+# Tips and insights from one JSON-mode completion instead of two separate calls
+AI_COMBINED_COMPLETION = os.environ.get('AI_COMBINED_COMPLETION', '1') != '0'
+
+UPSTREAM_WORKERS = int(os.environ.get('UPSTREAM_WORKERS', 8))
+
+# Tips and insights come from the configured LLM provider (see llm_providers.py).
+# It is built on first use: importing the OpenAI SDK is the slowest part of starting a worker
+_llm_provider = None
+
+def get_llm_provider():
+    global _llm_provider
+    if _llm_provider is None:
+        _llm_provider = provider_from_env()
+        logger.info(f"LLM provider: {_llm_provider.name} ({_llm_provider.model})")
+    return _llm_provider
+
+def ai_available():
+    return get_llm_provider().available
+
+# Keep-alive connections to the upstream APIs, one pool per worker process
+_http_session = None
+
+def http_session():
+    global _http_session
+    if _http_session is None:
+        http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=UPSTREAM_WORKERS * 2)
+        http.mount('http://', adapter)
+        http.mount('https://', adapter)
+        _http_session = http
+    return _http_session
+
+def warm_up():
+    """Load shared read-only data; called in the gunicorn master before workers fork"""
+    get_catalog()
+    get_cost_table()
+
+def reset_after_fork():
+    """Drop clients whose sockets and threads must not be shared between processes"""
+    global _llm_provider, _http_session
+    _llm_provider = None
+    _http_session = None
+    reset_corpus()
+    reset_export_pool()
+    reset_tile_pack_builder()
+
+# Google Places paging - a next_page_token only becomes valid after a short delay
+PLACES_MAX_PAGES = 3
+PLACES_PAGE_TOKEN_DELAY = float(os.environ.get('PLACES_PAGE_TOKEN_DELAY', 2.0))
+PLACE_DETAILS_FIELDS = 'place_id,geometry,opening_hours,photos'
+# rank_hotels picks HOTELS_SHOWN from a pool of candidates; fetching only that many left nothing to choose between
+HOTELS_NEEDED = HOTELS_SHOWN * CANDIDATES_PER_RESULT
+# Ranked candidates kept per planned slot, for the optimizer's budget trade-offs and later edits
+CANDIDATE_SLACK = 2
+place_details_cache = TTLCache(max_entries=20000, default_ttl=24 * 3600)
+
+# Shared pool for concurrent upstream calls (searches, page-token waits, details, AI);
+# its threads start on first submit, so a preloaded master forks without any
+upstream_executor = ContextExecutor(max_workers=UPSTREAM_WORKERS)
+# Multi-city legs wait on upstream work themselves, so they never run on the upstream pool
+MULTI_CITY_WORKERS = int(os.environ.get('MULTI_CITY_WORKERS', 4))
+leg_executor = ContextExecutor(max_workers=MULTI_CITY_WORKERS)
+location_cache = TTLCache(max_entries=4096, default_ttl=7 * 24 * 3600)
+plan_cache = PlanCache()
+admission = AdmissionController()
 
 # In-memory storage (replace with proper database in production)
 users_db = {}
-trips_db = {}
+# Users known only from their signed tokens, for this worker's usage counters; least recently
+# seen users are dropped (and rebuilt from their next token) once it is full or a token lifetime passes
+TOKEN_USERS_MAX = int(os.environ.get('TOKEN_USERS_MAX', 10000))
+token_users = TTLCache(max_entries=TOKEN_USERS_MAX, default_ttl=TOKEN_TTL)
+trips_db = TripStore()
 
 # Subscription tiers and limits
 SUBSCRIPTION_LIMITS = {
@@ -73,20 +161,17 @@ class User:
         self.trips_this_month = 0
         self.total_trips = 0
 
+def has_feature(user, feature):
+    features = SUBSCRIPTION_LIMITS.get(user.subscription_tier, SUBSCRIPTION_LIMITS['free'])['features']
+    return feature in features or 'all_features' in features
+
 def get_fallback_tips():
     """Fallback tips when AI is unavailable"""
-    return [
-        "🏠 Book accommodations in advance for better rates",
-        "🚇 Use public transportation to save money",
-        "🍽️ Try local street food for authentic flavors",
-        "💳 Notify your bank before traveling",
-        "📱 Download offline maps before you go",
-        "🎫 Look for free walking tours and city passes"
-    ]
+    return list(get_catalog().fallback_tips)
 
-def generate_ai_enhanced_tips(days, people, budget, country, city, preferences=None):
+def generate_ai_enhanced_tips(days, people, budget, country, city, preferences=None, counter=None):
     """Generate AI-enhanced travel recommendations using compatible OpenAI API"""
-    if not OPENAI_API_KEY:
+    if not ai_available():
         return get_fallback_tips()
     
     daily_budget = budget / days
@@ -127,31 +212,10 @@ def generate_ai_enhanced_tips(days, people, budget, country, city, preferences=N
     """
     
     try:
-        if USE_NEW_OPENAI and client:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a local travel expert with insider knowledge. Give practical, specific advice that saves money and enhances the travel experience based on the user's preferences."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            ai_tips = response.choices[0].message.content
-        elif not USE_NEW_OPENAI and OPENAI_API_KEY:
-            import openai
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a local travel expert with insider knowledge. Give practical, specific advice that saves money and enhances the travel experience based on the user's preferences."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            ai_tips = response.choices[0].message.content
-        else:
-            return get_fallback_tips()
+        ai_tips = chat_completion([
+            {"role": "system", "content": "You are a local travel expert with insider knowledge. Give practical, specific advice that saves money and enhances the travel experience based on the user's preferences."},
+            {"role": "user", "content": prompt}
+        ], max_tokens=500, temperature=0.7, counter=counter)
         
         tips_list = [tip.strip() for tip in ai_tips.split('\n') if tip.strip() and len(tip.strip()) > 10]
         
@@ -164,10 +228,10 @@ def generate_ai_enhanced_tips(days, people, budget, country, city, preferences=N
         logger.error(f"OpenAI API error: {e}")
         return get_fallback_tips()
 
-def get_ai_destination_insights(city, country, preferences=None):
+def get_ai_destination_insights(city, country, preferences=None, counter=None):
     """Get AI-powered destination insights with fallback"""
-    if not OPENAI_API_KEY:
-        return f"Discover the unique charm of {city}, a destination filled with rich culture, amazing food, and unforgettable experiences."
+    if not ai_available():
+        return default_insights(city)
     
     base_prompt = f"""
     Provide a brief, engaging overview of {city}, {country} for travelers. Include:
@@ -187,52 +251,58 @@ def get_ai_destination_insights(city, country, preferences=None):
     prompt = base_prompt + "\n\nKeep it under 120 words, inspiring, and informative."
     
     try:
-        if USE_NEW_OPENAI and client:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a travel writer creating inspiring yet informative destination descriptions. Focus on what makes each place unique and tailor to user preferences."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.8
-            )
-            return response.choices[0].message.content.strip()
-        elif not USE_NEW_OPENAI and OPENAI_API_KEY:
-            import openai
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a travel writer creating inspiring yet informative destination descriptions. Focus on what makes each place unique and tailor to user preferences."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.8
-            )
-            return response.choices[0].message.content.strip()
-        else:
-            return f"Discover the unique charm of {city}, a destination filled with rich culture, amazing food, and unforgettable experiences."
+        return chat_completion([
+            {"role": "system", "content": "You are a travel writer creating inspiring yet informative destination descriptions. Focus on what makes each place unique and tailor to user preferences."},
+            {"role": "user", "content": prompt}
+        ], max_tokens=200, temperature=0.8, counter=counter).strip()
         
     except Exception as e:
         logger.error(f"OpenAI API error: {e}")
-        return f"Discover the unique charm of {city}, a destination filled with rich culture, amazing food, and unforgettable experiences."
+        return default_insights(city)
+
+def chat_completion(messages, max_tokens, temperature=0.7, json_mode=False, counter=None):
+    """Text of one chat completion from the configured provider"""
+    check_cancelled()
+    content = get_llm_provider().complete(messages, max_tokens, temperature, json_mode)
+    if counter:
+        counter.add('ai_completion')
+    return content
+
+def stream_chat_completion(messages, max_tokens, temperature=0.7, counter=None):
+    """Yield the text deltas of a streamed chat completion as they arrive"""
+    check_cancelled()
+    if counter:
+        counter.add('ai_completion')
+    yield from get_llm_provider().stream(messages, max_tokens, temperature)
+
+def default_insights(city):
+    return f"Discover the unique charm of {city}, a destination filled with rich culture, amazing food, and unforgettable experiences."
+
+def get_ai_trip_content(days, people, budget, country, city, preferences=None, counter=None):
+    """Tips and insights for an itinerary, precomputed where possible, with the usual fallbacks"""
+    complete = partial(chat_completion, counter=counter) if ai_available() else None
+    
+    # Catalog cities come from the insights corpus, with at most a short personalization completion
+    content = trip_content_from_corpus(get_insights_corpus(), complete, days, people, budget, country, city, preferences)
+    if content:
+        tips, insights = content
+    elif complete is None:
+        return get_fallback_tips(), default_insights(city)
+    else:
+        try:
+            tips, insights = generate_trip_content(complete, days, people, budget, country, city, preferences)
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            tips, insights = None, None
+    
+    tips = list(tips or [])
+    while len(tips) < 6:
+        tips.extend(get_fallback_tips())
+    return tips[:6], insights or default_insights(city)
 
 def get_hardcoded_coordinates(city):
     """Hardcoded coordinates for popular cities"""
-    city_coordinates = {
-        'miami': {'lat': 25.7617, 'lon': -80.1918, 'name': 'Miami', 'country': 'US', 'state': 'Florida'},
-        'new orleans': {'lat': 29.9511, 'lon': -90.0715, 'name': 'New Orleans', 'country': 'US', 'state': 'Louisiana'},
-        'new york': {'lat': 40.7128, 'lon': -74.0060, 'name': 'New York', 'country': 'US', 'state': 'New York'},
-        'los angeles': {'lat': 34.0522, 'lon': -118.2437, 'name': 'Los Angeles', 'country': 'US', 'state': 'California'},
-        'chicago': {'lat': 41.8781, 'lon': -87.6298, 'name': 'Chicago', 'country': 'US', 'state': 'Illinois'},
-        'london': {'lat': 51.5074, 'lon': -0.1278, 'name': 'London', 'country': 'GB', 'state': 'England'},
-        'paris': {'lat': 48.8566, 'lon': 2.3522, 'name': 'Paris', 'country': 'FR', 'state': 'Île-de-France'},
-        'tokyo': {'lat': 35.6762, 'lon': 139.6503, 'name': 'Tokyo', 'country': 'JP', 'state': 'Tokyo'},
-        'sydney': {'lat': -33.8688, 'lon': 151.2093, 'name': 'Sydney', 'country': 'AU', 'state': 'New South Wales'},
-        'berlin': {'lat': 52.5200, 'lon': 13.4050, 'name': 'Berlin', 'country': 'DE', 'state': 'Berlin'},
-        'nassau': {'lat': 25.0443, 'lon': -77.3504, 'name': 'Nassau', 'country': 'BS', 'state': 'New Providence'},
-        'nicholls town': {'lat': 25.4167, 'lon': -78.0167, 'name': 'Nicholls Town', 'country': 'BS', 'state': 'Andros'}
-    }
+    city_coordinates = get_catalog().city_coordinates
     
     city_variations = [
         city.lower().strip(),
@@ -244,12 +314,22 @@ def get_hardcoded_coordinates(city):
     for variation in city_variations:
         if variation in city_coordinates:
             logger.info(f"✅ Using hardcoded coordinates for '{variation}'")
-            return city_coordinates[variation]
+            return dict(city_coordinates[variation])
     
     logger.error(f"❌ Could not find coordinates for '{city}'")
     return None
 
 def get_location_coordinates(city, country):
+    """Coordinates for a city, cached so multi-city routes and their legs geocode each city once"""
+    cache_key = (city.strip().lower(), country.strip().lower())
+    location = location_cache.get(cache_key)
+    if location is None:
+        location = lookup_location(city, country)
+        if location:
+            location_cache.set(cache_key, location)
+    return dict(location) if location else None
+
+def lookup_location(city, country):
     """Enhanced location lookup with better error handling"""
     logger.info(f"Looking up coordinates for: '{city}', '{country}'")
     
@@ -263,8 +343,8 @@ def get_location_coordinates(city, country):
     for query in queries:
         try:
             logger.info(f"Trying OpenWeatherMap query: '{query}'")
-            geo_url = f"http://api.openweathermap.org/geo/1.0/direct?q={quote(query)}&limit=10&appid={OPENWEATHER_API_KEY}"
-            response = requests.get(geo_url, timeout=10)
+            geo_url = f"{OPENWEATHER_BASE_URL}/geo/1.0/direct?q={quote(query)}&limit=10&appid={OPENWEATHER_API_KEY}"
+            response = http_session().get(geo_url, timeout=upstream_timeout(10))
             
             if response.status_code == 200:
                 data = response.json()
@@ -292,8 +372,8 @@ def get_weather_info(lat, lon):
         return None
         
     try:
-        weather_url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
-        response = requests.get(weather_url, timeout=10)
+        weather_url = f"{OPENWEATHER_BASE_URL}/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
+        response = http_session().get(weather_url, timeout=upstream_timeout(10))
         
         if response.status_code == 200:
             data = response.json()
@@ -308,77 +388,252 @@ def get_weather_info(lat, lon):
     
     return None
 
-def search_places_nearby(lat, lon, place_type, radius=15000):
-    """Search for places using Google Places API"""
+def format_place(place):
+    """Convert a raw Places API result into the dict shape used by the itinerary"""
+    location = place.get('geometry', {}).get('location', {})
+    return {
+        'name': place.get('name', ''),
+        'rating': place.get('rating', 0),
+        'user_ratings_total': place.get('user_ratings_total', 0),
+        'price_level': place.get('price_level', 2),
+        'vicinity': place.get('vicinity', ''),
+        'place_id': place.get('place_id', ''),
+        'google_maps_url': f"https://www.google.com/maps/place/?q=place_id:{place.get('place_id', '')}" if place.get('place_id') else '',
+        'types': place.get('types', []),
+        'lat': location.get('lat'),
+        'lng': location.get('lng')
+    }
+
+def fetch_places_page(params, counter=None):
+    """Fetch one Nearby Search page; returns (results, next_page_token, status)"""
+    places_url = f"{GOOGLE_PLACES_BASE_URL}/maps/api/place/nearbysearch/json"
+    if counter:
+        counter.add('nearby_search')
+    response = http_session().get(places_url, params=params, timeout=upstream_timeout(10))
+    if response.status_code != 200:
+        return [], None, f"HTTP {response.status_code}"
+    data = response.json()
+    return data.get('results', []), data.get('next_page_token'), data.get('status', 'OK')
+
+def search_places_nearby(lat, lon, place_type, radius=15000, max_results=15, counter=None):
+    """Search for places using Google Places API, following next_page_token until max_results.
+
+    A place_type of None runs an untyped search whose results are classified by the caller.
+    """
     if not GOOGLE_PLACES_API_KEY:
         logger.warning(f"Google Places API key not configured, returning empty list for {place_type}")
         return []
         
+    places = []
     try:
-        places_url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json"
         params = {
             'location': f"{lat},{lon}",
             'radius': radius,
-            'type': place_type,
             'key': GOOGLE_PLACES_API_KEY
         }
+        if place_type:
+            params['type'] = place_type
         
-        response = requests.get(places_url, params=params, timeout=10)
+        results, next_page_token, status = fetch_places_page(params, counter)
+        failed = status not in ('OK', 'ZERO_RESULTS')
+        places.extend(format_place(place) for place in results)
         
-        if response.status_code == 200:
-            data = response.json()
-            places = []
-            
-            for place in data.get('results', [])[:15]:
-                place_info = {
-                    'name': place.get('name', ''),
-                    'rating': place.get('rating', 0),
-                    'user_ratings_total': place.get('user_ratings_total', 0),
-                    'price_level': place.get('price_level', 2),
-                    'vicinity': place.get('vicinity', ''),
-                    'place_id': place.get('place_id', ''),
-                    'google_maps_url': f"https://www.google.com/maps/place/?q=place_id:{place.get('place_id', '')}" if place.get('place_id') else '',
-                    'types': place.get('types', [])
-                }
-                places.append(place_info)
-            
-            return places
+        # Extra pages only cost latency when the trip needs more places than one page holds
+        pages = 1
+        while not failed and next_page_token and len(places) < max_results and pages < PLACES_MAX_PAGES:
+            results, next_page_token, status = fetch_next_places_page(next_page_token, counter)
+            # A lost follow-up page leaves the results short, which must not pass for an exhausted area
+            failed = status not in ('OK', 'ZERO_RESULTS')
+            places.extend(format_place(place) for place in results)
+            pages += 1
+        if failed and counter:
+            counter.add_failure()
+        
+        if pages > 1:
+            logger.info(f"Fetched {pages} pages of {place_type} results ({len(places)} places)")
     except Exception as e:
         logger.error(f"Error searching places: {e}")
+        if counter:
+            counter.add_failure()
+    
+    return places[:max_results]
+
+def fetch_next_places_page(page_token, counter=None):
+    """Fetch a follow-up page, waiting out the delay before a new page token becomes valid.
+    
+    Returns (results, next_page_token, status) like fetch_places_page.
+    """
+    params = {'pagetoken': page_token, 'key': GOOGLE_PLACES_API_KEY}
+    delay = PLACES_PAGE_TOKEN_DELAY
+    for _ in range(3):
+        cancellable_sleep(delay)
+        results, next_page_token, status = fetch_places_page(params, counter)
+        if status != 'INVALID_REQUEST':
+            return results, next_page_token, status
+        delay *= 2
+    return [], None, 'INVALID_REQUEST'
+
+def get_place_details(place_id, fields=PLACE_DETAILS_FIELDS, counter=None):
+    """Fetch field-masked Place Details (geometry, opening hours, photos)"""
+    if not GOOGLE_PLACES_API_KEY or not place_id:
+        return None
+    
+    cache_key = (place_id, fields)
+    cached = place_details_cache.get(cache_key)
+    if cached is not None:
+        return cached
+        
+    try:
+        if counter:
+            counter.add('place_details')
+        details_url = f"{GOOGLE_PLACES_BASE_URL}/maps/api/place/details/json"
+        params = {'place_id': place_id, 'fields': fields, 'key': GOOGLE_PLACES_API_KEY}
+        response = http_session().get(details_url, params=params, timeout=upstream_timeout(10))
+        
+        if response.status_code == 200:
+            result = response.json().get('result') or {}
+            location = result.get('geometry', {}).get('location', {})
+            details = {
+                'lat': location.get('lat'),
+                'lng': location.get('lng'),
+                'opening_hours': result.get('opening_hours'),
+                'photos': [photo.get('photo_reference') for photo in result.get('photos', [])[:3] if photo.get('photo_reference')]
+            }
+            place_details_cache.set(cache_key, details)
+            return details
+    except Exception as e:
+        logger.error(f"Error getting place details for {place_id}: {e}")
     
-    return []
+    return None
 
-def search_hotels_nearby(lat, lon, radius=15000):
+def submit_place_details(place_ids, counter=None):
+    """Start concurrent details lookups; returns {place_id: future}"""
+    return {
+        place_id: upstream_executor.submit(get_place_details, place_id, PLACE_DETAILS_FIELDS, counter)
+        for place_id in dict.fromkeys(place_ids) if place_id
+    }
+
+def apply_place_details(targets, detail_futures):
+    """Merge finished details lookups into the itinerary dicts that reference them"""
+    for target in targets:
+        future = detail_futures.get(target.get('place_id'))
+        if not future:
+            continue
+        try:
+            details = wait_result(future)
+        except Exception as e:
+            logger.error(f"Place details lookup failed: {e}")
+            continue
+        if not details:
+            continue
+        for key, value in details.items():
+            if value:
+                target[key] = value
+
+def search_hotels_nearby(lat, lon, radius=15000, max_results=15, counter=None):
     """Search for hotels using Google Places API"""
-    return search_places_nearby(lat, lon, 'lodging', radius)
+    return search_places_nearby(lat, lon, 'lodging', radius, max_results, counter)
+
+# Booking sites by URL template; {query} is the URL-encoded "<place> <city>"
+BOOKING_LINK_TEMPLATES = {
+    'viator': "https://www.viator.com/searchResults/all?text={query}",
+    'getyourguide': "https://www.getyourguide.com/s/?q={query}",
+    'expedia': "https://www.expedia.com/things-to-do/search?location={query}",
+    'tripadvisor': "https://www.tripadvisor.com/Search?q={query}"
+}
 
 def get_booking_links(place_name, city):
     """Generate booking/ticket links for attractions"""
     search_query = f"{place_name} {city}".replace(' ', '%20')
     
+    return {site: template.format(query=search_query) for site, template in BOOKING_LINK_TEMPLATES.items()}
+
+def estimate_daily_budget(country, budget_level, city=None, people=1):
+    """Estimate daily budget based on location and level"""
+    trip = {'country': country, 'city': city, 'days': 1, 'people': people, 'budget_level': budget_level}
+    return estimate_trip_costs([trip])[0]['total'][0]
+
+def describe_activity(activity, city, booking_links=True):
+    activity_info = {
+        'name': activity['name'],
+        'rating': activity.get('rating', 0),
+        'reviews_count': activity.get('user_ratings_total', 0),
+        'address': activity.get('vicinity', ''),
+        'types': activity.get('types', []),
+        'price_level': activity.get('price_level', 2),
+        'place_id': activity.get('place_id', ''),
+        'lat': activity.get('lat'),
+        'lng': activity.get('lng')
+    }
+    if booking_links:
+        activity_info['booking_links'] = get_booking_links(activity['name'], city)
+    return activity_info
+
+def describe_restaurant(restaurant):
     return {
-        'viator': f"https://www.viator.com/searchResults/all?text={search_query}",
-        'getyourguide': f"https://www.getyourguide.com/s/?q={search_query}",
-        'expedia': f"https://www.expedia.com/things-to-do/search?location={search_query}",
-        'tripadvisor': f"https://www.tripadvisor.com/Search?q={search_query}"
+        'name': restaurant['name'],
+        'rating': restaurant.get('rating', 0),
+        'reviews_count': restaurant.get('user_ratings_total', 0),
+        'price_level': restaurant.get('price_level', 2),
+        'address': restaurant.get('vicinity', ''),
+        'place_id': restaurant.get('place_id', ''),
+        'lat': restaurant.get('lat'),
+        'lng': restaurant.get('lng')
     }
 
-def estimate_daily_budget(country, budget_level):
-    """Estimate daily budget based on location and level"""
-    base_costs = {'budget': 50, 'mid': 100, 'luxury': 200}
-    country_multipliers = {'US': 1.2, 'United States': 1.2, 'GB': 1.1, 'United Kingdom': 1.1, 'DE': 0.9, 'Germany': 0.9, 'BS': 1.3, 'Bahamas': 1.3}
+def cost_day(day_plan, planning):
+    """Set a day_plan's estimated_cost and cost_breakdown from the places it holds"""
+    price_tables = planning['price_tables']
+    people = planning['people']
+    day = day_plan['day']
+    activities_cost = sum(place_cost(activity, price_tables['activities'], people) for activity in day_plan['activities'])
+    restaurant = day_plan['restaurant']
+    dinner_cost = place_cost(restaurant, price_tables['meals'], people) if restaurant else 0
+    day_plan['estimated_cost'] = round(fixed_cost(planning, day) + activities_cost + dinner_cost, 2)
+    day_plan['cost_breakdown'] = {
+        'lodging': round(planning['lodging'][day - 1], 2),
+        'food': round(planning['fixed_food'][day - 1] + dinner_cost, 2),
+        'activities': round(activities_cost, 2)
+    }
+    return day_plan
+
+def build_day_plan(day, activities, restaurant, planning):
+    """One day_plan, dated from the trip's start, with its cost breakdown; schedules are added afterwards"""
+    return cost_day({
+        "day": day,
+        "date": (datetime.strptime(planning['start_date'], "%Y-%m-%d") + timedelta(days=day-1)).strftime("%Y-%m-%d"),
+        "activities": [describe_activity(activity, planning['city'], planning['booking_links']) for activity in activities],
+        "restaurant": describe_restaurant(restaurant) if restaurant else None
+    }, planning)
+
+def schedule_days(day_plans, planning, counter=None):
+    """Fetch details for the days' places and (re)build their time-slot schedules.
     
-    multiplier = country_multipliers.get(country, 1.0)
-    return base_costs[budget_level] * multiplier
+    Scheduling may move activities between the days, so their costs are
+    recomputed afterwards.
+    """
+    planned_places = [activity for day in day_plans for activity in day['activities']]
+    planned_places += [day['restaurant'] for day in day_plans if day['restaurant']]
+    detail_futures = submit_place_details((place.get('place_id') for place in planned_places), counter)
+    apply_place_details(planned_places, detail_futures)
+    schedule_itinerary(day_plans, origin=planning['origin'])
+    for day_plan in day_plans:
+        cost_day(day_plan, planning)
+
+def generate_real_itinerary(days, people, total_budget, country, city, start_date=None, preferences=None, booking_links=True, planning=None, include_ai=True):
+    """Generate a comprehensive AI-enhanced travel itinerary
 
-def generate_real_itinerary(days, people, total_budget, country, city, start_date=None, preferences=None):
-    """Generate a comprehensive AI-enhanced travel itinerary"""
+    booking_links=False skips the per-activity links for compact responses.
+    include_ai=False leaves tips and insights to /api/ai/stream.
+    A planning dict, when given, is filled with the candidate pools and cost
+    context that trip edits reuse.
+    """
     
     location_info = get_location_coordinates(city, country)
     if not location_info:
         return {"error": f"Could not find location information for {city}, {country}. Please try a different city or check spelling."}
     
-    weather_info = get_weather_info(location_info['lat'], location_info['lon'])
+    lat, lon = location_info['lat'], location_info['lon']
     daily_budget = total_budget / days
     
     if daily_budget < 75:
@@ -390,89 +645,99 @@ def generate_real_itinerary(days, people, total_budget, country, city, start_dat
     
     logger.info(f"Searching for places near {city}...")
     
-    attractions = search_places_nearby(location_info['lat'], location_info['lon'], 'tourist_attraction')
-    restaurants = search_places_nearby(location_info['lat'], location_info['lon'], 'restaurant')
-    museums = search_places_nearby(location_info['lat'], location_info['lon'], 'museum')
-    hotels = search_hotels_nearby(location_info['lat'], location_info['lon'])
+    # Two activities and one restaurant per day, plus a little slack for ranking
+    needs = {'activities': days * 2 + 4, 'restaurants': days + 2, 'hotels': HOTELS_NEEDED}
+    counter = CallCounter()
+    
+    # Weather and AI content run concurrently with place acquisition
+    weather_future = upstream_executor.submit(get_weather_info, lat, lon)
+    if not include_ai:
+        ai_futures = []
+    elif AI_COMBINED_COMPLETION:
+        ai_futures = [upstream_executor.submit(get_ai_trip_content, days, people, total_budget, country, city, preferences, counter)]
+    else:
+        ai_futures = [
+            upstream_executor.submit(generate_ai_enhanced_tips, days, people, total_budget, country, city, preferences, counter),
+            upstream_executor.submit(get_ai_destination_insights, city, country, preferences, counter)
+        ]
+    
+    places, acquisition = acquire_places(lat, lon, needs, search_places_nearby, upstream_executor, counter=counter)
+    attractions = places['attractions']
+    restaurants = places['restaurants']
+    museums = places['museums']
+    hotels = places['hotels']
     
     logger.info(f"Found {len(attractions)} attractions, {len(restaurants)} restaurants, {len(hotels)} hotels")
     
     check_in_date = start_date or (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
     check_out_date = (datetime.strptime(check_in_date, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
     
-    ai_tips = generate_ai_enhanced_tips(days, people, total_budget, country, city, preferences)
-    ai_insights = get_ai_destination_insights(city, country, preferences)
-    
     # Create sample activities if no real data available
     if not attractions and not restaurants:
         logger.info("No places found via API, creating sample itinerary")
-        sample_activities = [
-            {'name': 'Local Beach', 'rating': 4.5, 'user_ratings_total': 100, 'vicinity': 'Waterfront area', 'types': ['tourist_attraction']},
-            {'name': 'Historic Downtown', 'rating': 4.2, 'user_ratings_total': 85, 'vicinity': 'City center', 'types': ['tourist_attraction']},
-            {'name': 'Local Market', 'rating': 4.0, 'user_ratings_total': 60, 'vicinity': 'Market district', 'types': ['tourist_attraction']}
-        ]
-        sample_restaurants = [
-            {'name': 'Local Seafood Restaurant', 'rating': 4.3, 'user_ratings_total': 120, 'vicinity': 'Harbor area', 'price_level': 2},
-            {'name': 'Traditional Cafe', 'rating': 4.1, 'user_ratings_total': 90, 'vicinity': 'Main street', 'price_level': 1},
-            {'name': 'Beachside Grill', 'rating': 4.4, 'user_ratings_total': 150, 'vicinity': 'Beach front', 'price_level': 3}
-        ]
+        sample_places = get_catalog().sample_places
+        sample_activities = [dict(place, types=list(place['types'])) for place in sample_places['activities']]
+        sample_restaurants = [dict(place) for place in sample_places['restaurants']]
         attractions = sample_activities
         restaurants = sample_restaurants
     
-    all_activities = attractions + museums
-    all_activities.sort(key=lambda x: x.get('rating', 0), reverse=True)
-    restaurants.sort(key=lambda x: x.get('rating', 0), reverse=True)
-    hotels.sort(key=lambda x: x.get('rating', 0), reverse=True)
+    # Bayesian ratings, preference boosts and type diversity decide the candidate pools;
+    # the slack beyond what the plan needs is kept for the budget optimizer and trip edits
+    all_activities = rank_places(attractions + museums, needs['activities'] * CANDIDATE_SLACK, preferences)
+    restaurants = rank_places(restaurants, needs['restaurants'] * CANDIDATE_SLACK, preferences, diversity=False)
+    
+    # Lodging and non-dinner meals are fixed per day; the rest of the budget buys places
+    cost_request = {
+        'country': country,
+        'city': location_info['name'],
+        'days': days,
+        'people': people,
+        'budget_level': budget_category,
+        # Nights are priced on the weekdays the days are dated with
+        'start_date': check_in_date
+    }
+    trip_costs = estimate_trip_costs([cost_request])[0]
+    day_context = new_planning(
+        candidates={'activities': all_activities, 'restaurants': restaurants},
+        cost_request=cost_request,
+        trip_costs=trip_costs,
+        price_tables=place_price_tables(country, location_info['name']),
+        origin={'lat': lat, 'lng': lon},
+        city=city,
+        start_date=check_in_date,
+        booking_links=booking_links
+    )
+    if planning is not None:
+        planning.update(day_context)
+    selection = optimize_selection(
+        all_activities, restaurants,
+        activity_slots=days * 2, meal_slots=days,
+        budget=total_budget - sum(fixed_cost(day_context, day) for day in range(1, days + 1)),
+        people=people, price_tables=day_context['price_tables'], value=place_value
+    )
     
     itinerary = []
-    used_activities = set()
-    used_restaurants = set()
+    selected_activities = iter(selection['activities'])
+    selected_restaurants = iter(selection['restaurants'])
     
     for day in range(1, days + 1):
-        available_activities = [a for a in all_activities if a['name'] not in used_activities]
-        day_activities = []
-        
-        activities_count = min(2, len(available_activities))
-        if activities_count > 0:
-            selected = available_activities[:activities_count]
-            for activity in selected:
-                activity_info = {
-                    'name': activity['name'],
-                    'rating': activity.get('rating', 0),
-                    'reviews_count': activity.get('user_ratings_total', 0),
-                    'address': activity.get('vicinity', ''),
-                    'types': activity.get('types', []),
-                    'booking_links': get_booking_links(activity['name'], city)
-                }
-                day_activities.append(activity_info)
-                used_activities.add(activity['name'])
-        
-        available_restaurants = [r for r in restaurants if r['name'] not in used_restaurants]
-        restaurant_info = None
-        
-        if available_restaurants:
-            selected_restaurant = available_restaurants[0]
-            restaurant_info = {
-                'name': selected_restaurant['name'],
-                'rating': selected_restaurant.get('rating', 0),
-                'reviews_count': selected_restaurant.get('user_ratings_total', 0),
-                'price_level': selected_restaurant.get('price_level', 2),
-                'address': selected_restaurant.get('vicinity', '')
-            }
-            used_restaurants.add(selected_restaurant['name'])
-        
-        estimated_cost = estimate_daily_budget(location_info['country'], budget_category)
-        if people > 2:
-            estimated_cost *= (people * 0.85)
-        
-        day_plan = {
-            "day": day,
-            "date": (datetime.now() + timedelta(days=day-1)).strftime("%Y-%m-%d"),
-            "activities": day_activities,
-            "restaurant": restaurant_info,
-            "estimated_cost": round(estimated_cost, 2)
-        }
-        itinerary.append(day_plan)
+        day_activities = list(itertools.islice(selected_activities, 2))
+        itinerary.append(build_day_plan(day, day_activities, next(selected_restaurants, None), day_context))
+    
+    # Details are fetched only for places that made it into the plan, overlapping the AI calls
+    schedule_days(itinerary, day_context, counter)
+    hotels = rank_hotels(hotels, itinerary, budget_category)
+    
+    weather_info = wait_result(weather_future)
+    if not include_ai:
+        ai_tips, ai_insights = [], None
+    elif AI_COMBINED_COMPLETION:
+        ai_tips, ai_insights = wait_result(ai_futures[0])
+    else:
+        ai_tips, ai_insights = (wait_result(future) for future in ai_futures)
+    
+    upstream_calls = counter.as_dict()
+    logger.info(f"Places API calls for {city}: {upstream_calls} via {acquisition['strategy']}")
     
     total_estimated_cost = sum(day["estimated_cost"] for day in itinerary)
     
@@ -493,7 +758,8 @@ def generate_real_itinerary(days, people, total_budget, country, city, start_dat
         "destination": f"{location_info['name']}, {location_info['country']}",
         "location_info": location_info,
         "weather_info": weather_info,
-        "ai_powered": True,
+        # Fallback content is not AI content, whichever path produced it
+        "ai_powered": include_ai and ai_insights != default_insights(city),
         "ai_insights": ai_insights,
         "preferences_used": preferences_summary,
         "total_days": days,
@@ -502,17 +768,115 @@ def generate_real_itinerary(days, people, total_budget, country, city, start_dat
         "daily_budget": round(daily_budget, 2),
         "budget_category": budget_category.title(),
         "money_saving_tips": ai_tips,
+        "ai_streaming": not include_ai,
         "itinerary": itinerary,
         "total_estimated_cost": round(total_estimated_cost, 2),
         "budget_status": "Within Budget" if total_estimated_cost <= total_budget else "Over Budget",
         "attractions_found": len(attractions),
         "restaurants_found": len(restaurants),
         "museums_found": len(museums),
-        "hotels": hotels[:10] if hotels else [],
+        "hotels": hotels,
+        "places_strategy": acquisition['strategy'],
+        "upstream_calls": upstream_calls,
         "check_in_date": check_in_date,
         "check_out_date": check_out_date
     }
 
+def generate_multi_city_itinerary(days, people, total_budget, country, cities=None, start_date=None, preferences=None,
+                                  booking_links=True, include_ai=True):
+    """A trip through several cities of one country; each leg is a single-city itinerary.
+    
+    Without cities, the country's most popular catalog cities are used. Legs
+    are planned concurrently on leg_executor and their days numbered and
+    dated continuously along the route. Without include_ai every leg gets
+    the catalog tips and insights instead of AI content.
+    """
+    chosen = choose_cities(get_catalog().popular_cities.get(country, ()), days, cities)
+    if not chosen:
+        return {"error": f"No cities known for {country}. Please choose the cities to visit."}
+    
+    route = plan_route(country, chosen, days, get_location_coordinates, upstream_executor)
+    if not route:
+        return {"error": f"Could not find location information for the cities in {country}. Please check spelling."}
+    start_date = start_date or (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
+    
+    def build_leg(city, leg_days, leg_budget, leg_start, first_day):
+        leg = generate_real_itinerary(leg_days, people, leg_budget, country, city, start_date=leg_start,
+                                      preferences=preferences, booking_links=booking_links, include_ai=include_ai)
+        if not include_ai and "error" not in leg:
+            degrade_itinerary(leg, city)
+        # Days are dated from leg_start already; only their numbers continue along the route
+        for index, day_plan in enumerate(leg.get('itinerary', [])):
+            day_plan['day'] = first_day + index
+        leg['first_day'] = first_day
+        return leg
+    
+    logger.info(f"Multi-city route for {country}: {[(city, leg_days) for city, _, leg_days in route]}")
+    legs = build_legs(route, total_budget, start_date, build_leg, leg_executor)
+    if all("error" in leg for leg in legs):
+        return legs[0]
+    
+    total_estimated_cost = sum(leg.get('total_estimated_cost', 0) for leg in legs)
+    return {
+        "destination": f"{' → '.join(city for city, _, _ in route)}, {country}",
+        "multi_city": True,
+        "route": [{'city': city, 'days': leg_days, 'lat': location['lat'], 'lon': location['lon']}
+                  for city, location, leg_days in route],
+        "transfers": [transfer(origin, destination) for (_, origin, _), (_, destination, _) in zip(route, route[1:])],
+        "legs": legs,
+        "total_days": days,
+        "total_people": people,
+        "budget": total_budget,
+        "daily_budget": round(total_budget / days, 2),
+        "total_estimated_cost": round(total_estimated_cost, 2),
+        "budget_status": "Within Budget" if total_estimated_cost <= total_budget else "Over Budget",
+        "check_in_date": start_date,
+        "check_out_date": (datetime.strptime(start_date, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+    }
+
+@app.before_request
+def admit_request():
+    """Fast 503 when the pool for this endpoint's class is full (see admission.py)"""
+    permit = admission.admit(request.endpoint)
+    if permit is None:
+        limiter = admission.limiter_for(request.endpoint)
+        logger.warning(f"Shed {request.path}: {limiter.name} pool at its limit of {int(limiter.limit)}")
+        response = jsonify({"error": "We're busy planning other trips. Please try again in a moment."})
+        response.headers['Retry-After'] = str(limiter.retry_after())
+        return response, 503
+    g.admission_permit = permit
+
+@app.teardown_request
+def release_admission(error=None):
+    permit = g.pop('admission_permit', None)
+    if permit is not None:
+        permit.release(completed=error is None)
+
+def planning_degraded():
+    """True when this request was admitted while the planning pool was nearly full"""
+    permit = g.get('admission_permit')
+    return bool(permit and permit.degraded)
+
+def degrade_itinerary(itinerary, city):
+    """Give an itinerary planned without AI content the catalog tips and insights"""
+    itinerary.update(money_saving_tips=get_fallback_tips(), ai_insights=default_insights(city),
+                     ai_powered=False, ai_streaming=False, degraded=True)
+
+def with_request_deadline(view):
+    """Run a planning view under a request deadline, abandoning its upstream work once the client has gone"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with request_scope(REQUEST_DEADLINE, client_socket(request.environ)):
+            try:
+                return view(*args, **kwargs)
+            except RequestCancelled as e:
+                if e.reason == 'deadline':
+                    logger.warning(f"{request.path} gave up after {REQUEST_DEADLINE}s")
+                    return jsonify({"error": "Planning this trip took too long. Please try again."}), 504
+                logger.info(f"Client left {request.path}; abandoned its upstream work")
+                return jsonify({"error": "Request cancelled"}), 499
+    return wrapper
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -522,17 +886,10 @@ def get_countries():
     """Get list of countries - SIMPLIFIED VERSION"""
     logger.info("Countries API endpoint called")
     
-    fallback_countries = [
-        "United States", "United Kingdom", "Canada", "Australia", "Germany",
-        "France", "Japan", "Italy", "Spain", "Mexico", "Brazil", "India",
-        "Thailand", "Netherlands", "Sweden", "Norway", "Denmark", "Switzerland",
-        "Austria", "Belgium", "Portugal", "Greece", "Poland", "Czech Republic",
-        "Hungary", "Ireland", "Finland", "New Zealand", "South Korea", "Singapore",
-        "Bahamas", "Jamaica", "Costa Rica", "Chile", "Argentina", "Colombia"
-    ]
+    fallback_countries = get_catalog().fallback_countries
     
     try:
-        response = requests.get('https://restcountries.com/v3.1/all?fields=name', timeout=3)
+        response = http_session().get(f'{RESTCOUNTRIES_BASE_URL}/v3.1/all?fields=name', timeout=3)
         if response.status_code == 200:
             data = response.json()
             countries = []
@@ -549,178 +906,14 @@ def get_countries():
         logger.warning(f"REST Countries API failed: {e}")
     
     logger.info(f"Using fallback countries: {len(fallback_countries)} countries")
-    return jsonify(sorted(fallback_countries))
+    return jsonify(fallback_countries)
 
 @app.route('/api/cities/<country>')
 def get_cities_for_country(country):
     """Get cities for a country - SIMPLIFIED AND BULLETPROOF"""
     logger.info(f"Getting cities for country: {country}")
     
-    popular_cities = {
-        "United States": [
-            "New York", "Los Angeles", "Chicago", "Houston", "Phoenix", "Philadelphia",
-            "San Antonio", "San Diego", "Dallas", "San Jose", "Austin", "Jacksonville",
-            "San Francisco", "Columbus", "Charlotte", "Fort Worth", "Indianapolis",
-            "Seattle", "Denver", "Boston", "Detroit", "Nashville", "Memphis", "Portland",
-            "Las Vegas", "Miami", "Atlanta", "New Orleans", "Tampa", "Orlando", "Honolulu"
-        ],
-        "United Kingdom": [
-            "London", "Birmingham", "Manchester", "Glasgow", "Liverpool", "Leeds",
-            "Sheffield", "Edinburgh", "Bristol", "Cardiff", "Belfast", "Leicester",
-            "Brighton", "Newcastle", "Nottingham", "Cambridge", "Oxford", "Bath", "York"
-        ],
-        "Bahamas": [
-            "Nassau", "Freeport", "Nicholls Town", "Alice Town", "Clarence Town", 
-            "Cockburn Town", "Cooper's Town", "Dunmore Town", "Governor's Harbour",
-            "High Rock", "Marsh Harbour", "Matthew Town", "Rock Sound", "George Town"
-        ],
-        "Canada": [
-            "Toronto", "Montreal", "Vancouver", "Calgary", "Edmonton", "Ottawa", 
-            "Winnipeg", "Quebec City", "Hamilton", "Victoria", "Halifax", "Saskatoon",
-            "Regina", "St. John's", "Fredericton", "Charlottetown"
-        ],
-        "Germany": [
-            "Berlin", "Hamburg", "Munich", "Cologne", "Frankfurt", "Stuttgart",
-            "Düsseldorf", "Leipzig", "Dortmund", "Essen", "Bremen", "Dresden",
-            "Hanover", "Nuremberg", "Duisburg", "Bochum"
-        ],
-        "France": [
-            "Paris", "Marseille", "Lyon", "Toulouse", "Nice", "Nantes", "Montpellier",
-            "Strasbourg", "Bordeaux", "Lille", "Rennes", "Reims", "Toulon", "Grenoble",
-            "Dijon", "Angers", "Villeurbanne", "Le Mans"
-        ],
-        "Japan": [
-            "Tokyo", "Osaka", "Kyoto", "Yokohama", "Nagoya", "Sapporo", "Fukuoka",
-            "Kobe", "Hiroshima", "Sendai", "Kawasaki", "Chiba", "Nara", "Kanazawa",
-            "Shizuoka", "Kumamoto", "Okayama", "Hamamatsu"
-        ],
-        "Italy": [
-            "Rome", "Milan", "Naples", "Turin", "Palermo", "Genoa", "Bologna",
-            "Florence", "Venice", "Verona", "Catania", "Bari", "Messina", "Padua",
-            "Trieste", "Brescia", "Parma", "Prato"
-        ],
-        "Spain": [
-            "Madrid", "Barcelona", "Valencia", "Seville", "Zaragoza", "Málaga",
-            "Murcia", "Palma", "Bilbao", "Alicante", "Granada", "Córdoba", "Vigo",
-            "Gijón", "L'Hospitalet", "Vitoria-Gasteiz", "A Coruña", "Elche"
-        ],
-        "Australia": [
-            "Sydney", "Melbourne", "Brisbane", "Perth", "Adelaide", "Gold Coast",
-            "Newcastle", "Canberra", "Sunshine Coast", "Wollongong", "Hobart", "Geelong",
-            "Townsville", "Cairns", "Darwin", "Toowoomba"
-        ],
-        "Mexico": [
-            "Mexico City", "Guadalajara", "Monterrey", "Puebla", "Tijuana", "León",
-            "Juárez", "Torreón", "Querétaro", "San Luis Potosí", "Mérida", "Mexicali",
-            "Aguascalientes", "Acapulco", "Cuernavaca", "Saltillo"
-        ],
-        "Brazil": [
-            "São Paulo", "Rio de Janeiro", "Brasília", "Salvador", "Fortaleza", "Belo Horizonte",
-            "Manaus", "Curitiba", "Recife", "Goiânia", "Belém", "Porto Alegre",
-            "Guarulhos", "Campinas", "São Luís", "São Gonçalo"
-        ],
-        "Argentina": [
-            "Buenos Aires", "Córdoba", "Rosario", "Mendoza", "La Plata", "Tucumán",
-            "Mar del Plata", "Salta", "Santa Fe", "San Juan", "Resistencia", "Santiago del Estero",
-            "Corrientes", "Posadas", "Neuquén", "Bahía Blanca"
-        ],
-        "Chile": [
-            "Santiago", "Valparaíso", "Concepción", "La Serena", "Antofagasta", "Temuco",
-            "Rancagua", "Talca", "Arica", "Chillán", "Iquique", "Los Ángeles"
-        ],
-        "Colombia": [
-            "Bogotá", "Medellín", "Cali", "Barranquilla", "Cartagena", "Cúcuta",
-            "Soledad", "Ibagué", "Bucaramanga", "Soacha", "Santa Marta", "Villavicencio"
-        ],
-        "Peru": [
-            "Lima", "Arequipa", "Trujillo", "Chiclayo", "Piura", "Iquitos",
-            "Cusco", "Chimbote", "Huancayo", "Tacna", "Juliaca", "Ica"
-        ],
-        "Netherlands": [
-            "Amsterdam", "Rotterdam", "The Hague", "Utrecht", "Eindhoven", "Tilburg",
-            "Groningen", "Almere", "Breda", "Nijmegen", "Enschede", "Haarlem"
-        ],
-        "Switzerland": [
-            "Zurich", "Geneva", "Basel", "Lausanne", "Bern", "Winterthur",
-            "Lucerne", "St. Gallen", "Lugano", "Biel", "Thun", "Köniz"
-        ],
-        "Sweden": [
-            "Stockholm", "Gothenburg", "Malmö", "Uppsala", "Västerås", "Örebro",
-            "Linköping", "Helsingborg", "Jönköping", "Norrköping", "Lund", "Umeå"
-        ],
-        "Norway": [
-            "Oslo", "Bergen", "Stavanger", "Trondheim", "Drammen", "Fredrikstad",
-            "Kristiansand", "Sandnes", "Tromsø", "Sarpsborg", "Skien", "Ålesund"
-        ],
-        "Denmark": [
-            "Copenhagen", "Aarhus", "Odense", "Aalborg", "Esbjerg", "Randers",
-            "Kolding", "Horsens", "Vejle", "Roskilde", "Herning", "Silkeborg"
-        ],
-        "Belgium": [
-            "Brussels", "Antwerp", "Ghent", "Charleroi", "Liège", "Bruges",
-            "Namur", "Leuven", "Mons", "Aalst", "Mechelen", "La Louvière"
-        ],
-        "Austria": [
-            "Vienna", "Graz", "Linz", "Salzburg", "Innsbruck", "Klagenfurt",
-            "Villach", "Wels", "Sankt Pölten", "Dornbirn", "Steyr", "Wiener Neustadt"
-        ],
-        "Portugal": [
-            "Lisbon", "Porto", "Vila Nova de Gaia", "Amadora", "Braga", "Funchal",
-            "Coimbra", "Setúbal", "Almada", "Agualva-Cacém", "Queluz", "Rio Tinto"
-        ],
-        "Greece": [
-            "Athens", "Thessaloniki", "Patras", "Piraeus", "Larissa", "Heraklion",
-            "Peristeri", "Kallithea", "Acharnes", "Kalamaria", "Nikaia", "Glyfada"
-        ],
-        "Poland": [
-            "Warsaw", "Kraków", "Łódź", "Wrocław", "Poznań", "Gdańsk",
-            "Szczecin", "Bydgoszcz", "Lublin", "Katowice", "Białystok", "Gdynia"
-        ],
-        "Czech Republic": [
-            "Prague", "Brno", "Ostrava", "Plzen", "Liberec", "Olomouc",
-            "Budweis", "Hradec Králové", "Ústí nad Labem", "Pardubice", "Zlín", "Havířov"
-        ],
-        "Hungary": [
-            "Budapest", "Debrecen", "Szeged", "Miskolc", "Pécs", "Győr",
-            "Nyíregyháza", "Kecskemét", "Székesfehérvár", "Szombathely", "Tatabánya", "Kaposvár"
-        ],
-        "Ireland": [
-            "Dublin", "Cork", "Limerick", "Galway", "Waterford", "Drogheda",
-            "Dundalk", "Swords", "Bray", "Navan", "Ennis", "Kilkenny"
-        ],
-        "Finland": [
-            "Helsinki", "Espoo", "Tampere", "Vantaa", "Oulu", "Turku",
-            "Jyväskylä", "Lahti", "Kuopio", "Pori", "Kouvola", "Joensuu"
-        ],
-        "New Zealand": [
-            "Auckland", "Wellington", "Christchurch", "Hamilton", "Tauranga", "Napier-Hastings",
-            "Dunedin", "Palmerston North", "Nelson", "Rotorua", "New Plymouth", "Whangarei"
-        ],
-        "South Korea": [
-            "Seoul", "Busan", "Incheon", "Daegu", "Daejeon", "Gwangju",
-            "Suwon", "Ulsan", "Changwon", "Goyang", "Yongin", "Seongnam"
-        ],
-        "Singapore": [
-            "Singapore", "Jurong West", "Woodlands", "Tampines", "Sengkang", "Hougang",
-            "Yishun", "Bedok", "Ang Mo Kio", "Toa Payoh", "Choa Chu Kang", "Pasir Ris"
-        ],
-        "Jamaica": [
-            "Kingston", "Spanish Town", "Portmore", "Montego Bay", "May Pen", "Mandeville",
-            "Old Harbour", "Savanna-la-Mar", "Linstead", "Half Way Tree", "Port Antonio", "Ocho Rios"
-        ],
-        "Costa Rica": [
-            "San José", "Cartago", "Puntarenas", "Limón", "Alajuela", "Heredia",
-            "Desamparados", "Escazú", "Santa Ana", "Curridabat", "San Isidro", "Pococí"
-        ],
-        "India": [
-            "Mumbai", "Delhi", "Bangalore", "Hyderabad", "Ahmedabad", "Chennai",
-            "Kolkata", "Surat", "Pune", "Jaipur", "Lucknow", "Kanpur", "Nagpur", "Indore"
-        ],
-        "Thailand": [
-            "Bangkok", "Nonthaburi", "Pak Kret", "Hat Yai", "Chiang Mai", "Phuket",
-            "Pattaya", "Udon Thani", "Surat Thani", "Khon Kaen", "Nakhon Ratchasima", "Chiang Rai"
-        ]
-    }
+    popular_cities = get_catalog().popular_cities
     
     # Always return cities if we have them
     if country in popular_cities:
@@ -741,6 +934,7 @@ def get_cities_for_country(country):
     return jsonify(fallback_cities)
 
 @app.route('/generate', methods=['POST'])
+@with_request_deadline
 def generate():
     """Generate travel itinerary with AI preferences"""
     try:
@@ -762,6 +956,12 @@ def generate():
                 'aiPrompt': data.get('aiPrompt', '').strip()
             }
             
+            # Response shaping: compact id-referenced places and top-level field selection
+            compact = wants_compact(data)
+            # Tips and insights are fetched separately from /api/ai/stream
+            stream_ai = bool(data.get('stream_ai'))
+            fields = data.get('fields') or request.args.get('fields')
+            
         except (ValueError, TypeError) as e:
             return jsonify({"error": "Invalid input format. Please check your values."}), 400
         
@@ -776,14 +976,7 @@ def generate():
             return jsonify({"error": "Please fill in all fields with valid values"}), 400
         
         # Check authentication and subscription limits
-        auth_header = request.headers.get('Authorization')
-        user = None
-        if auth_header:
-            try:
-                token = auth_header.replace('Bearer ', '')
-                user = users_db.get(token)
-            except:
-                pass
+        user = get_request_user()
         
         # Demo limits for unauthenticated users
         if not user:
@@ -794,32 +987,80 @@ def generate():
                     "message": "Create a free account to plan longer trips, or upgrade to Premium for unlimited planning"
                 }), 401
         
-        logger.info(f"Generating AI-customized itinerary for {city}, {country} - {days} days, {people} people, ${budget}")
-        if any(preferences.values()):
-            logger.info(f"AI Preferences: {preferences}")
-        
-        # Generate the itinerary with AI preferences
-        itinerary = generate_real_itinerary(days, people, budget, country, city, preferences=preferences)
+        # Identical requests share one cached plan; the ETag lets a client revalidate the plan it holds
+        inputs = {'days': days, 'people': people, 'budget': budget, 'country': country, 'city': city,
+                  'preferences': preferences, 'compact': compact, 'stream_ai': stream_ai}
+        keys = [plan_key(inputs, generation_versions(include_ai=not stream_ai))]
+        # Under overload new plans skip the LLM, though a full plan is still served from the cache;
+        # streamed plans make no AI calls here, and /api/ai/stream degrades on its own
+        degraded = planning_degraded() and not stream_ai
+        if degraded:
+            keys.append(plan_key(dict(inputs, degraded=True), generation_versions(include_ai=False)))
+        # Only anonymous responses carry an ETag; they differ by the fields selected
+        variant = str(fields)
+        plan = None
+        for key in ([] if bypasses_plan_cache(data) else keys):
+            plan = plan_cache.get(key)
+            if plan is not None:
+                break
+        if plan is not None:
+            cache_status = 'hit'
+            if plan_cache.weather_stale(plan):
+                location = plan.itinerary['location_info']
+                plan = plan_cache.with_weather(key, plan, get_weather_info(location['lat'], location['lon']))
+            # A signed-in request saves a new trip, so it always gets a full response with its trip_id
+            if not user and request.if_none_match.contains_weak(plan.etag(key, variant)):
+                response = Response(status=304)
+                response.set_etag(plan.etag(key, variant), weak=True)
+                return response
+        else:
+            cache_status = 'miss'
+            logger.info(f"Generating AI-customized itinerary for {city}, {country} - {days} days, {people} people, ${budget}")
+            if any(preferences.values()):
+                logger.info(f"AI Preferences: {preferences}")
+            
+            key = keys[-1]
+            
+            def generate_plan():
+                planning = {}
+                itinerary = generate_real_itinerary(days, people, budget, country, city, preferences=preferences,
+                                                    booking_links=not compact, planning=planning,
+                                                    include_ai=not stream_ai and not degraded)
+                if degraded and "error" not in itinerary:
+                    degrade_itinerary(itinerary, city)
+                return plan_cache.put(key, itinerary, planning)
+            try:
+                plan = plan_cache.flight.do(key, generate_plan)
+            except RequestCancelled:
+                # The shared generation belonged to a request that was cancelled; this one is still live
+                check_cancelled()
+                plan = generate_plan()
         
-        if "error" in itinerary:
-            return jsonify(itinerary), 400
+        if "error" in plan.itinerary:
+            return jsonify(plan.itinerary), 400
         
         # Track trip creation
         if user:
+            # The saved trip is edited in place later, so it gets its own copy of the cached plan
+            itinerary, planning = copy.deepcopy((plan.itinerary, plan.planning))
             user.trips_this_month += 1
             user.total_trips += 1
             
             # Store trip in database
-            trip_id = f"trip_{len(trips_db) + 1}"
-            trips_db[trip_id] = {
+            trip_id = trips_db.add({
                 'user_id': user.google_id,
                 'destination': f"{city}, {country}",
                 'days': days,
                 'budget': budget,
                 'preferences': preferences,
                 'created_at': datetime.now(),
-                'itinerary_data': itinerary
-            }
+                'itinerary_data': itinerary,
+                'planning': planning,
+                'version': 1
+            })
+            itinerary['trip_id'] = trip_id
+        else:
+            itinerary = dict(plan.itinerary)
         
         # Add premium upgrade prompts for free users
         if not user or user.subscription_tier == 'free':
@@ -830,12 +1071,361 @@ def generate():
                 'unlimited_trips': 'Create unlimited trips with Premium'
             }
         
-        return jsonify(itinerary)
+        response = jsonify(shape_itinerary(itinerary, compact, fields))
+        if not user:
+            response.set_etag(plan.etag(key, variant), weak=True)
+        response.headers['X-Cache'] = cache_status
+        return response
         
     except Exception as e:
         logger.error(f"Generation error: {e}")
         return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
 
+@app.route('/generate/multi-city', methods=['POST'])
+@with_request_deadline
+def generate_multi_city():
+    """Plan a trip through several cities of one country"""
+    try:
+        data = request.get_json() or {}
+        
+        try:
+            days = int(data.get('days', 1))
+            people = int(data.get('people', 1))
+            budget = float(data.get('budget', 100))
+            country = data.get('country', '').strip()
+            cities = [str(city).strip() for city in data.get('cities') or []]
+            preferences = {key: data.get(key, '').strip() for key in ('travelStyle', 'interests', 'dietary', 'aiPrompt')}
+            start_date = data.get('start_date') or None
+            if start_date:
+                datetime.strptime(start_date, "%Y-%m-%d")
+            compact = wants_compact(data)
+            fields = data.get('fields') or request.args.get('fields')
+        except (ValueError, TypeError, AttributeError):
+            return jsonify({"error": "Invalid input format. Please check your values."}), 400
+        
+        if not (2 <= days <= 30):
+            return jsonify({"error": "Multi-city trips must be between 2 and 30 days"}), 400
+        if not (1 <= people <= 20):
+            return jsonify({"error": "People must be between 1 and 20"}), 400
+        if not (50 <= budget <= 100000):
+            return jsonify({"error": "Budget must be between $50 and $100,000"}), 400
+        if not country:
+            return jsonify({"error": "Please choose a country"}), 400
+        if len(cities) > MAX_CITIES:
+            return jsonify({"error": f"A trip can visit at most {MAX_CITIES} cities"}), 400
+        
+        user = get_request_user()
+        if not user and days > 3:
+            return jsonify({
+                "error": "Sign in required for trips longer than 3 days",
+                "upgrade_required": True,
+                "message": "Create a free account to plan longer trips, or upgrade to Premium for unlimited planning"
+            }), 401
+        
+        logger.info(f"Generating multi-city itinerary for {country} - {days} days, {people} people, ${budget}")
+        trip = generate_multi_city_itinerary(days, people, budget, country, cities, start_date, preferences,
+                                             booking_links=not compact, include_ai=not planning_degraded())
+        if "error" in trip:
+            return jsonify(trip), 400
+        
+        if user:
+            user.trips_this_month += 1
+            user.total_trips += 1
+            trip_id = trips_db.add({
+                'user_id': user.google_id,
+                'destination': trip['destination'],
+                'days': days,
+                'budget': budget,
+                'preferences': preferences,
+                'created_at': datetime.now(),
+                'itinerary_data': trip,
+                'version': 1
+            })
+            trip['trip_id'] = trip_id
+        
+        if compact:
+            trip['legs'] = [leg if "error" in leg else to_compact(leg, BOOKING_LINK_TEMPLATES) for leg in trip['legs']]
+        return jsonify(select_fields(trip, fields))
+        
+    except Exception as e:
+        logger.error(f"Multi-city generation error: {e}")
+        return jsonify({"error": "An unexpected error occurred. Please try again."}), 500
+
+def request_token_claims():
+    """Verified claims of the request's signed session token, or None"""
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    if token_authority is None or not looks_like_token(token):
+        return None
+    return token_authority.verify(token)
+
+def get_request_user():
+    """User for the request's bearer token, if any"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return None
+    token = auth_header.replace('Bearer ', '')
+    if looks_like_token(token):
+        claims = request_token_claims()
+        return user_from_claims(claims) if claims else None
+    return users_db.get(token)
+
+def user_from_claims(claims):
+    """The user a verified token names; its claims stand in for a users_db record"""
+    user_id = claims['sub']
+    user = users_db.get(user_id)
+    if user is None:
+        user = token_users.get(user_id)
+        if user is None:
+            user = User(user_id, claims.get('email'), claims.get('name'))
+            token_users.set(user_id, user)
+        user.subscription_tier = claims.get('tier', 'free')
+    return user
+
+@app.route('/api/auth/token', methods=['POST'])
+def issue_token():
+    """Exchange the current credentials for a fresh signed session token.
+    
+    A renewed token keeps the sign-in time of the one it replaces, so
+    renewals end AUTH_SESSION_MAX_AGE after the user last signed in.
+    """
+    if token_authority is None:
+        return jsonify({"error": "Session tokens are not configured"}), 503
+    user = get_request_user()
+    if not user:
+        return jsonify({"error": "Sign in to get a session token"}), 401
+    claims = request_token_claims()
+    token = token_authority.issue(user.google_id, user.email, user.name, user.subscription_tier,
+                                  auth_time=claims['auth_time'] if claims else None)
+    return jsonify({"token": token, "token_type": "Bearer", "expires_in": token_authority.ttl})
+
+def generation_versions(include_ai):
+    """Versions of the data and model a generated plan depends on, for its cache key"""
+    versions = dict(data_versions())
+    if include_ai and ai_available():
+        provider = get_llm_provider()
+        versions['llm'] = f"{provider.name}/{provider.model}"
+    return versions
+
+def bypasses_plan_cache(data):
+    """True when the requester asks for a freshly generated plan (Cache-Control: no-cache or "fresh": true)"""
+    return bool(request.cache_control.no_cache or data.get('fresh'))
+
+def wants_compact(data):
+    return str(data.get('compact', request.args.get('compact', ''))).lower() in ('1', 'true', 'yes')
+
+def shape_itinerary(itinerary, compact, fields):
+    if compact:
+        itinerary = to_compact(itinerary, BOOKING_LINK_TEMPLATES)
+    return select_fields(itinerary, fields)
+
+@app.route('/api/trips')
+def list_trips():
+    """The signed-in user's saved trips, newest first, as summaries with a cursor for the next page"""
+    user = get_request_user()
+    if not user:
+        return jsonify({"error": "Sign in to see saved trips"}), 401
+    try:
+        limit = int(request.args.get('limit', 20))
+        trips, next_cursor = trips_db.list_for_user(user.google_id, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "trips": trips,
+        "next_cursor": next_cursor,
+        "total": trips_db.count_for_user(user.google_id)
+    })
+
+@app.route('/api/trips/<trip_id>')
+def get_saved_trip(trip_id):
+    """A saved trip's summary and itinerary (compact and fields work as for /generate)"""
+    user = get_request_user()
+    if not user:
+        return jsonify({"error": "Sign in to see saved trips"}), 401
+    trip = trips_db.get(trip_id)
+    if not trip or trip['user_id'] != user.google_id:
+        return jsonify({"error": "Trip not found"}), 404
+
+    itinerary = trip['itinerary_data']
+    compact, fields = wants_compact({}), request.args.get('fields')
+    if itinerary.get('multi_city'):
+        legs = [leg if "error" in leg or not compact else to_compact(leg, BOOKING_LINK_TEMPLATES)
+                for leg in itinerary['legs']]
+        itinerary = select_fields(dict(itinerary, legs=legs), fields)
+    else:
+        itinerary = shape_itinerary(itinerary, compact, fields)
+    return jsonify(dict(trips_db.summary(trip_id), itinerary=itinerary))
+
+def edit_trip(trip_id, edit):
+    """Apply an edit to a stored trip and reschedule only the days it changed"""
+    user = get_request_user()
+    if not user:
+        return jsonify({"error": "Sign in to edit saved trips"}), 401
+    trip = trips_db.get(trip_id)
+    if not trip or trip['user_id'] != user.google_id or not trip.get('planning'):
+        return jsonify({"error": "Trip not found"}), 404
+    
+    data = request.get_json(silent=True) or {}
+    itinerary = trip['itinerary_data']
+    try:
+        changed = edit(itinerary, trip['planning'], data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    schedule_days(changed, trip['planning'])
+    update_totals(itinerary)
+    trip['days'] = itinerary['total_days']
+    trip['version'] += 1
+    trip['updated_at'] = datetime.now()
+    trips_db.refresh(trip_id)
+    logger.info(f"Edited {trip_id} (version {trip['version']}): days {[day['day'] for day in changed]}")
+    
+    response = shape_itinerary(itinerary, wants_compact(data), data.get('fields') or request.args.get('fields'))
+    return jsonify(dict(response, trip_version=trip['version'], changed_days=[day['day'] for day in changed]))
+
+@app.route('/api/trips/<trip_id>/days/<int:day>/replace', methods=['POST'])
+def replace_trip_day(trip_id, day):
+    """Re-plan one day from places not used elsewhere in the trip"""
+    return edit_trip(trip_id, lambda itinerary, planning, data: replace_day(itinerary, planning, day, build_day_plan))
+
+@app.route('/api/trips/<trip_id>/days/<int:day>/reroll', methods=['POST'])
+def reroll_trip_place(trip_id, day):
+    """Swap one activity ({"kind": "activity", "index": n}) or the restaurant of a day"""
+    return edit_trip(trip_id, lambda itinerary, planning, data: reroll_place(
+        itinerary, planning, day, data.get('kind', 'activity'), int(data.get('index', 0)), build_day_plan))
+
+@app.route('/api/trips/<trip_id>/extend', methods=['POST'])
+def extend_saved_trip(trip_id):
+    """Add days ({"days": n}) to the end of a trip"""
+    return edit_trip(trip_id, lambda itinerary, planning, data: extend_trip(
+        itinerary, planning, int(data.get('days', 1)), build_day_plan))
+
+@app.route('/api/trips/<trip_id>/export/<fmt>')
+def export_saved_trip(trip_id, fmt):
+    """Download a saved trip as PDF, ICS calendar or GeoJSON (premium)"""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"Export format must be one of {', '.join(EXPORT_FORMATS)}"}), 404
+    feature, mimetype, extension = EXPORT_FORMATS[fmt]
+    user = get_request_user()
+    if not user:
+        return jsonify({"error": "Sign in to export saved trips"}), 401
+    trip = trips_db.get(trip_id)
+    if not trip or trip['user_id'] != user.google_id:
+        return jsonify({"error": "Trip not found"}), 404
+    if not has_feature(user, feature):
+        return jsonify({
+            "error": f"{extension.upper()} export is a Premium feature",
+            "upgrade_required": True
+        }), 403
+    
+    try:
+        data = export_trip(trip_id, trip.get('version', 1), trip['itinerary_data'], fmt)
+    except Exception as e:
+        logger.error(f"Export error for {trip_id} ({fmt}): {e}")
+        return jsonify({"error": "The export could not be created. Please try again."}), 500
+    
+    filename = f"{trip_id}-v{trip.get('version', 1)}.{extension}"
+    return Response(iter_chunks(data), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Content-Length': str(len(data))
+    })
+
+@app.route('/api/trips/<trip_id>/tiles/<fmt>')
+def saved_trip_tiles(trip_id, fmt):
+    """Offline map tiles for a saved trip as MBTiles or zip (premium); 202 while the pack is built"""
+    if fmt not in PACK_FORMATS:
+        return jsonify({"error": f"Tile pack format must be one of {', '.join(PACK_FORMATS)}"}), 404
+    user = get_request_user()
+    if not user:
+        return jsonify({"error": "Sign in to download offline maps"}), 401
+    trip = trips_db.get(trip_id)
+    if not trip or trip['user_id'] != user.google_id:
+        return jsonify({"error": "Trip not found"}), 404
+    if not has_feature(user, 'offline_maps'):
+        return jsonify({"error": "Offline maps are a Premium feature", "upgrade_required": True}), 403
+    builder = get_tile_pack_builder()
+    if builder is None:
+        return jsonify({"error": "Offline maps are not configured"}), 503
+    
+    version = trip.get('version', 1)
+    status, result = builder.request(trip_id, version, trip['itinerary_data'], fmt)
+    if status == 'building':
+        response = jsonify(dict(result, status='building'))
+        response.headers['Retry-After'] = '2'
+        return response, 202
+    if status == 'failed':
+        return jsonify({"error": result}), 502
+    return send_file(result, mimetype=PACK_FORMATS[fmt], as_attachment=True,
+                     download_name=f"{trip_id}-v{version}-tiles.{fmt}")
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/ai/stream')
+def stream_ai_content():
+    """Insights and tips as server-sent events while the completion is generated"""
+    args = request.args
+    try:
+        days = int(args.get('days', 1))
+        people = int(args.get('people', 1))
+        budget = float(args.get('budget', 100))
+    except ValueError:
+        return jsonify({"error": "Invalid input format. Please check your values."}), 400
+    country = args.get('country', '').strip()
+    city = args.get('city', '').strip()
+    if not all([country, city]) or not (1 <= days <= 30) or budget <= 0:
+        return jsonify({"error": "Please fill in all fields with valid values"}), 400
+    preferences = {key: args.get(key, '').strip() for key in ('travelStyle', 'interests', 'dietary', 'aiPrompt')}
+    
+    # Under overload the stream serves stored or catalog content without calling the model
+    degraded = planning_degraded()
+    
+    def events():
+        parser = StreamParser()
+        complete = chat_completion if ai_available() and not degraded else None
+        stored = trip_content_from_corpus(get_insights_corpus(), complete, days, people, budget, country, city, preferences)
+        if stored:
+            # Precomputed content needs no streaming; it is sent in one go
+            tips, insights = stored
+            yield sse_event('insights', {'text': insights})
+            parser.insights = insights
+            for index, tip in enumerate(tips):
+                yield sse_event('tip', {'index': index, 'text': tip})
+            parser.tips = list(tips)
+        elif complete:
+            try:
+                messages = build_stream_messages(days, people, budget, country, city, preferences)
+                for delta in stream_chat_completion(messages, max_tokens=COMBINED_MAX_TOKENS):
+                    for event, data in parser.feed(delta):
+                        yield sse_event(event, data)
+                for event, data in parser.finish():
+                    yield sse_event(event, data)
+            except Exception as e:
+                logger.error(f"OpenAI streaming error: {e}")
+        
+        # Whatever the model did not deliver is filled from the usual fallbacks
+        insights = parser.insights.strip()
+        if not insights:
+            insights = default_insights(city)
+            yield sse_event('insights', {'text': insights})
+        tips = list(parser.tips)
+        fallback_tips = get_fallback_tips()
+        for index in range(len(tips), TIP_COUNT):
+            tips.append(fallback_tips[index % len(fallback_tips)])
+            yield sse_event('tip', {'index': index, 'text': tips[index]})
+        yield sse_event('done', {'insights': insights, 'tips': tips})
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/links')
+def get_links():
+    """Booking links for one place, for clients using compact responses"""
+    name = request.args.get('name', '').strip()
+    city = request.args.get('city', '').strip()
+    if not name:
+        return jsonify({"error": "name is required"}), 400
+    return jsonify(get_booking_links(name, city))
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
@@ -843,7 +1433,8 @@ def health():
         "status": "healthy", 
         "app": "TripCraft AI-Powered",
         "version": "2.0",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "admission": admission.snapshot()
     })
 
 if __name__ == '__main__':
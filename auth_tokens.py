@@ -0,0 +1,110 @@
+"""Signed session tokens (JWT, HS256).
+
+A token carries the user's id, email, name and subscription tier, so any
+worker on any node can authenticate a request by checking the signature -
+there is no session store to consult. Verified claims are cached by token
+until shortly before they expire, which makes repeat requests a dict
+lookup.
+
+Keys are configured as AUTH_TOKEN_KEYS="kid:secret,kid:secret". The first
+key signs new tokens and every listed key verifies, so a key is rotated by
+putting its replacement first and dropping it once the tokens it signed
+have expired. Without AUTH_TOKEN_KEYS the app's SECRET_KEY is used, unless
+it is unset or still the published placeholder: then there is no authority
+and the app neither issues nor accepts tokens.
+
+Tokens are renewed by exchanging a valid one for a fresh one. Each keeps
+the auth_time of the sign-in it descends from, and none is valid more than
+AUTH_SESSION_MAX_AGE after it, so a leaked token cannot be renewed forever.
+"""
+import os
+import time
+
+import jwt
+
+from cache import TTLCache
+
+ALGORITHM = 'HS256'
+ISSUER = 'travel-app'
+TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 7 * 24 * 3600))
+SESSION_MAX_AGE = int(os.environ.get('AUTH_SESSION_MAX_AGE', 30 * 24 * 3600))
+# SECRET_KEY values that are public knowledge and must never sign tokens
+PLACEHOLDER_SECRETS = {'your-secret-key-here-change-in-production'}
+CLAIMS_CACHE_TTL = 300
+
+
+def parse_keys(value):
+    """[(kid, secret)] from "kid:secret,kid:secret", in order"""
+    keys = []
+    for entry in value.split(','):
+        kid, _, secret = entry.strip().partition(':')
+        if not kid or not secret:
+            raise ValueError(f"AUTH_TOKEN_KEYS entries must look like kid:secret, got {entry.strip()!r}")
+        keys.append((kid, secret))
+    return keys
+
+
+def looks_like_token(value):
+    return value.count('.') == 2
+
+
+class TokenAuthority:
+    """Issues tokens with the active key and verifies them against every known key"""
+
+    def __init__(self, keys, ttl=TOKEN_TTL, max_age=SESSION_MAX_AGE, cache_entries=10000):
+        if not keys:
+            raise ValueError("At least one signing key is required")
+        self.active_kid = keys[0][0]
+        self.keys = dict(keys)
+        self.ttl = ttl
+        self.max_age = max_age
+        self.claims_cache = TTLCache(max_entries=cache_entries, default_ttl=CLAIMS_CACHE_TTL)
+
+    def issue(self, user_id, email, name, tier, ttl=None, auth_time=None):
+        """A signed token; auth_time is the original sign-in of a renewed token and caps its expiry"""
+        now = int(time.time())
+        auth_time = now if auth_time is None else int(auth_time)
+        claims = {
+            'sub': user_id,
+            'email': email,
+            'name': name,
+            'tier': tier,
+            'iss': ISSUER,
+            'iat': now,
+            'auth_time': auth_time,
+            'exp': min(now + (ttl or self.ttl), auth_time + self.max_age)
+        }
+        return jwt.encode(claims, self.keys[self.active_kid], algorithm=ALGORITHM,
+                          headers={'kid': self.active_kid})
+
+    def verify(self, token):
+        """The token's claims, or None when it is malformed, forged, expired or signed by a retired key"""
+        claims = self.claims_cache.get(token)
+        if claims is not None:
+            if claims['exp'] > time.time():
+                return claims
+            self.claims_cache.delete(token)
+            return None
+
+        try:
+            secret = self.keys.get(jwt.get_unverified_header(token).get('kid'))
+            if secret is None:
+                return None
+            claims = jwt.decode(token, secret, algorithms=[ALGORITHM], issuer=ISSUER,
+                                options={'require': ['exp', 'iat', 'sub', 'auth_time']})
+        except jwt.InvalidTokenError:
+            return None
+        if claims['auth_time'] + self.max_age < time.time():
+            return None
+        self.claims_cache.set(token, claims, min(CLAIMS_CACHE_TTL, claims['exp'] - time.time()))
+        return claims
+
+
+def authority_from_env(default_secret, environ=os.environ):
+    """The authority configured through AUTH_TOKEN_KEYS, one keyed by default_secret, or None without a real key"""
+    configured = environ.get('AUTH_TOKEN_KEYS')
+    if configured:
+        return TokenAuthority(parse_keys(configured))
+    if not default_secret or default_secret in PLACEHOLDER_SECRETS:
+        return None
+    return TokenAuthority([('default', default_secret)])
@@ -0,0 +1,49 @@
+import os
+import sys
+import threading
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mock_upstream  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def mock_upstream_url():
+    """Mock upstream server shared by the whole benchmark session"""
+    mock_upstream.MOCK_CONFIG.update({
+        'latency_ms': float(os.environ.get('BENCH_UPSTREAM_LATENCY_MS', 5)),
+        'latency_jitter_ms': float(os.environ.get('BENCH_UPSTREAM_JITTER_MS', 2)),
+        'error_rate': float(os.environ.get('BENCH_UPSTREAM_ERROR_RATE', 0.0)),
+    })
+    server, base_url = mock_upstream.start_in_thread()
+    yield base_url
+    server.shutdown()
+
+
+@pytest.fixture(scope='session')
+def app_module(mock_upstream_url):
+    """app.py imported with every upstream pointed at the mock server"""
+    os.environ.update(mock_upstream.upstream_env(mock_upstream_url))
+    import app
+    return app
+
+
+@pytest.fixture(scope='session')
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope='session')
+def live_app_url(app_module):
+    """The app served over real HTTP for concurrency measurements"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
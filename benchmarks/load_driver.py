@@ -0,0 +1,148 @@
+"""wrk-style load driver for the TripCraft endpoints.
+
+Fires a fixed number of requests at a running app with N concurrent
+workers and reports latency percentiles and throughput.
+
+    python benchmarks/load_driver.py --target http://127.0.0.1:5000 \
+        --scenario generate --concurrency 16 --requests 400 --json out.json
+
+Use --with-mock to start mock_upstream.py and the app in-process, which
+is what the pytest-benchmark suite does.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+GENERATE_PAYLOAD = {
+    'days': 3,
+    'people': 2,
+    'budget': 900,
+    'country': 'Spain',
+    'city': 'Barcelona',
+    'travelStyle': 'cultural',
+    'interests': 'museums, food',
+    'dietary': '',
+    'aiPrompt': ''
+}
+
+SCENARIOS = {
+    'countries': ('GET', '/api/countries', None),
+    'cities': ('GET', '/api/cities/Spain', None),
+    # Fresh plans measure generation; identical cached ones measure the plan cache
+    'generate': ('POST', '/generate', dict(GENERATE_PAYLOAD, fresh=True)),
+    'generate-cached': ('POST', '/generate', GENERATE_PAYLOAD),
+    'health': ('GET', '/health', None),
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, errors, elapsed, shed=0):
+    """Build the stats dict reported by the driver and the benchmark suite"""
+    ordered = sorted(latencies)
+    total = len(latencies) + errors + shed
+    return {
+        'requests': total,
+        'errors': errors,
+        # 503s from admission control; their latency is left out of the percentiles
+        'shed': shed,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+def run_load(target, scenario, concurrency=8, total_requests=200, timeout=30):
+    """Run one scenario against target and return the summary dict"""
+    method, path, payload = SCENARIOS[scenario]
+    url = target.rstrip('/') + path
+    latencies = []
+    errors = [0]
+    shed = [0]
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one_request(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, json=payload, timeout=timeout)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        elapsed = time.perf_counter() - started
+        with lock:
+            if status == 503:
+                shed[0] += 1
+            elif status is not None and status < 500:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(total_requests)))
+    return summarize(latencies, errors[0], time.perf_counter() - started, shed[0])
+
+
+def start_local_stack():
+    """Start mock upstreams and the app in this process; returns the app base URL"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import mock_upstream
+    from werkzeug.serving import make_server
+
+    _, mock_url = mock_upstream.start_in_thread()
+    os.environ.update(mock_upstream.upstream_env(mock_url))
+    import app as app_module
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load driver for TripCraft endpoints')
+    parser.add_argument('--target', default='http://127.0.0.1:5000')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS) + ['all'], default='all')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--with-mock', action='store_true', help='run mock upstreams and the app in-process')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    target = start_local_stack() if args.with_mock else args.target
+    scenarios = sorted(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+
+    results = {}
+    for scenario in scenarios:
+        results[scenario] = run_load(target, scenario, args.concurrency, args.requests)
+        stats = results[scenario]
+        print(f"{scenario:<10} {stats['requests']:>6} req  {stats['throughput_rps']:>8.1f} rps  "
+              f"p50 {stats['p50_ms']:>8.1f}ms  p95 {stats['p95_ms']:>8.1f}ms  "
+              f"p99 {stats['p99_ms']:>8.1f}ms  errors {stats['errors']}  shed {stats['shed']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
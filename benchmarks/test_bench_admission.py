@@ -0,0 +1,87 @@
+"""Admission control benchmarks: shedding, degraded plans and adaptive limits"""
+import pytest
+import requests
+
+from admission import AdaptiveLimiter
+from load_driver import GENERATE_PAYLOAD
+
+FRESH = {'Cache-Control': 'no-cache'}
+
+
+@pytest.fixture
+def hold(app_module):
+    """Take n slots of an endpoint's pool, as requests in flight would; all are released afterwards"""
+    permits = []
+
+    def take(endpoint, n):
+        for _ in range(n):
+            permit = app_module.admission.admit(endpoint)
+            assert permit is not None
+            permits.append(permit)
+    yield take
+    for permit in permits:
+        permit.release(completed=False)
+
+
+def test_admit_and_release(benchmark, app_module):
+    def admit():
+        permit = app_module.admission.admit('get_countries')
+        permit.release()
+    benchmark(admit)
+
+
+def test_saturated_planning_sheds_fast(benchmark, client, app_module, hold):
+    limiter = app_module.admission.limiters['planning']
+    hold('generate', int(limiter.limit))
+    response = benchmark(client.post, '/generate', json=GENERATE_PAYLOAD)
+    assert response.status_code == 503 and int(response.headers['Retry-After']) >= 1
+    # Other classes keep their own capacity
+    assert client.get('/health').status_code == 200
+    assert client.get('/api/countries').status_code == 200
+
+
+def test_degraded_plan_skips_ai(client, app_module, mock_upstream_url, hold):
+    limiter = app_module.admission.limiters['planning']
+    hold('generate', int(limiter.limit) - 1)
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    response = client.post('/generate', json=dict(GENERATE_PAYLOAD, city='Girona'), headers=FRESH)
+    assert response.status_code == 200
+    itinerary = response.get_json()
+    assert itinerary['degraded'] and itinerary['money_saving_tips'] and itinerary['itinerary']
+    assert requests.get(f"{mock_upstream_url}/__mock__/stats").json().get('chat_completions', 0) == 0
+
+
+def test_limit_follows_latency():
+    limiter = AdaptiveLimiter('test', limit=8, min_limit=2, max_limit=32)
+    for _ in range(200):
+        assert limiter.try_acquire()
+        limiter.release(0.1)
+    grown = limiter.limit
+    assert grown > 8
+
+    for _ in range(30):
+        limiter.try_acquire()
+        limiter.release(1.0)
+    assert limiter.limit < grown / 2 and limiter.retry_after() >= 1
+
+
+def test_heavy_classes_leave_threads_for_light_requests(app_module, hold):
+    from admission import HEAVY_SLOTS, WORKER_THREADS
+    assert HEAVY_SLOTS < WORKER_THREADS
+    assert app_module.admission.limiters['planning'].max_limit <= HEAVY_SLOTS
+    taken = HEAVY_SLOTS - app_module.admission.heavy_inflight
+    planning = min(taken, int(app_module.admission.limiters['planning'].limit))
+    hold('generate', planning)
+    hold('export_saved_trip', taken - planning)
+    assert app_module.admission.admit('export_saved_trip') is None
+    assert app_module.admission.admit('get_countries') is not None
+
+
+def test_degraded_stream_skips_ai(client, app_module, mock_upstream_url, hold):
+    limiter = app_module.admission.limiters['planning']
+    hold('stream_ai_content', int(limiter.limit) - 1)
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    query = dict(GENERATE_PAYLOAD, city='Tarragona')
+    response = client.get('/api/ai/stream', query_string=query)
+    assert response.status_code == 200 and b'event: done' in response.data
+    assert requests.get(f"{mock_upstream_url}/__mock__/stats").json().get('chat_completions', 0) == 0
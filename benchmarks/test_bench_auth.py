@@ -0,0 +1,73 @@
+"""Auth benchmarks: verifying signed session tokens"""
+import time
+
+from auth_tokens import TokenAuthority, authority_from_env
+from cache import TTLCache
+from load_driver import GENERATE_PAYLOAD
+
+
+def test_verify_cold(benchmark):
+    authority = TokenAuthority([('k1', 'secret-one')])
+    token = authority.issue('user-1', 'user@example.com', 'User', 'premium')
+
+    def verify():
+        authority.claims_cache.clear()
+        return authority.verify(token)
+    assert benchmark(verify)['tier'] == 'premium'
+
+
+def test_verify_cached(benchmark):
+    authority = TokenAuthority([('k1', 'secret-one')])
+    token = authority.issue('user-1', 'user@example.com', 'User', 'premium')
+    assert benchmark(authority.verify, token)['sub'] == 'user-1'
+
+
+def test_key_rotation():
+    old = TokenAuthority([('k1', 'secret-one')])
+    token = old.issue('user-1', 'user@example.com', 'User', 'free')
+    rotated = TokenAuthority([('k2', 'secret-two'), ('k1', 'secret-one')])
+    retired = TokenAuthority([('k2', 'secret-two')])
+    assert rotated.verify(token)['sub'] == 'user-1'
+    assert retired.verify(token) is None
+    assert old.verify(rotated.issue('user-1', 'user@example.com', 'User', 'free')) is None
+    assert old.verify(token[:-2] + ('AA' if not token.endswith('AA') else 'BB')) is None
+    assert old.verify(old.issue('user-1', 'user@example.com', 'User', 'free', ttl=-1)) is None
+
+
+def test_token_round_trip(client, app_module):
+    app_module.users_db['bench-auth'] = app_module.User('bench-auth', 'auth@example.com', 'Bench', 'premium')
+    response = client.post('/api/auth/token', headers={'Authorization': 'Bearer bench-auth'})
+    assert response.status_code == 200
+    token = response.get_json()['token']
+    del app_module.users_db['bench-auth']
+
+    # The token alone authenticates, with no users_db record behind it
+    headers = {'Authorization': f'Bearer {token}'}
+    trip = client.post('/generate', json=GENERATE_PAYLOAD, headers=headers).get_json()
+    assert trip['trip_id']
+    assert client.get(f"/api/trips/{trip['trip_id']}", headers=headers).status_code == 200
+    assert client.post('/api/auth/token', headers={'Authorization': 'Bearer a.b.c'}).status_code == 401
+
+
+def test_token_users_are_bounded(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'token_users', TTLCache(max_entries=50, default_ttl=60))
+    for i in range(200):
+        app_module.user_from_claims({'sub': f"token-user-{i}", 'tier': 'free'})
+    assert len(app_module.token_users) == 50
+    user = app_module.user_from_claims({'sub': 'token-user-199', 'tier': 'premium'})
+    assert user is app_module.token_users.get('token-user-199') and user.subscription_tier == 'premium'
+
+
+def test_placeholder_secret_signs_nothing():
+    assert authority_from_env('your-secret-key-here-change-in-production', environ={}) is None
+    assert authority_from_env(None, environ={}) is None
+    assert authority_from_env('a-real-secret', environ={}) is not None
+
+
+def test_renewal_keeps_the_sign_in_time():
+    authority = TokenAuthority([('k1', 'secret-one')], max_age=3600)
+    signed_in = int(time.time()) - 3000
+    renewed = authority.verify(authority.issue('user-1', 'user@example.com', 'User', 'free', auth_time=signed_in))
+    assert renewed['auth_time'] == signed_in and renewed['exp'] <= signed_in + 3600
+    expired = authority.issue('user-1', 'user@example.com', 'User', 'free', auth_time=signed_in - 7200)
+    assert authority.verify(expired) is None
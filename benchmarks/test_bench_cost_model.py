@@ -0,0 +1,35 @@
+"""Cost model benchmark: one vectorized pass over a batch of trips"""
+import random
+
+from cost_model import estimate_trip_costs
+
+
+def build_trips(count, seed=11):
+    rng = random.Random(seed)
+    return [{
+        'country': rng.choice(['Spain', 'United States', 'FR', 'Japan', 'Peru']),
+        'city': rng.choice(['Barcelona', 'New York', 'Paris', 'Tokyo', 'Lima']),
+        'days': rng.randint(1, 30),
+        'people': rng.randint(1, 8),
+        'budget_level': rng.choice(['budget', 'mid', 'luxury']),
+        'start_date': '2026-01-05'
+    } for _ in range(count)]
+
+
+def test_single_30_day_trip(benchmark):
+    trip = build_trips(1)[0]
+    trip['days'] = 30
+    result = benchmark(estimate_trip_costs, [trip])
+    assert len(result[0]['total']) == 30
+
+
+def test_batch_of_1000_trips(benchmark):
+    trips = build_trips(1000)
+    result = benchmark(estimate_trip_costs, trips)
+    assert [len(costs['total']) for costs in result] == [trip['days'] for trip in trips]
+
+
+def test_nights_are_priced_from_the_planned_dates(app_module):
+    planning = {}
+    itinerary = app_module.generate_real_itinerary(3, 2, 900, 'Spain', 'Barcelona', preferences={}, planning=planning)
+    assert planning['cost_request']['start_date'] == itinerary['check_in_date'] == itinerary['itinerary'][0]['date']
@@ -0,0 +1,103 @@
+"""Deadline and disconnect benchmarks: upstream calls made for requests nobody waits for"""
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+import mock_upstream
+from ai_content import generate_trip_content
+from load_driver import GENERATE_PAYLOAD
+from request_context import ContextExecutor, RequestCancelled
+
+FRESH = {'Cache-Control': 'no-cache'}
+
+
+def cold_payload():
+    """A destination no earlier request has warmed the place and AI caches for"""
+    return dict(GENERATE_PAYLOAD, city=f"Benchtown {time.time_ns()}")
+
+
+def upstream_calls(mock_upstream_url):
+    return sum(requests.get(f"{mock_upstream_url}/__mock__/stats").json().values())
+
+
+@pytest.fixture
+def slow_upstream(mock_upstream_url, monkeypatch):
+    monkeypatch.setitem(mock_upstream.MOCK_CONFIG, 'latency_ms', 150.0)
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    return mock_upstream_url
+
+
+def settled_calls(mock_upstream_url, quiet=1.0):
+    """Upstream call count once no new calls have arrived for `quiet` seconds"""
+    count = upstream_calls(mock_upstream_url)
+    while True:
+        time.sleep(quiet)
+        latest = upstream_calls(mock_upstream_url)
+        if latest == count:
+            return count
+        count = latest
+
+
+def test_deadline_abandons_upstream_work(client, app_module, slow_upstream, monkeypatch):
+    client.post('/generate', json=cold_payload(), headers=FRESH)
+    full = settled_calls(slow_upstream)
+    requests.delete(f"{slow_upstream}/__mock__/stats")
+
+    monkeypatch.setattr(app_module, 'REQUEST_DEADLINE', 0.2)
+    started = time.perf_counter()
+    response = client.post('/generate', json=cold_payload(), headers=FRESH)
+    assert response.status_code == 504
+    assert time.perf_counter() - started < 1.0
+    assert settled_calls(slow_upstream) < full
+
+
+def test_deadline_with_a_saturated_pool(client, app_module, mock_upstream_url, monkeypatch):
+    """Queued upstream tasks are cancelled with their request, which still answers 504"""
+    monkeypatch.setitem(mock_upstream.MOCK_CONFIG, 'latency_ms', 300.0)
+    pool = ContextExecutor(max_workers=1)
+    monkeypatch.setattr(app_module, 'upstream_executor', pool)
+    monkeypatch.setattr(app_module, 'REQUEST_DEADLINE', 0.5)
+    try:
+        assert client.post('/generate', json=cold_payload(), headers=FRESH).status_code == 504
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def test_disconnect_abandons_upstream_work(live_app_url, slow_upstream):
+    requests.post(f"{live_app_url}/generate", json=cold_payload(), headers=FRESH)
+    full = settled_calls(slow_upstream)
+    requests.delete(f"{slow_upstream}/__mock__/stats")
+
+    url = urlparse(live_app_url)
+    body = json.dumps(cold_payload()).encode()
+    with socket.create_connection((url.hostname, url.port)) as conn:
+        conn.sendall(b"POST /generate HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                     b"Cache-Control: no-cache\r\nContent-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+        time.sleep(0.3)
+    assert settled_calls(slow_upstream) < full
+
+
+def test_follower_outlives_cancelled_leader():
+    started, release = threading.Event(), threading.Event()
+    content = '{"tips": ["Walk"], "insights": "Lovely"}'
+
+    def cancelled(messages, **kwargs):
+        started.set()
+        release.wait()
+        raise RequestCancelled('client')
+
+    def leader():
+        with pytest.raises(RequestCancelled):
+            generate_trip_content(cancelled, 3, 2, 900, 'Spain', 'Cancelville')
+    thread = threading.Thread(target=leader)
+    thread.start()
+    started.wait()
+    threading.Timer(0.1, release.set).start()
+    result = generate_trip_content(lambda messages, **kwargs: content, 3, 2, 900, 'Spain', 'Cancelville')
+    thread.join()
+    assert result[1] == 'Lovely'
@@ -0,0 +1,117 @@
+"""Endpoint benchmarks against the mock upstreams.
+
+    pytest benchmarks/ --benchmark-json=bench.json
+
+Single-request timings come from pytest-benchmark; the *_under_load
+cases drive the live app with concurrent clients and attach p50/p95/p99
+and throughput to the benchmark's extra_info.
+"""
+import os
+import time
+
+import pytest
+import requests
+
+from load_driver import GENERATE_PAYLOAD, run_load
+
+LOAD_CONCURRENCY = int(os.environ.get('BENCH_CONCURRENCY', 8))
+LOAD_REQUESTS = int(os.environ.get('BENCH_REQUESTS', 80))
+# Generation benchmarks skip the plan cache, which would otherwise answer every repeat
+FRESH = {'Cache-Control': 'no-cache'}
+
+
+def test_countries(benchmark, client):
+    response = benchmark(client.get, '/api/countries')
+    assert response.status_code == 200
+    assert len(response.get_json()) > 50
+
+
+def test_cities(benchmark, client):
+    response = benchmark(client.get, '/api/cities/Spain')
+    assert response.status_code == 200
+    assert 'Madrid' in response.get_json()
+
+
+def test_generate(benchmark, client):
+    response = benchmark(client.post, '/generate', json=GENERATE_PAYLOAD, headers=FRESH)
+    assert response.status_code == 200
+    assert len(response.get_json()['itinerary']) == GENERATE_PAYLOAD['days']
+
+
+def test_generate_cached(benchmark, client, mock_upstream_url):
+    """Repeats of a plan come from the cache without upstream calls, and revalidate to 304"""
+    first = client.post('/generate', json=GENERATE_PAYLOAD, headers=FRESH)
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    response = benchmark(client.post, '/generate', json=GENERATE_PAYLOAD)
+    assert response.headers['X-Cache'] == 'hit' and response.get_json() == first.get_json()
+    assert requests.get(f"{mock_upstream_url}/__mock__/stats").json() == {}
+
+    etag = response.headers['ETag']
+    revalidated = client.post('/generate', json=GENERATE_PAYLOAD, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304 and not revalidated.data
+    assert client.post('/generate', json=dict(GENERATE_PAYLOAD, fresh=True),
+                       headers={'If-None-Match': etag}).headers['X-Cache'] == 'miss'
+
+
+def test_signed_in_generate_is_never_304(client, app_module):
+    """A signed-in request saves a trip, so revalidating still returns it"""
+    app_module.users_db['bench-etag'] = app_module.User('bench-etag', 'etag@example.com', 'Bench')
+    headers = {'Authorization': 'Bearer bench-etag'}
+    etag = client.post('/generate', json=GENERATE_PAYLOAD).headers['ETag']
+    first = client.post('/generate', json=GENERATE_PAYLOAD, headers=dict(headers, **{'If-None-Match': etag}))
+    second = client.post('/generate', json=GENERATE_PAYLOAD, headers=headers)
+    assert first.status_code == second.status_code == 200 and 'ETag' not in first.headers
+    assert first.get_json()['trip_id'] != second.get_json()['trip_id']
+
+
+@pytest.mark.parametrize('scenario', ['countries', 'cities', 'generate', 'generate-cached'])
+def test_under_load(benchmark, live_app_url, scenario):
+    stats = benchmark.pedantic(
+        run_load,
+        args=(live_app_url, scenario, LOAD_CONCURRENCY, LOAD_REQUESTS),
+        rounds=1,
+        iterations=1
+    )
+    benchmark.extra_info.update(stats)
+    assert stats['errors'] == 0
+
+
+@pytest.mark.parametrize('combined', [True, False], ids=['combined', 'separate'])
+def test_generate_ai_round_trips(benchmark, client, app_module, mock_upstream_url, monkeypatch, combined):
+    """Chat completions per itinerary with and without the combined JSON-mode call"""
+    monkeypatch.setattr(app_module, 'AI_COMBINED_COMPLETION', combined)
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    rounds = [0]
+
+    def generate():
+        rounds[0] += 1
+        return client.post('/generate', json=GENERATE_PAYLOAD, headers=FRESH)
+
+    response = benchmark.pedantic(generate, rounds=5, iterations=1)
+    completions = requests.get(f"{mock_upstream_url}/__mock__/stats").json().get('chat_completions', 0)
+    benchmark.extra_info['completions_per_itinerary'] = completions / rounds[0]
+    assert response.status_code == 200
+    assert completions / rounds[0] == (1 if combined else 2)
+
+
+def test_ai_stream_first_event(benchmark, live_app_url):
+    """Time until the first insights text reaches the client over /api/ai/stream"""
+    params = {k: GENERATE_PAYLOAD[k] for k in ('days', 'people', 'budget', 'country', 'city', 'interests')}
+    timings = {}
+
+    def first_event():
+        started = time.perf_counter()
+        events = []
+        with requests.get(f"{live_app_url}/api/ai/stream", params=params, stream=True, timeout=30) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event:'):
+                    if not events:
+                        timings['first_event_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                    events.append(line.split(':', 1)[1].strip())
+        timings['complete_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return events
+
+    events = benchmark.pedantic(first_event, rounds=3, iterations=1)
+    benchmark.extra_info.update(timings)
+    assert events[0] == 'insights'
+    assert events.count('tip') == 6 and events[-1] == 'done'
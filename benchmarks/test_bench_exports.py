@@ -0,0 +1,49 @@
+"""Export benchmarks: rendering in the process pool and serving cached exports"""
+import pytest
+
+from exports import export_cache, render_ics, render_pdf
+from load_driver import GENERATE_PAYLOAD
+
+
+@pytest.fixture(scope='module')
+def saved_trip(client, app_module):
+    """A 3-day trip saved for a premium user, and that user's token"""
+    app_module.users_db['bench-premium'] = app_module.User('bench-premium', 'premium@example.com', 'Bench', 'premium')
+    headers = {'Authorization': 'Bearer bench-premium'}
+    response = client.post('/generate', json=GENERATE_PAYLOAD, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['trip_id'], headers
+
+
+def test_render_pdf(benchmark, app_module, saved_trip):
+    trip_id, _ = saved_trip
+    data = benchmark(render_pdf, app_module.trips_db[trip_id]['itinerary_data'])
+    assert data.startswith(b'%PDF-1.4') and data.rstrip().endswith(b'%%EOF')
+
+
+def test_ics_uses_the_planned_dates(app_module, saved_trip):
+    trip_id, _ = saved_trip
+    trip = app_module.trips_db[trip_id]['itinerary_data']
+    lines = render_ics(trip, trip_id).decode().split('\r\n')
+    starts = {line[len('DTSTART:'):][:8] for line in lines if line.startswith('DTSTART:')}
+    assert starts == {day_plan['date'].replace('-', '') for day_plan in trip['itinerary'] if day_plan.get('schedule')}
+
+
+@pytest.mark.parametrize('fmt,prefix', [('pdf', b'%PDF'), ('ics', b'BEGIN:VCALENDAR'), ('geojson', b'{')])
+def test_export_cold_and_cached(benchmark, client, saved_trip, fmt, prefix):
+    """First request renders in the process pool; the timed ones are served from the cache"""
+    trip_id, headers = saved_trip
+    export_cache.clear()
+    first = client.get(f'/api/trips/{trip_id}/export/{fmt}', headers=headers)
+    assert first.status_code == 200 and first.data.startswith(prefix)
+
+    response = benchmark(client.get, f'/api/trips/{trip_id}/export/{fmt}', headers=headers)
+    assert response.data == first.data
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+
+def test_export_requires_premium(client, app_module, saved_trip, monkeypatch):
+    trip_id, headers = saved_trip
+    monkeypatch.setattr(app_module.users_db['bench-premium'], 'subscription_tier', 'free')
+    response = client.get(f'/api/trips/{trip_id}/export/pdf', headers=headers)
+    assert response.status_code == 403 and response.get_json()['upgrade_required']
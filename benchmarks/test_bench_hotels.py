@@ -0,0 +1,54 @@
+"""Hotel ranking benchmark: hundreds of hotels against a 30-day plan"""
+import random
+
+from hotel_ranking import HOTELS_SHOWN, rank_hotels
+
+CENTRE = (41.3874, 2.1686)
+
+
+def jitter(rng, spread_km):
+    return (CENTRE[0] + rng.uniform(-spread_km, spread_km) / 111.0,
+            CENTRE[1] + rng.uniform(-spread_km, spread_km) / 83.0)
+
+
+def build_plan(days, seed=3):
+    rng = random.Random(seed)
+    itinerary = []
+    for day in range(1, days + 1):
+        activities = []
+        for _ in range(2):
+            lat, lng = jitter(rng, 4)
+            activities.append({'name': f"Day {day} activity", 'lat': lat, 'lng': lng})
+        lat, lng = jitter(rng, 4)
+        itinerary.append({'day': day, 'activities': activities, 'restaurant': {'name': 'Dinner', 'lat': lat, 'lng': lng}})
+    return itinerary
+
+
+def build_hotels(count, seed=5):
+    rng = random.Random(seed)
+    hotels = []
+    for i in range(count):
+        lat, lng = jitter(rng, 25)
+        hotels.append({'name': f"Hotel {i}", 'rating': round(rng.uniform(3.0, 5.0), 1),
+                       'user_ratings_total': rng.randint(0, 5000), 'price_level': rng.randint(0, 4),
+                       'lat': lat, 'lng': lng})
+    return hotels
+
+
+def test_rank_500_hotels_against_30_days(benchmark):
+    hotels, itinerary = build_hotels(500), build_plan(30)
+    ranked = benchmark(rank_hotels, hotels, itinerary, 'mid')
+    assert len(ranked) == HOTELS_SHOWN
+    assert all(hotel['distance_km'] < 10 for hotel in ranked)
+
+
+def test_nearby_hotel_beats_a_better_rated_distant_one():
+    itinerary = build_plan(5)
+    near = {'name': 'Near', 'rating': 4.3, 'user_ratings_total': 800, 'price_level': 2, 'lat': CENTRE[0], 'lng': CENTRE[1]}
+    far = {'name': 'Far', 'rating': 4.6, 'user_ratings_total': 800, 'price_level': 2,
+           'lat': CENTRE[0] + 0.2, 'lng': CENTRE[1]}
+    assert rank_hotels([far, near], itinerary, 'mid', limit=1)[0]['name'] == 'Near'
+
+
+def test_plans_rank_from_a_larger_pool(app_module):
+    assert app_module.HOTELS_NEEDED >= HOTELS_SHOWN * 2
@@ -0,0 +1,50 @@
+"""Precomputed insights corpus: completions per itinerary and lookup cost.
+
+A small corpus is built against the mock LLM with the same pipeline as
+insights_corpus.py, then /generate is timed with the app reading from it.
+"""
+import pytest
+import requests
+
+from ai_content import budget_label
+from insights_corpus import InsightsCorpus, build_corpus
+from llm_providers import build_provider
+from load_driver import GENERATE_PAYLOAD
+
+NO_PREFERENCES = dict(GENERATE_PAYLOAD, travelStyle='', interests='', dietary='', aiPrompt='')
+
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory, mock_upstream_url):
+    corpus = InsightsCorpus(str(tmp_path_factory.mktemp('insights') / 'insights.sqlite'), writable=True)
+    stored, attempted = build_corpus(corpus, build_provider('llamacpp', base_url=mock_upstream_url),
+                                     [('Spain', 'Barcelona'), ('Spain', 'Madrid')], workers=2)
+    assert stored == attempted == 6
+    yield corpus
+    corpus.close()
+
+
+def test_corpus_lookup(benchmark, corpus):
+    label = budget_label(GENERATE_PAYLOAD['budget'] / GENERATE_PAYLOAD['days'])
+    entry = benchmark(corpus.get, 'Spain', 'Barcelona', label)
+    assert len(entry['tips']) == 6 and entry['insights']
+
+
+@pytest.mark.parametrize('payload,expected', [(NO_PREFERENCES, 0), (GENERATE_PAYLOAD, 1)],
+                         ids=['no-preferences', 'preferences'])
+def test_generate_with_corpus(benchmark, client, app_module, corpus, mock_upstream_url, monkeypatch, payload, expected):
+    """Completions per itinerary when the destination is in the corpus"""
+    monkeypatch.setattr(app_module, 'get_insights_corpus', lambda: corpus)
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    rounds = [0]
+
+    def generate():
+        rounds[0] += 1
+        return client.post('/generate', json=payload, headers={'Cache-Control': 'no-cache'})
+
+    response = benchmark.pedantic(generate, rounds=5, iterations=1)
+    completions = requests.get(f"{mock_upstream_url}/__mock__/stats").json().get('chat_completions', 0)
+    benchmark.extra_info['completions_per_itinerary'] = completions / rounds[0]
+    assert response.status_code == 200
+    assert len(response.get_json()['money_saving_tips']) == 6
+    assert completions / rounds[0] == expected
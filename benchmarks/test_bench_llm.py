@@ -0,0 +1,71 @@
+"""LLM provider benchmark: completion latency, time to first token and throughput.
+
+Every provider runs against mock_upstream.py by default, which isolates
+client overhead. To compare real backends, point a provider at a server:
+
+    BENCH_LLM_OLLAMA_URL=http://127.0.0.1:11434 BENCH_LLM_OLLAMA_MODEL=llama3.2:3b \
+    BENCH_LLM_LLAMACPP_URL=http://127.0.0.1:8080 \
+    BENCH_LLM_OPENAI_URL=https://api.openai.com/v1 BENCH_LLM_OPENAI_KEY=sk-... \
+    pytest benchmarks/test_bench_llm.py
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_content import COMBINED_MAX_TOKENS, build_messages, build_stream_messages, parse_content
+from llm_providers import PROVIDER_DEFAULTS, build_provider
+
+THROUGHPUT_CONCURRENCY = int(os.environ.get('BENCH_LLM_CONCURRENCY', 4))
+THROUGHPUT_REQUESTS = int(os.environ.get('BENCH_LLM_REQUESTS', 16))
+
+MESSAGES = build_messages(3, 2, 900, 'Spain', 'Barcelona', {'interests': 'museums, food'})
+STREAM_MESSAGES = build_stream_messages(3, 2, 900, 'Spain', 'Barcelona', {'interests': 'museums, food'})
+
+
+@pytest.fixture(params=sorted(PROVIDER_DEFAULTS))
+def provider(request, mock_upstream_url):
+    name = request.param
+    prefix = f"BENCH_LLM_{name.upper()}"
+    base_url = os.environ.get(f"{prefix}_URL")
+    if base_url is None:
+        base_url = f"{mock_upstream_url}/v1" if name == 'openai' else mock_upstream_url
+    return build_provider(name, os.environ.get(f"{prefix}_MODEL"), base_url, os.environ.get(f"{prefix}_KEY", 'mock'))
+
+
+def test_complete_latency(benchmark, provider):
+    content = benchmark.pedantic(provider.complete, args=(MESSAGES, COMBINED_MAX_TOKENS), kwargs={'json_mode': True},
+                                 rounds=5, iterations=1)
+    tips, insights = parse_content(content)
+    assert tips and insights
+
+
+def test_stream_first_token(benchmark, provider):
+    timings = {}
+
+    def stream():
+        started = time.perf_counter()
+        text = ''
+        for delta in provider.stream(STREAM_MESSAGES, COMBINED_MAX_TOKENS):
+            if not text:
+                timings['first_token_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            text += delta
+        return text
+
+    text = benchmark.pedantic(stream, rounds=3, iterations=1)
+    benchmark.extra_info.update(timings)
+    assert 'TIPS:' in text
+
+
+def test_throughput(benchmark, provider):
+    def burst():
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=THROUGHPUT_CONCURRENCY) as pool:
+            results = list(pool.map(lambda _: provider.complete(MESSAGES, COMBINED_MAX_TOKENS, json_mode=True),
+                                    range(THROUGHPUT_REQUESTS)))
+        return results, time.perf_counter() - started
+
+    results, elapsed = benchmark.pedantic(burst, rounds=1, iterations=1)
+    benchmark.extra_info['completions_per_s'] = round(len(results) / elapsed, 2)
+    assert all(parse_content(content)[0] for content in results)
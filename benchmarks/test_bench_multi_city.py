@@ -0,0 +1,44 @@
+"""Multi-city planner benchmarks: route ordering and a whole trip against the mock upstreams"""
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import requests
+
+from load_driver import GENERATE_PAYLOAD
+from multi_city import _distance_matrix, _path_length, allocate_days, order_route
+
+MULTI_CITY_PAYLOAD = dict(GENERATE_PAYLOAD, days=3, cities=['Barcelona', 'Madrid', 'Valencia'], start_date='2026-03-06')
+
+
+def random_stops(count, seed=9):
+    rng = random.Random(seed)
+    return [{'lat': rng.uniform(36, 43), 'lon': rng.uniform(-9, 3)} for _ in range(count)]
+
+
+def test_order_route_is_shortest(benchmark):
+    stops = random_stops(7)
+    order = benchmark(order_route, stops)
+    distances = _distance_matrix(stops)
+    shortest = min(_path_length((0,) + rest, distances) for rest in itertools.permutations(range(1, 7)))
+    assert abs(_path_length(order, distances) - shortest) < 1e-6
+
+
+def test_allocate_days_covers_the_trip():
+    for days in range(1, 31):
+        allocation = allocate_days(['A', 'B', 'C', 'D', 'E', 'F'], days)
+        assert sum(leg_days for _, leg_days in allocation) == days
+
+
+def test_generate_multi_city(benchmark, client, mock_upstream_url):
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    response = benchmark.pedantic(client.post, args=('/generate/multi-city',), kwargs={'json': MULTI_CITY_PAYLOAD},
+                                  rounds=3, iterations=1)
+    assert response.status_code == 200
+    trip = response.get_json()
+    days = [day_plan['day'] for leg in trip['legs'] for day_plan in leg['itinerary']]
+    assert days == list(range(1, MULTI_CITY_PAYLOAD['days'] + 1))
+    start = datetime.strptime(MULTI_CITY_PAYLOAD['start_date'], "%Y-%m-%d")
+    dates = [day_plan['date'] for leg in trip['legs'] for day_plan in leg['itinerary']]
+    assert dates == [(start + timedelta(days=day - 1)).strftime("%Y-%m-%d") for day in days]
+    assert len(trip['transfers']) == len(trip['route']) - 1
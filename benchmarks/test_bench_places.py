@@ -0,0 +1,50 @@
+"""Place acquisition benchmarks: the per-cell tile cache"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import place_planner
+from place_planner import CallCounter, acquire_places
+
+NEEDS = {'activities': 10, 'restaurants': 5, 'hotels': 5}
+
+
+def fake_search(fail):
+    def search(lat, lon, place_type, radius=15000, max_results=15, counter=None):
+        if fail:
+            counter.add_failure()
+            return []
+        kinds = {None: 'tourist_attraction', 'lodging': 'lodging', 'restaurant': 'restaurant'}
+        kind = kinds.get(place_type, place_type)
+        return [{'place_id': f"{kind}-{i}", 'name': f"{kind} {i}", 'types': [kind]} for i in range(max_results)]
+    return search
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def test_tile_hit(benchmark, executor):
+    place_planner.tile_cache.clear()
+    acquire_places(10.0, 20.0, NEEDS, fake_search(False), executor)
+    _, report = benchmark(acquire_places, 10.0, 20.0, NEEDS, fake_search(False), executor)
+    assert report['strategy'] == 'tiles'
+
+
+def test_failed_searches_are_not_cached(executor):
+    place_planner.tile_cache.clear()
+    places, _ = acquire_places(11.0, 21.0, NEEDS, fake_search(True), executor, counter=CallCounter())
+    assert not any(places.values())
+    places, report = acquire_places(11.0, 21.0, NEEDS, fake_search(False), executor)
+    assert report['strategy'] != 'tiles' and places['hotels']
+
+
+def test_failed_follow_up_page_is_a_failed_search(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'fetch_next_places_page', lambda token, counter=None: ([], None, 'UNKNOWN_ERROR'))
+    counter = CallCounter()
+    places = app_module.search_places_nearby(12.0, 22.0, 'restaurant', max_results=60, counter=counter)
+    report = counter.as_dict()
+    assert places and report['failed_searches'] == 1
+    assert report['total'] == report['nearby_search'] == 1
@@ -0,0 +1,69 @@
+"""Scheduler benchmark on a synthetic 30-day plan with real-looking opening hours"""
+import random
+from datetime import datetime, timedelta
+
+from scheduler import schedule_itinerary
+
+
+def build_itinerary(days, seed=7):
+    rng = random.Random(seed)
+    itinerary = []
+    for day in range(days):
+        activities = []
+        for index in range(2):
+            closed_on = rng.randint(0, 6)
+            opens, closes = rng.choice(['0800', '0900', '1000']), rng.choice(['1700', '1800', '2000'])
+            activities.append({
+                'name': f"Activity {day}-{index}",
+                'place_id': f"act_{day}_{index}",
+                'types': [rng.choice(['museum', 'tourist_attraction', 'park', 'zoo'])],
+                'lat': 41.39 + rng.uniform(-0.05, 0.05),
+                'lng': 2.17 + rng.uniform(-0.05, 0.05),
+                'opening_hours': {'periods': [
+                    {'open': {'day': g, 'time': opens}, 'close': {'day': g, 'time': closes}}
+                    for g in range(7) if g != closed_on
+                ]}
+            })
+        restaurant = {
+            'name': f"Restaurant {day}",
+            'place_id': f"rest_{day}",
+            'lat': 41.39 + rng.uniform(-0.05, 0.05),
+            'lng': 2.17 + rng.uniform(-0.05, 0.05),
+            'opening_hours': {'periods': [
+                {'open': {'day': g, 'time': '1200'}, 'close': {'day': g, 'time': '2300'}} for g in range(7)
+            ]}
+        }
+        itinerary.append({
+            'day': day + 1,
+            'date': (datetime(2026, 1, 5) + timedelta(days=day)).strftime("%Y-%m-%d"),
+            'activities': activities,
+            'restaurant': restaurant
+        })
+    return itinerary
+
+
+def test_schedule_30_days(benchmark):
+    result = benchmark.pedantic(
+        lambda itinerary: schedule_itinerary(itinerary, {'lat': 41.39, 'lng': 2.17}),
+        setup=lambda: ((build_itinerary(30),), {}),
+        rounds=30
+    )
+    assert all('schedule' in day for day in result)
+    assert benchmark.stats.stats.mean < 0.1
+
+
+def test_costs_follow_repaired_activities(app_module):
+    open_hours = {'periods': [{'open': {'day': g, 'time': '0900'}, 'close': {'day': g, 'time': '1800'}} for g in range(7)]}
+    # 2026-01-05 is a Monday (Google weekday 1), when the pricey museum is closed
+    museum = {'name': 'Museum', 'price_level': 4, 'types': ['museum'],
+              'opening_hours': {'periods': [p for p in open_hours['periods'] if p['open']['day'] != 1]}}
+    park = {'name': 'Park', 'price_level': 0, 'types': ['park'], 'opening_hours': open_hours}
+    planning = {'price_tables': {'activities': {level: level * 10 for level in range(5)}, 'meals': {2: 20}},
+                'people': 1, 'lodging': [0, 0], 'fixed_food': [0, 0], 'origin': None}
+    itinerary = [
+        app_module.cost_day({'day': 1, 'date': '2026-01-05', 'activities': [museum], 'restaurant': None}, planning),
+        app_module.cost_day({'day': 2, 'date': '2026-01-06', 'activities': [park], 'restaurant': None}, planning),
+    ]
+    app_module.schedule_days(itinerary, planning)
+    assert [activity['name'] for activity in itinerary[1]['activities']] == ['Park', 'Museum']
+    assert [day['cost_breakdown']['activities'] for day in itinerary] == [0, 40]
@@ -0,0 +1,37 @@
+"""Place scoring benchmark: scoring and top-k over candidate sets"""
+import random
+
+import pytest
+
+from place_scoring import rank_places
+
+TYPES = ['museum', 'art_gallery', 'park', 'church', 'zoo', 'night_club', 'shopping_mall', 'restaurant', 'cafe']
+PREFERENCES = {'travelStyle': 'cultural', 'interests': 'museums, parks', 'dietary': 'vegetarian'}
+
+
+def build_places(count, seed=7):
+    rng = random.Random(seed)
+    return [{
+        'name': f"Place {i}",
+        'rating': round(rng.uniform(3.0, 5.0), 1),
+        'user_ratings_total': int(rng.paretovariate(1.2) * 10) if rng.random() > 0.05 else 0,
+        'types': [rng.choice(TYPES), 'point_of_interest'],
+        'price_level': rng.randint(0, 4)
+    } for i in range(count)]
+
+
+@pytest.mark.parametrize('count', [60, 2000])
+def test_rank_places(benchmark, count):
+    places = build_places(count)
+    ranked = benchmark(rank_places, places, 20, PREFERENCES)
+    assert len(ranked) == 20
+    assert [place['score'] for place in ranked] == sorted((place['score'] for place in ranked), reverse=True)
+
+
+def test_reviews_outweigh_a_single_perfect_rating():
+    places = build_places(40) + [
+        {'name': 'One review', 'rating': 5.0, 'user_ratings_total': 1, 'types': ['aquarium']},
+        {'name': 'Well known', 'rating': 4.7, 'user_ratings_total': 50000, 'types': ['stadium']},
+    ]
+    names = [place['name'] for place in rank_places(places, len(places))]
+    assert names.index('Well known') < names.index('One review')
@@ -0,0 +1,54 @@
+"""Encode-time and payload-size benchmarks on a realistic 30-day itinerary"""
+import gzip
+import json
+
+import pytest
+
+import serialization
+
+
+@pytest.fixture(scope='module')
+def itinerary_30_days(app_module):
+    itinerary = app_module.generate_real_itinerary(30, 4, 20000, 'Spain', 'Barcelona', preferences={})
+    assert len(itinerary['itinerary']) == 30
+    return itinerary
+
+
+def test_encode_stdlib(benchmark, itinerary_30_days):
+    body = benchmark(lambda: json.dumps(itinerary_30_days, separators=(',', ':')).encode('utf-8'))
+    benchmark.extra_info['bytes'] = len(body)
+
+
+def test_encode_fast_path(benchmark, itinerary_30_days):
+    body = benchmark(serialization.dumps_bytes, itinerary_30_days)
+    benchmark.extra_info['bytes'] = len(body)
+    benchmark.extra_info['encoder'] = 'orjson' if serialization.orjson else 'stdlib'
+
+
+def test_compress_gzip(benchmark, itinerary_30_days):
+    body = serialization.dumps_bytes(itinerary_30_days)
+    compressed = benchmark(serialization.compress_body, body, 'gzip')
+    benchmark.extra_info.update({'raw_bytes': len(body), 'gzip_bytes': len(compressed)})
+    assert gzip.decompress(compressed) == body
+
+
+def test_compress_brotli(benchmark, itinerary_30_days):
+    if serialization.brotli is None:
+        pytest.skip('brotli not installed')
+    body = serialization.dumps_bytes(itinerary_30_days)
+    compressed = benchmark(serialization.compress_body, body, 'br')
+    benchmark.extra_info.update({'raw_bytes': len(body), 'br_bytes': len(compressed)})
+
+
+def test_generate_response_negotiation(client):
+    from load_driver import GENERATE_PAYLOAD
+
+    response = client.post('/generate', json=GENERATE_PAYLOAD, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers.get('Content-Encoding') == 'gzip'
+    assert 'Accept-Encoding' in response.headers.get('Vary', '')
+    assert json.loads(gzip.decompress(response.get_data()))['itinerary']
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        serialization.dumps_bytes({'value': object()})
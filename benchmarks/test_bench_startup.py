@@ -0,0 +1,59 @@
+"""Cold start: time from process start to the first successful /health response"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from conftest import ROOT
+
+STARTUP_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_health(command, port, extra_env=None):
+    env = dict(os.environ, PORT=str(port), **(extra_env or {}))
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < STARTUP_TIMEOUT:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"{command[0]} did not answer /health within {STARTUP_TIMEOUT}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def test_import_defers_heavy_modules():
+    """The OpenAI SDK and numpy load on first use, not when app.py is imported"""
+    code = "import sys, app; print(sorted({'openai', 'numpy'} & set(sys.modules)))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip().splitlines()[-1] == '[]'
+
+
+def test_dev_server_startup(benchmark):
+    benchmark.pedantic(lambda: time_to_first_health([sys.executable, 'app.py'], free_port()), rounds=3, iterations=1)
+
+
+@pytest.mark.skipif(shutil.which('gunicorn') is None, reason="gunicorn not installed")
+def test_gunicorn_preload_startup(benchmark):
+    command = [shutil.which('gunicorn'), '--config', 'gunicorn.conf.py', 'app:app']
+    benchmark.pedantic(lambda: time_to_first_health(command, free_port(), {'WEB_CONCURRENCY': '2'}), rounds=3, iterations=1)
@@ -0,0 +1,100 @@
+"""Tile pack benchmarks: building packs against the mock tile server"""
+import io
+import sqlite3
+import time
+import zipfile
+
+import pytest
+import requests
+
+import tile_packs
+from load_driver import GENERATE_PAYLOAD
+
+HEADERS = {'Authorization': 'Bearer bench-tiles'}
+
+
+@pytest.fixture(scope='module')
+def builder(tmp_path_factory, app_module, mock_upstream_url):
+    app_module.users_db['bench-tiles'] = app_module.User('bench-tiles', 'tiles@example.com', 'Bench', 'premium')
+    builder = tile_packs.TilePackBuilder(tile_packs.TileStore(str(tmp_path_factory.mktemp('tiles'))),
+                                         tile_url=f"{mock_upstream_url}/tiles/{{z}}/{{x}}/{{y}}.png",
+                                         fetch_concurrency=4, max_tiles=300)
+    original, tile_packs._builder = tile_packs._builder, builder
+    yield builder
+    tile_packs._builder = original
+
+
+def new_trip(client):
+    response = client.post('/generate', json=GENERATE_PAYLOAD, headers=HEADERS)
+    assert response.status_code == 200
+    return response.get_json()['trip_id']
+
+
+def download(client, trip_id, fmt, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        response = client.get(f'/api/trips/{trip_id}/tiles/{fmt}', headers=HEADERS)
+        if response.status_code != 202:
+            return response
+        time.sleep(0.05)
+    raise AssertionError(f"tile pack for {trip_id} was not ready within {timeout}s")
+
+
+def test_build_pack_and_reuse_tiles(benchmark, client, builder, mock_upstream_url):
+    """First pack fetches its tiles; a second trip in the same city fetches none"""
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    first = download(client, new_trip(client), 'mbtiles')
+    assert first.status_code == 200
+    fetched = requests.get(f"{mock_upstream_url}/__mock__/stats").json().get('tiles', 0)
+    assert fetched > 0
+
+    requests.delete(f"{mock_upstream_url}/__mock__/stats")
+    response = benchmark.pedantic(lambda: download(client, new_trip(client), 'zip'), rounds=1, iterations=1)
+    assert response.status_code == 200
+    assert requests.get(f"{mock_upstream_url}/__mock__/stats").json().get('tiles', 0) == 0
+
+    names = zipfile.ZipFile(io.BytesIO(response.data)).namelist()
+    assert len(names) == fetched and all(name.endswith('.png') for name in names)
+    benchmark.extra_info['tiles'] = fetched
+
+
+def test_mbtiles_deduplicates_images(client, builder, tmp_path):
+    response = download(client, new_trip(client), 'mbtiles')
+    path = tmp_path / 'pack.mbtiles'
+    path.write_bytes(response.data)
+    conn = sqlite3.connect(str(path))
+    tiles = conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+    images = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    conn.close()
+    assert tiles > images > 0
+
+
+def test_packs_are_keyed_by_content(builder):
+    """Two trips with the same id but different places never share a pack"""
+    def trip(lat):
+        place = {'name': 'Somewhere', 'lat': lat, 'lng': 2.17}
+        return {'destination': 'Barcelona, Spain', 'itinerary': [{'day': 1, 'activities': [place], 'restaurant': None}]}
+
+    first = download_pack(builder, trip(41.38))
+    second = download_pack(builder, trip(41.40))
+    assert first != second and download_pack(builder, trip(41.38)) == first
+    # Finished builds are forgotten; their packs are on disk
+    assert not builder._builds
+
+
+def test_offline_maps_need_a_tile_server(client, builder, monkeypatch):
+    trip_id = new_trip(client)
+    monkeypatch.setattr(tile_packs, '_builder', None)
+    monkeypatch.setattr(tile_packs, 'TILE_SERVER_URL', None)
+    assert client.get(f'/api/trips/{trip_id}/tiles/zip', headers=HEADERS).status_code == 503
+
+
+def download_pack(builder, trip, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        status, result = builder.request('trip_1', 1, trip, 'zip')
+        if status != 'building':
+            assert status == 'ready', result
+            return result
+        time.sleep(0.05)
+    raise AssertionError("tile pack was not ready in time")
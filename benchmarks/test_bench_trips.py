@@ -0,0 +1,64 @@
+"""Trip history benchmarks: paging one user's trips in a large store"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from load_driver import GENERATE_PAYLOAD
+from trip_store import TripStore
+
+USERS = 1000
+TRIPS = 200_000
+
+
+@pytest.fixture(scope='module')
+def store():
+    """A store holding TRIPS trips spread over USERS users"""
+    store = TripStore()
+    start = datetime(2024, 1, 1)
+    itinerary = {'total_estimated_cost': 500, 'check_in_date': '2024-06-01'}
+    for i in range(TRIPS):
+        store.add({
+            'user_id': f"user-{i % USERS}",
+            'destination': 'Paris, France',
+            'days': 3,
+            'budget': 'medium',
+            'created_at': start + timedelta(minutes=i),
+            'itinerary_data': itinerary,
+            'version': 1
+        })
+    return store
+
+
+def test_list_page(benchmark, store):
+    trips, cursor = benchmark(store.list_for_user, 'user-7', 20)
+    assert len(trips) == 20 and cursor
+    assert trips[0]['created_at'] > trips[-1]['created_at']
+
+
+def test_pages_cover_every_trip_once(store):
+    seen, cursor = [], None
+    while True:
+        trips, cursor = store.list_for_user('user-3', 50, cursor)
+        seen.extend(trip['trip_id'] for trip in trips)
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == store.count_for_user('user-3') == TRIPS // USERS
+    created = [store[trip_id]['created_at'] for trip_id in seen]
+    assert created == sorted(created, reverse=True)
+
+
+def test_trip_history_api(client, app_module):
+    app_module.users_db['bench-history'] = app_module.User('bench-history', 'history@example.com', 'Bench')
+    headers = {'Authorization': 'Bearer bench-history'}
+    trip_ids = [client.post('/generate', json=GENERATE_PAYLOAD, headers=headers).get_json()['trip_id']
+                for _ in range(3)]
+
+    first = client.get('/api/trips?limit=2', headers=headers).get_json()
+    rest = client.get(f"/api/trips?limit=2&cursor={first['next_cursor']}", headers=headers).get_json()
+    assert [trip['trip_id'] for trip in first['trips'] + rest['trips']] == trip_ids[::-1]
+    assert first['total'] == 3 and rest['next_cursor'] is None
+    assert 'itinerary_data' not in first['trips'][0]
+
+    detail = client.get(f'/api/trips/{trip_ids[0]}?compact=1', headers=headers).get_json()
+    assert detail['trip_id'] == trip_ids[0] and detail['itinerary']['places']
+    assert client.get('/api/trips?cursor=bogus', headers=headers).status_code == 400
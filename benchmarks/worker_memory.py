@@ -0,0 +1,129 @@
+"""Per-worker memory report for the gunicorn deployment.
+
+Starts gunicorn against mock upstreams twice - once with each worker
+importing the app itself (GUNICORN_PRELOAD=0) and once with the app and its
+static data preloaded and frozen in the master - drives some traffic so the
+workers touch the catalog and cost tables, and reports each worker's RSS,
+PSS and private memory from /proc (Linux only).
+
+    python benchmarks/worker_memory.py --workers 4 --json memory.json
+
+PSS divides shared pages between the processes sharing them, so the sum of
+worker PSS is what the workers actually cost the container.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mock_upstream  # noqa: E402
+from load_driver import run_load  # noqa: E402
+
+SMAPS_FIELDS = {'Rss': 'rss_mb', 'Pss': 'pss_mb', 'Private_Clean': 'private_clean', 'Private_Dirty': 'private_dirty'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def read_memory(pid):
+    """Rss, Pss and private memory of one process in MB, from smaps_rollup"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in SMAPS_FIELDS:
+                values[SMAPS_FIELDS[key]] = int(rest.split()[0]) / 1024
+    return {
+        'rss_mb': round(values['rss_mb'], 1),
+        'pss_mb': round(values['pss_mb'], 1),
+        'private_mb': round(values['private_clean'] + values['private_dirty'], 1)
+    }
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def wait_for_health(url, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            time.sleep(0.05)
+    raise RuntimeError(f"gunicorn did not answer {url}/health within {timeout}s")
+
+
+def measure(preload, workers, requests_per_scenario, env):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [shutil.which('gunicorn'), '--config', 'gunicorn.conf.py', 'app:app']
+    process_env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers), GUNICORN_PRELOAD='1' if preload else '0')
+    process = subprocess.Popen(command, cwd=ROOT, env=process_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_health(url)
+        for scenario in ('countries', 'cities', 'generate'):
+            run_load(url, scenario, concurrency=workers * 2, total_requests=requests_per_scenario)
+        time.sleep(0.5)
+        per_worker = [read_memory(pid) for pid in worker_pids(process.pid)]
+        return {
+            'preload': preload,
+            'master': read_memory(process.pid),
+            'workers': per_worker,
+            'worker_pss_total_mb': round(sum(worker['pss_mb'] for worker in per_worker), 1),
+            'worker_private_avg_mb': round(sum(worker['private_mb'] for worker in per_worker) / len(per_worker), 1)
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-worker memory of the gunicorn deployment')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=40, help='requests per scenario used to warm the workers')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    if not shutil.which('gunicorn') or not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit("gunicorn and a Linux /proc are required")
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server, mock_url = mock_upstream.start_in_thread()
+    env = dict(os.environ, **mock_upstream.upstream_env(mock_url))
+
+    results = [measure(preload, args.workers, args.requests, env) for preload in (False, True)]
+    server.shutdown()
+
+    for result in results:
+        label = 'preloaded' if result['preload'] else 'per-worker import'
+        rss = [worker['rss_mb'] for worker in result['workers']]
+        print(f"{label:<18} workers {len(rss)}  RSS/worker {sum(rss) / len(rss):>6.1f} MB  "
+              f"private/worker {result['worker_private_avg_mb']:>6.1f} MB  "
+              f"PSS total {result['worker_pss_total_mb']:>6.1f} MB  master RSS {result['master']['rss_mb']:>6.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'workers': args.workers, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
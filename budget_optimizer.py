@@ -0,0 +1,133 @@
+"""Budget-constrained place selection.
+
+Picks which activities and restaurants fill an itinerary's day slots so the
+summed experience value is as high as possible while the trip cost stays
+within the budget. The problem is a knapsack with fixed slot counts per
+category; it is solved by Lagrangian relaxation (a price on each dollar,
+bisected until the plan fits) followed by a swap pass that spends any
+budget the relaxation left on the table. Cheap enough to run on every
+/generate.
+"""
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Default per-person prices by Google price_level (0 = free ... 4 = very expensive)
+ACTIVITY_PRICE = {0: 0, 1: 8, 2: 15, 3: 30, 4: 50}
+MEAL_PRICE = {0: 8, 1: 12, 2: 25, 3: 45, 4: 80}
+
+BISECTION_STEPS = 40
+MAX_SWAPS = 50
+
+
+def place_cost(place, prices, people=1):
+    """Estimated spend on one place for the whole group"""
+    level = place.get('price_level')
+    if level is None:
+        level = 2
+    return prices.get(int(level), prices[2]) * people
+
+
+def default_value(place):
+    return place.get('rating', 0) or 0
+
+
+def _unique_by_name(places):
+    seen = set()
+    unique = []
+    for place in places:
+        if place['name'] not in seen:
+            seen.add(place['name'])
+            unique.append(place)
+    return unique
+
+
+def _pick(items, slots, price):
+    """Top `slots` items by value minus price * cost"""
+    return heapq.nlargest(slots, items, key=lambda item: item[0] - price * item[1])
+
+
+def _total_cost(selection):
+    return sum(cost for chosen in selection for _, cost, _ in chosen)
+
+
+def _improve(groups, selections, budget):
+    """Swap selected items for better unselected ones while the budget allows"""
+    spent = _total_cost(selections)
+    improved = True
+    swaps = 0
+    while improved and swaps < MAX_SWAPS:
+        improved = False
+        best = None
+        for index, (items, chosen) in enumerate(zip(groups, selections)):
+            chosen_ids = {id(item) for item in chosen}
+            spare = [item for item in items if id(item) not in chosen_ids]
+            for out_item in chosen:
+                for in_item in spare:
+                    gain = in_item[0] - out_item[0]
+                    if gain <= 0 or spent - out_item[1] + in_item[1] > budget:
+                        continue
+                    if best is None or gain > best[0]:
+                        best = (gain, index, out_item, in_item)
+        if best:
+            _, index, out_item, in_item = best
+            selections[index] = [in_item if item is out_item else item for item in selections[index]]
+            spent += in_item[1] - out_item[1]
+            swaps += 1
+            improved = True
+    return selections
+
+
+def optimize_selection(activities, restaurants, activity_slots, meal_slots, budget,
+                       people=1, price_tables=None, value=default_value):
+    """Choose activities and restaurants for the trip's slots within budget.
+
+    budget is what is left for places once fixed daily costs are paid;
+    price_tables maps 'activities' and 'meals' to per-person prices by
+    price_level for the destination.
+    Returns a dict with the chosen 'activities' and 'restaurants' (best
+    value first), their 'cost', and 'within_budget'. When even the
+    cheapest plan does not fit, that cheapest plan is returned.
+    """
+    price_tables = price_tables or {'activities': ACTIVITY_PRICE, 'meals': MEAL_PRICE}
+    groups = [
+        [(value(place), place_cost(place, price_tables['activities'], people), place) for place in _unique_by_name(activities)],
+        [(value(place), place_cost(place, price_tables['meals'], people), place) for place in _unique_by_name(restaurants)]
+    ]
+    slots = [min(activity_slots, len(groups[0])), min(meal_slots, len(groups[1]))]
+
+    def select(price):
+        return [_pick(items, count, price) for items, count in zip(groups, slots)]
+
+    selections = select(0.0)
+    within_budget = _total_cost(selections) <= budget
+    if not within_budget:
+        # Bisect the price per dollar until the relaxed choice fits
+        low, high = 0.0, 1.0
+        while _total_cost(select(high)) > budget and high < 1e6:
+            high *= 4
+        fits = select(high)
+        within_budget = _total_cost(fits) <= budget
+        if within_budget:
+            for _ in range(BISECTION_STEPS):
+                middle = (low + high) / 2
+                candidate = select(middle)
+                if _total_cost(candidate) <= budget:
+                    high, fits = middle, candidate
+                else:
+                    low = middle
+            selections = _improve(groups, fits, budget)
+        else:
+            selections = fits
+            logger.info(f"Cheapest plan still exceeds the places budget of {budget:.2f}")
+
+    chosen_activities, chosen_restaurants = (
+        [place for _, _, place in sorted(chosen, key=lambda item: item[0], reverse=True)] for chosen in selections
+    )
+    return {
+        'activities': chosen_activities,
+        'restaurants': chosen_restaurants,
+        'cost': round(_total_cost(selections), 2),
+        'within_budget': within_budget
+    }
@@ -0,0 +1,51 @@
+"""Static destination data shared by every worker.
+
+data/catalog.json holds the popular-city lists, hardcoded coordinates and
+fallback content that used to be rebuilt inside request handlers. It is
+loaded once - in the gunicorn master when the app is preloaded - into
+tuples and read-only mappings. Nothing writes to them afterwards, so the
+pages stay shared copy-on-write between forked workers; callers that need
+to modify an entry take a copy.
+"""
+import json
+import os
+from types import MappingProxyType
+import logging
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'catalog.json')
+
+
+def _freeze(value):
+    """Recursively turn lists into tuples and dicts into read-only mappings"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class Catalog:
+    """Immutable view of data/catalog.json"""
+
+    def __init__(self, path=CATALOG_PATH):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        self.fallback_countries = tuple(sorted(data['fallback_countries']))
+        self.fallback_tips = _freeze(data['fallback_tips'])
+        self.popular_cities = _freeze(data['popular_cities'])
+        self.city_coordinates = _freeze(data['city_coordinates'])
+        self.sample_places = _freeze(data['sample_places'])
+        logger.info(f"Loaded catalog: {len(self.popular_cities)} countries, {len(self.city_coordinates)} city coordinates")
+
+
+_catalog = None
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog()
+    return _catalog
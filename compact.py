@@ -0,0 +1,88 @@
+"""Compact itinerary responses.
+
+The full /generate response repeats every place inline and carries four
+booking URLs per activity. Compact mode moves each place into a shared
+'places' table keyed by place_id, has days and hotels reference those ids,
+and replaces per-activity booking links with URL templates the client
+fills in (or fetches from /api/links). select_fields() trims the response
+to the top-level keys a client asked for.
+"""
+
+# Keys that are always kept by field selection
+ALWAYS_INCLUDED = ('error', 'compact', 'trip_id')
+
+# Place fields kept in the compact table; opening hours are already reflected in each day's schedule
+COMPACT_PLACE_FIELDS = ('name', 'rating', 'reviews_count', 'address', 'price_level', 'types', 'lat', 'lng', 'distance_km')
+ROUNDED_FIELDS = ('lat', 'lng')
+
+
+def place_key(place):
+    """Stable reference for a place; sample places without a place_id use their name"""
+    return place.get('place_id') or f"name:{place.get('name', '')}"
+
+
+def compact_place(place):
+    """Whitelisted, normalised fields of one place (hotels use the raw search keys)"""
+    source = dict(place)
+    source.setdefault('reviews_count', place.get('user_ratings_total'))
+    source.setdefault('address', place.get('vicinity'))
+    compact = {}
+    for field in COMPACT_PLACE_FIELDS:
+        value = source.get(field)
+        if value is None or value == []:
+            continue
+        compact[field] = round(value, 5) if field in ROUNDED_FIELDS else value
+    if place.get('photos'):
+        compact['photo'] = place['photos'][0]
+    return compact
+
+
+def to_compact(itinerary, link_templates):
+    """Rewrite a full itinerary response into the compact, id-referenced shape"""
+    places = {}
+
+    def reference(place):
+        key = place_key(place)
+        if key not in places:
+            places[key] = compact_place(place)
+        return key
+
+    days = []
+    for day in itinerary.get('itinerary', []):
+        compact_day = {k: v for k, v in day.items() if k not in ('activities', 'restaurant', 'schedule')}
+        compact_day['activities'] = [reference(activity) for activity in day.get('activities', [])]
+        compact_day['restaurant'] = reference(day['restaurant']) if day.get('restaurant') else None
+        if 'schedule' in day:
+            compact_day['schedule'] = [
+                {**{k: v for k, v in entry.items() if k not in ('name', 'place_id')}, 'place': place_key(entry)}
+                for entry in day['schedule']
+            ]
+        days.append(compact_day)
+
+    compact = {k: v for k, v in itinerary.items() if k not in ('itinerary', 'hotels')}
+    compact['itinerary'] = days
+    compact['hotels'] = [reference(hotel) for hotel in itinerary.get('hotels', [])]
+    compact['places'] = places
+    compact['link_templates'] = link_templates
+    compact['compact'] = True
+    return compact
+
+
+def parse_fields(fields):
+    """Accept a comma-separated string or a list of top-level field names"""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    return {field.strip() for field in fields if field and field.strip()}
+
+
+def select_fields(response, fields):
+    """Keep only the requested top-level keys (plus the places table they reference)"""
+    fields = parse_fields(fields)
+    if not fields:
+        return response
+    if 'places' in response and fields & {'itinerary', 'hotels'}:
+        fields.add('places')
+        fields.add('link_templates')
+    return {k: v for k, v in response.items() if k in fields or k in ALWAYS_INCLUDED}
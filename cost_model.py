@@ -0,0 +1,179 @@
+"""Cost-of-living model for trip budgets.
+
+data/cost_of_living.json is loaded once into a component table (rows of
+lodging, food, activities) with country and city indexes. The estimator
+computes every day's lodging, food and activity cost for a whole trip, or a
+batch of trips, in one vectorized pass; numpy is used when installed and a
+plain Python loop gives the same numbers otherwise.
+"""
+import json
+import math
+import os
+from datetime import datetime
+import logging
+
+# numpy is imported with the cost table rather than with this module; it is
+# a sizeable share of app startup and most processes never estimate a trip
+np = None
+
+logger = logging.getLogger(__name__)
+
+COST_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cost_of_living.json')
+
+COMPONENTS = ('lodging', 'food', 'activities')
+
+# Per-component factors relative to the comfortable-traveller figures in the table
+LEVEL_FACTORS = {
+    'budget': (0.3, 0.4, 0.3),
+    'mid': (0.5, 0.6, 0.5),
+    'luxury': (1.0, 1.0, 1.0)
+}
+
+# Price of a place relative to an average one, by Google price_level
+PLACE_LEVEL_RATIO = {0: 0.0, 1: 0.6, 2: 1.0, 3: 1.7, 4: 2.8}
+ACTIVITIES_PER_DAY = 2
+
+# Friday and Saturday nights cost more in most cities
+WEEKEND_LODGING_FACTOR = 1.15
+WEEKEND_WEEKDAYS = (4, 5)
+
+# Share of the daily food figure spent on dinner; the itinerary's restaurant replaces it
+DINNER_SHARE = 0.4
+
+
+class CostTable:
+    """Component costs as a row array plus lookup indexes"""
+
+    def __init__(self, path=COST_TABLE_PATH):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        rows = [tuple(data['default'][c] for c in COMPONENTS)]
+        self.country_index = {}
+        self.city_index = {}
+
+        for entry in data['countries']:
+            self.country_index[entry['iso'].upper()] = len(rows)
+            self.country_index[entry['name'].lower()] = len(rows)
+            rows.append(tuple(entry[c] for c in COMPONENTS))
+
+        for entry in data['cities']:
+            self.city_index[(entry['country'].upper(), entry['city'].lower())] = len(rows)
+            rows.append(tuple(entry[c] for c in COMPONENTS))
+
+        self.iso_by_name = {entry['name'].lower(): entry['iso'].upper() for entry in data['countries']}
+        self.rows = rows
+        self.array = np.array(rows, dtype=float) if np is not None else None
+        logger.info(f"Loaded cost table: {len(data['countries'])} countries, {len(data['cities'])} cities")
+
+    def lookup(self, country, city=None):
+        """Row for a city if known, else its country, else the global default"""
+        country_key = (country or '').strip()
+        iso = country_key.upper() if len(country_key) == 2 else self.iso_by_name.get(country_key.lower())
+        if city and iso:
+            row = self.city_index.get((iso, city.strip().lower()))
+            if row is not None:
+                return row
+        return self.country_index.get(country_key.upper(), self.country_index.get(country_key.lower(), 0))
+
+
+_cost_table = None
+
+
+def _import_numpy():
+    global np
+    try:
+        import numpy
+    except ImportError:
+        return None
+    np = numpy
+    return np
+
+
+def get_cost_table():
+    global _cost_table
+    if _cost_table is None:
+        _import_numpy()
+        _cost_table = CostTable()
+    return _cost_table
+
+
+def place_price_tables(country, city=None):
+    """Per-person price by price_level for activities and dinners at a destination"""
+    table = get_cost_table()
+    lodging, food, activities = table.rows[table.lookup(country, city)]
+    activity_price = activities / ACTIVITIES_PER_DAY
+    dinner_price = food * DINNER_SHARE
+    return {
+        'activities': {level: round(activity_price * ratio, 2) for level, ratio in PLACE_LEVEL_RATIO.items()},
+        # Even a free-entry food stall costs something
+        'meals': {level: round(dinner_price * max(ratio, 0.3), 2) for level, ratio in PLACE_LEVEL_RATIO.items()}
+    }
+
+
+def _start_weekday(trip):
+    start_date = trip.get('start_date')
+    if start_date:
+        return datetime.strptime(start_date, "%Y-%m-%d").weekday()
+    return datetime.now().weekday()
+
+
+def _group_factors(people):
+    """Rooms shared two to a room; food and activities per person"""
+    return (math.ceil(people / 2), people, people)
+
+
+def estimate_trip_costs(trips):
+    """Per-day cost components for a batch of trips.
+
+    Each trip is a dict with country, city, days, people, budget_level and
+    an optional start_date (YYYY-MM-DD). Returns, per trip, a dict of
+    per-day lists for 'lodging', 'food', 'activities' and 'total', all for
+    the whole group.
+    """
+    table = get_cost_table()
+    rows = [table.lookup(trip['country'], trip.get('city')) for trip in trips]
+    levels = [LEVEL_FACTORS[trip.get('budget_level', 'mid')] for trip in trips]
+    groups = [_group_factors(trip.get('people', 1)) for trip in trips]
+    days = [trip['days'] for trip in trips]
+    weekdays = [_start_weekday(trip) for trip in trips]
+
+    if np is not None:
+        return _estimate_vectorized(table, rows, levels, groups, days, weekdays)
+    return _estimate_python(table, rows, levels, groups, days, weekdays)
+
+
+def _estimate_vectorized(table, rows, levels, groups, days, weekdays):
+    per_day = table.array[rows] * np.array(levels) * np.array(groups)
+
+    day_counts = np.array(days)
+    trip_of_day = np.repeat(np.arange(len(days)), day_counts)
+    first_day = np.repeat(np.cumsum(day_counts) - day_counts, day_counts)
+    weekday = (np.array(weekdays)[trip_of_day] + np.arange(day_counts.sum()) - first_day) % 7
+
+    costs = per_day[trip_of_day]
+    costs[:, 0] *= np.where(np.isin(weekday, WEEKEND_WEEKDAYS), WEEKEND_LODGING_FACTOR, 1.0)
+    totals = costs.sum(axis=1)
+
+    results = []
+    for trip_costs, trip_totals in zip(np.split(costs, np.cumsum(day_counts)[:-1]), np.split(totals, np.cumsum(day_counts)[:-1])):
+        result = {component: trip_costs[:, i].round(2).tolist() for i, component in enumerate(COMPONENTS)}
+        result['total'] = trip_totals.round(2).tolist()
+        results.append(result)
+    return results
+
+
+def _estimate_python(table, rows, levels, groups, days, weekdays):
+    results = []
+    for row, level, group, day_count, weekday in zip(rows, levels, groups, days, weekdays):
+        base = [table.rows[row][i] * level[i] * group[i] for i in range(len(COMPONENTS))]
+        result = {component: [] for component in COMPONENTS}
+        result['total'] = []
+        for day in range(day_count):
+            weekend = (weekday + day) % 7 in WEEKEND_WEEKDAYS
+            day_costs = [base[0] * (WEEKEND_LODGING_FACTOR if weekend else 1.0), base[1], base[2]]
+            for component, cost in zip(COMPONENTS, day_costs):
+                result[component].append(round(cost, 2))
+            result['total'].append(round(sum(day_costs), 2))
+        results.append(result)
+    return results
@@ -0,0 +1,306 @@
+"""Trip exports for premium users: PDF, ICS calendar and GeoJSON.
+
+Rendering happens in a small process pool so a long PDF never holds a
+request worker's GIL. The pool uses spawned processes (the app's threads
+make forking unsafe) that import only this module, and it is created on
+the first export, in the worker, never in the preloaded master. Results
+are cached per trip version, so an unchanged trip is rendered once however
+often it is downloaded; concurrent requests for the same export share one
+render.
+
+The PDF writer is deliberately minimal: text pages in Helvetica, written
+by hand, so exports need no extra dependency.
+"""
+from datetime import datetime, timezone
+import json
+import os
+import zlib
+import logging
+
+from cache import SingleFlight, TTLCache
+
+logger = logging.getLogger(__name__)
+
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_TIMEOUT = float(os.environ.get('EXPORT_TIMEOUT', 60))
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Format -> (subscription feature, mimetype, file extension)
+EXPORT_FORMATS = {
+    'pdf': ('pdf_export', 'application/pdf', 'pdf'),
+    'ics': ('calendar_sync', 'text/calendar', 'ics'),
+    'geojson': ('offline_maps', 'application/geo+json', 'geojson'),
+}
+
+export_cache = TTLCache(max_entries=256, default_ttl=24 * 3600)
+_renders = SingleFlight()
+_pool = None
+
+
+def trip_days(trip):
+    """Every day_plan of a single- or multi-city trip, in order"""
+    if 'legs' in trip:
+        return [day_plan for leg in trip['legs'] for day_plan in leg.get('itinerary', [])]
+    return list(trip.get('itinerary', []))
+
+
+def trip_hotels(trip):
+    if 'legs' in trip:
+        return [hotel for leg in trip['legs'] for hotel in leg.get('hotels', [])]
+    return list(trip.get('hotels', []))
+
+
+def day_date(day_plan):
+    """Calendar date of a day; the planner dates every day from the trip's start"""
+    return datetime.strptime(day_plan['date'], "%Y-%m-%d")
+
+
+def _places_by_name(day_plan):
+    places = {activity['name']: activity for activity in day_plan['activities']}
+    if day_plan.get('restaurant'):
+        places[day_plan['restaurant']['name']] = day_plan['restaurant']
+    return places
+
+
+# GeoJSON
+
+def render_geojson(trip):
+    features = []
+
+    def add(place, kind, day=None):
+        if place.get('lat') is None or place.get('lng') is None:
+            return
+        properties = {'name': place.get('name', ''), 'kind': kind}
+        if day is not None:
+            properties['day'] = day
+        for key, source in (('address', 'address'), ('address', 'vicinity'), ('rating', 'rating')):
+            if place.get(source) and key not in properties:
+                properties[key] = place[source]
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [place['lng'], place['lat']]},
+            'properties': properties
+        })
+
+    for day_plan in trip_days(trip):
+        for activity in day_plan['activities']:
+            add(activity, 'activity', day_plan['day'])
+        if day_plan.get('restaurant'):
+            add(day_plan['restaurant'], 'restaurant', day_plan['day'])
+    for hotel in trip_hotels(trip):
+        add(hotel, 'hotel')
+    collection = {'type': 'FeatureCollection', 'name': trip.get('destination', ''), 'features': features}
+    return json.dumps(collection, ensure_ascii=False).encode('utf-8')
+
+
+# ICS (RFC 5545)
+
+def _ics_text(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _ics_fold(line):
+    """Lines longer than 75 octets continue on the next line after a space"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return [line]
+    lines, current = [], ''
+    for char in line:
+        limit = 75 if not lines else 74
+        if len((current + char).encode('utf-8')) > limit:
+            lines.append(current)
+            current = char
+        else:
+            current += char
+    lines.append(current)
+    return [lines[0]] + [' ' + rest for rest in lines[1:]]
+
+
+def render_ics(trip, trip_id='trip'):
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//TripCraft//Itinerary//EN', 'CALSCALE:GREGORIAN',
+             f"X-WR-CALNAME:{_ics_text(trip.get('destination', 'Trip'))}"]
+    for day_plan in trip_days(trip):
+        date = day_date(day_plan).strftime("%Y%m%d")
+        places = _places_by_name(day_plan)
+        for index, entry in enumerate(day_plan.get('schedule', [])):
+            place = places.get(entry['name'], {})
+            description = f"Day {day_plan['day']} {entry.get('type', 'activity')}"
+            event = [
+                'BEGIN:VEVENT',
+                f"UID:{trip_id}-{day_plan['day']}-{index}@tripcraft",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART:{date}T{entry['start'].replace(':', '')}00",
+                f"DTEND:{date}T{entry['end'].replace(':', '')}00",
+                f"SUMMARY:{_ics_text(entry['name'])}",
+                f"DESCRIPTION:{_ics_text(description)}",
+            ]
+            if place.get('address'):
+                event.append(f"LOCATION:{_ics_text(place['address'])}")
+            if place.get('lat') is not None and place.get('lng') is not None:
+                event.append(f"GEO:{place['lat']:.6f};{place['lng']:.6f}")
+            event.append('END:VEVENT')
+            lines.extend(event)
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(folded for line in lines for folded in _ics_fold(line)) + '\r\n').encode('utf-8')
+
+
+# PDF
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+MARGIN = 54
+FONT_SIZE = 10
+LINE_HEIGHT = 14
+WRAP_CHARS = 95
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+
+
+def _pdf_text(text):
+    """Latin-1 text for the standard fonts, with PDF string delimiters escaped"""
+    text = ''.join(char for char in str(text) if ord(char) < 256).strip()
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _wrap(text, width=WRAP_CHARS):
+    words, lines, current = text.split(), [], ''
+    for word in words:
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    lines.append(current)
+    return lines
+
+
+def trip_lines(trip):
+    """(text, bold) lines of the printable itinerary"""
+    lines = [(trip.get('destination', 'Trip'), True)]
+    if trip.get('check_in_date'):
+        lines.append((f"{trip['check_in_date']} to {trip.get('check_out_date', '')}", False))
+    lines.append((f"{trip.get('total_days', len(trip_days(trip)))} days, {trip.get('total_people', 1)} people, "
+                  f"budget ${trip.get('budget', 0):,.0f}, estimated ${trip.get('total_estimated_cost', 0):,.0f}", False))
+    if trip.get('ai_insights'):
+        lines.append(('', False))
+        lines.extend((line, False) for line in _wrap(trip['ai_insights']))
+
+    for day_plan in trip_days(trip):
+        lines.append(('', False))
+        lines.append((f"Day {day_plan['day']} - {day_date(day_plan).strftime('%A %d %B %Y')}", True))
+        entries = day_plan.get('schedule') or [{'name': activity['name']} for activity in day_plan['activities']]
+        for entry in entries:
+            times = f"{entry['start']}-{entry['end']}  " if entry.get('start') else ''
+            lines.extend((line, False) for line in _wrap(f"{times}{entry['name']}"))
+        lines.append((f"Estimated cost: ${day_plan.get('estimated_cost', 0):,.2f}", False))
+
+    hotels = trip_hotels(trip)
+    if hotels:
+        lines.append(('', False))
+        lines.append(('Hotels', True))
+        for hotel in hotels:
+            address = hotel.get('vicinity') or hotel.get('address') or ''
+            lines.extend((line, False) for line in _wrap(f"{hotel['name']}  {address}"))
+
+    tips = trip.get('money_saving_tips') or [tip for leg in trip.get('legs', []) for tip in leg.get('money_saving_tips', [])]
+    if tips:
+        lines.append(('', False))
+        lines.append(('Tips', True))
+        for tip in tips:
+            lines.extend((line, False) for line in _wrap(tip))
+    return [(_pdf_text(text), bold) for text, bold in lines]
+
+
+def _page_stream(lines):
+    commands = ['BT', f"{LINE_HEIGHT} TL", f"{MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+    font = None
+    for text, bold in lines:
+        if bold != font:
+            commands.append(f"/{'F2' if bold else 'F1'} {FONT_SIZE + 2 if bold else FONT_SIZE} Tf")
+            font = bold
+        commands.append(f"({text}) Tj T*")
+    commands.append('ET')
+    return zlib.compress('\n'.join(commands).encode('latin-1'))
+
+
+def render_pdf(trip):
+    lines = trip_lines(trip)
+    pages = [lines[start:start + LINES_PER_PAGE] for start in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+
+    # Objects 1-4 are the catalog, page tree and fonts; each page then has a page and a content object
+    objects = [None, None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for page in pages:
+        stream = _page_stream(page)
+        page_id, content_id = len(objects) + 1, len(objects) + 2
+        page_ids.append(page_id)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                       f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>".encode())
+        objects.append(f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode() + stream + b"\nendstream")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {len(page_ids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+# Rendering in the process pool
+
+def render(fmt, trip, trip_id='trip'):
+    """Bytes of the trip in one of EXPORT_FORMATS; runs in the export processes"""
+    if fmt == 'pdf':
+        return render_pdf(trip)
+    if fmt == 'ics':
+        return render_ics(trip, trip_id)
+    if fmt == 'geojson':
+        return render_geojson(trip)
+    raise ValueError(f"Unknown export format '{fmt}'")
+
+
+def export_pool():
+    global _pool
+    if _pool is None:
+        # multiprocessing is only imported by processes that actually export
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+        _pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def reset_export_pool():
+    """Forget the pool after a fork; its processes belong to the parent"""
+    global _pool
+    _pool = None
+
+
+def export_trip(trip_id, version, trip, fmt):
+    """The rendered export, from the cache when this trip version was exported before"""
+    key = (trip_id, version, fmt)
+    data = export_cache.get(key)
+    if data is not None:
+        return data
+
+    def run():
+        started = datetime.now()
+        data = export_pool().submit(render, fmt, trip, trip_id).result(timeout=EXPORT_TIMEOUT)
+        export_cache.set(key, data)
+        logger.info(f"Rendered {fmt} export of {trip_id} v{version}: {len(data)} bytes in "
+                    f"{(datetime.now() - started).total_seconds() * 1000:.0f} ms")
+        return data
+
+    return _renders.do(key, run)
+
+
+def iter_chunks(data, size=EXPORT_CHUNK_BYTES):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
@@ -0,0 +1,72 @@
+"""Geographic helpers shared by the scheduling and ranking code"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def has_coordinates(place):
+    return place is not None and place.get('lat') is not None and place.get('lng') is not None
+
+
+def centroid(places):
+    """Mean position of the places that have coordinates, or None"""
+    located = [place for place in places if has_coordinates(place)]
+    if not located:
+        return None
+    return {
+        'lat': sum(place['lat'] for place in located) / len(located),
+        'lng': sum(place['lng'] for place in located) / len(located)
+    }
+
+
+class GridIndex:
+    """Places bucketed into square lat/lng cells for radius queries.
+
+    Cells are cell_km tall; their width in degrees is widened by the
+    latitude of the first point so cells stay roughly square. Queries only
+    visit the cells overlapping the search circle.
+    """
+
+    def __init__(self, places, cell_km=1.0):
+        self.cell_km = cell_km
+        located = [place for place in places if has_coordinates(place)]
+        reference_lat = located[0]['lat'] if located else 0.0
+        self.lat_step = cell_km / 111.32
+        self.lng_step = self.lat_step / max(0.01, math.cos(math.radians(reference_lat)))
+        self.cells = {}
+        for place in located:
+            self.cells.setdefault(self._cell(place['lat'], place['lng']), []).append(place)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.cells.values())
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.lat_step)), int(math.floor(lng / self.lng_step))
+
+    def within(self, lat, lng, radius_km):
+        """(distance_km, place) pairs within radius_km of the point, nearest first"""
+        row, col = self._cell(lat, lng)
+        reach = int(math.ceil(radius_km / self.cell_km)) + 1
+        if (2 * reach + 1) ** 2 > len(self.cells):
+            # A wide circle over a sparse grid: walk the occupied cells instead
+            cells = [bucket for (r, c), bucket in self.cells.items() if abs(r - row) <= reach and abs(c - col) <= reach]
+        else:
+            cells = [self.cells.get((r, c), ()) for r in range(row - reach, row + reach + 1)
+                     for c in range(col - reach, col + reach + 1)]
+        found = []
+        for bucket in cells:
+            for place in bucket:
+                distance = haversine_km(lat, lng, place['lat'], place['lng'])
+                if distance <= radius_km:
+                    found.append((distance, place))
+        found.sort(key=lambda item: item[0])
+        return found
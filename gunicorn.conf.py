@@ -0,0 +1,34 @@
+"""gunicorn settings for production (picked up automatically from the working directory).
+
+The app is imported once in the master (preload_app) so workers fork with
+the modules and read-only data already in memory instead of each importing
+them again. Anything holding sockets or threads is created lazily and
+reset in post_fork, so no connection is shared between workers.
+"""
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Threads let health checks and cheap lookups run beside planning; admission.py keeps
+# RESERVED_THREADS of them free of planning and downloads
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    import app
+    app.warm_up()
+    # Move everything loaded so far out of the collector's reach: a collection in
+    # a worker would otherwise write to these objects' headers and un-share their pages
+    gc.freeze()
+    server.log.info(f"App preloaded; {gc.get_freeze_count()} objects frozen and shared with workers")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import app
+        app.reset_after_fork()
@@ -0,0 +1,94 @@
+"""Hotel recommendations for a planned itinerary.
+
+Lodging used to be listed by raw rating wherever it was. Once the days are
+planned, each hotel is scored by
+
+- its average distance to the days' clusters (the centroid of each day's
+  activities and restaurant, weighted by how many places the day has),
+- how far its price_level is from what the budget category pays for,
+- its Bayesian rating (see place_scoring.py),
+
+and only the best few are returned. A hotel's average distance to the
+clusters is at least its distance to their weighted centre, so hotels are
+pulled from a grid index around that centre, widening the search only
+until there are enough candidates, instead of measuring every hotel
+against every day.
+"""
+from geo import GridIndex, centroid, haversine_km, has_coordinates
+from place_scoring import PlaceScorer, top_k
+
+HOTELS_SHOWN = 5
+# Score lost per kilometre of average distance to the days' clusters
+DISTANCE_PENALTY_PER_KM = 0.12
+# Score lost per price_level step away from the budget category's target
+PRICE_PENALTY = 0.3
+TARGET_PRICE_LEVEL = {'budget': 1, 'mid': 2, 'luxury': 3.5}
+# Hotels without coordinates are treated as this far from everything
+UNKNOWN_DISTANCE_KM = 15.0
+
+INDEX_CELL_KM = 1.0
+SEARCH_MARGIN_KM = 3.0
+# Candidates gathered per hotel returned before the search stops widening
+CANDIDATES_PER_RESULT = 4
+
+
+def day_clusters(itinerary):
+    """(centre, weight) for each day with located places"""
+    clusters = []
+    for day_plan in itinerary:
+        places = list(day_plan['activities'])
+        if day_plan.get('restaurant'):
+            places.append(day_plan['restaurant'])
+        centre = centroid(places)
+        if centre:
+            clusters.append((centre, sum(has_coordinates(place) for place in places)))
+    return clusters
+
+
+def _weighted_centre(clusters):
+    total = sum(weight for _, weight in clusters)
+    return (sum(centre['lat'] * weight for centre, weight in clusters) / total,
+            sum(centre['lng'] * weight for centre, weight in clusters) / total)
+
+
+def _candidates(hotels, clusters, wanted):
+    """Hotels near the plan's centre, widening the radius until `wanted` are found"""
+    index = GridIndex(hotels, INDEX_CELL_KM)
+    lat, lng = _weighted_centre(clusters)
+    radius = max(haversine_km(lat, lng, centre['lat'], centre['lng']) for centre, _ in clusters) + SEARCH_MARGIN_KM
+    found = index.within(lat, lng, radius)
+    while len(found) < min(wanted, len(index)):
+        radius *= 2
+        found = index.within(lat, lng, radius)
+    unlocated = [hotel for hotel in hotels if not has_coordinates(hotel)]
+    return [hotel for _, hotel in found] + unlocated
+
+
+def average_distance_km(hotel, clusters):
+    if not has_coordinates(hotel):
+        return UNKNOWN_DISTANCE_KM
+    total = sum(weight for _, weight in clusters)
+    return sum(haversine_km(hotel['lat'], hotel['lng'], centre['lat'], centre['lng']) * weight
+               for centre, weight in clusters) / total
+
+
+def rank_hotels(hotels, itinerary, budget_category, limit=HOTELS_SHOWN):
+    """The best `limit` hotels for this plan, as copies with 'score' and 'distance_km'"""
+    if not hotels:
+        return []
+    clusters = day_clusters(itinerary)
+    candidates = _candidates(hotels, clusters, limit * CANDIDATES_PER_RESULT) if clusters else list(hotels)
+    ratings = PlaceScorer().score(candidates, diversity=False)
+    target = TARGET_PRICE_LEVEL.get(budget_category, 2)
+
+    ranked = []
+    for hotel, rating in zip(candidates, ratings):
+        level = hotel.get('price_level')
+        score = rating - PRICE_PENALTY * abs((2 if level is None else level) - target)
+        distance = None
+        if clusters:
+            average = average_distance_km(hotel, clusters)
+            score -= DISTANCE_PENALTY_PER_KM * average
+            distance = round(average, 1) if has_coordinates(hotel) else None
+        ranked.append(dict(hotel, score=round(score, 4), distance_km=distance))
+    return top_k(ranked, limit)
@@ -0,0 +1,180 @@
+"""Precomputed destination insights and tips.
+
+An offline pipeline asks the LLM once per catalog city and budget level for
+the preference-free overview and tips, and stores them zlib-compressed in a
+small SQLite file. At request time the base content is read from there:
+with no preferences it is served as is and the LLM is skipped entirely,
+otherwise one short completion tailors it (see ai_content.py).
+
+Build or refresh the store with the app's LLM provider settings:
+
+    python insights_corpus.py --workers 4
+    python insights_corpus.py --country Spain --refresh
+
+Deploys build it as part of render.yaml's buildCommand; --if-configured
+lets a build without LLM credentials go ahead without the corpus.
+
+The app reads INSIGHTS_CORPUS_PATH (default data/insights.sqlite) and runs
+without it, generating everything live, when the file is absent.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import logging
+
+from ai_content import BUDGET_LABELS, COMBINED_MAX_TOKENS, build_base_messages, parse_content
+
+logger = logging.getLogger(__name__)
+
+CORPUS_PATH = os.environ.get('INSIGHTS_CORPUS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'insights.sqlite'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS insights (
+    country TEXT NOT NULL,
+    city TEXT NOT NULL,
+    budget TEXT NOT NULL,
+    content BLOB NOT NULL,
+    model TEXT,
+    created_at TEXT,
+    PRIMARY KEY (country, city, budget)
+) WITHOUT ROWID
+"""
+
+
+def _key(value):
+    return (value or '').strip().lower()
+
+
+class InsightsCorpus:
+    """Base tips and insights keyed by country, city and budget level"""
+
+    def __init__(self, path=CORPUS_PATH, writable=False):
+        self.path = path
+        if writable:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(SCHEMA)
+        else:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def get(self, country, city, budget):
+        """{'tips': [...], 'insights': '...'} or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM insights WHERE country = ? AND city = ? AND budget = ?",
+                (_key(country), _key(city), budget)
+            ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    def has(self, country, city, budget):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM insights WHERE country = ? AND city = ? AND budget = ?",
+                (_key(country), _key(city), budget)
+            ).fetchone() is not None
+
+    def put(self, country, city, budget, tips, insights, model=None):
+        content = zlib.compress(json.dumps({'tips': tips, 'insights': insights}, ensure_ascii=False).encode('utf-8'), 9)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO insights VALUES (?, ?, ?, ?, ?, ?)",
+                (_key(country), _key(city), budget, content, model, datetime.now().isoformat(timespec='seconds'))
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+_corpus = None
+_corpus_checked = False
+
+
+def get_insights_corpus():
+    """The read-only corpus for this process, or None when no store has been built"""
+    global _corpus, _corpus_checked
+    if not _corpus_checked:
+        _corpus_checked = True
+        if os.path.exists(CORPUS_PATH):
+            _corpus = InsightsCorpus(CORPUS_PATH)
+            logger.info(f"Loaded insights corpus: {len(_corpus)} entries")
+    return _corpus
+
+
+def reset_corpus():
+    """Forget the connection; SQLite handles must not cross a fork"""
+    global _corpus, _corpus_checked
+    _corpus, _corpus_checked = None, False
+
+
+def build_corpus(corpus, provider, cities, budgets=BUDGET_LABELS, workers=4, refresh=False):
+    """Generate and store base content for (country, city) pairs; returns (stored, attempted)"""
+    jobs = [(country, city, budget) for country, city in cities for budget in budgets
+            if refresh or not corpus.has(country, city, budget)]
+
+    def run(job):
+        country, city, budget = job
+        try:
+            content = provider.complete(build_base_messages(country, city, budget), COMBINED_MAX_TOKENS, json_mode=True)
+        except Exception as e:
+            logger.warning(f"Generating {city}, {country} ({budget}) failed: {e}")
+            return False
+        tips, insights = parse_content(content)
+        if not tips or len(tips) < 6 or not insights:
+            logger.warning(f"Incomplete content for {city}, {country} ({budget}); skipped")
+            return False
+        corpus.put(country, city, budget, tips, insights, provider.model)
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        stored = sum(pool.map(run, jobs))
+    return stored, len(jobs)
+
+
+def main():
+    from catalog import get_catalog
+    from llm_providers import provider_from_env
+
+    parser = argparse.ArgumentParser(description='Pre-generate destination insights for the city catalog')
+    parser.add_argument('--path', default=CORPUS_PATH)
+    parser.add_argument('--country', action='append', help='only these countries (repeatable)')
+    parser.add_argument('--budget', action='append', choices=BUDGET_LABELS, help='only these budget levels (repeatable)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--refresh', action='store_true', help='regenerate entries that already exist')
+    parser.add_argument('--if-configured', action='store_true',
+                        help='exit quietly instead of failing when no LLM provider is configured (deploy builds)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    provider = provider_from_env()
+    if not provider.available:
+        if args.if_configured:
+            print(f"LLM provider '{provider.name}' is not configured; no insights corpus built")
+            return
+        raise SystemExit(f"LLM provider '{provider.name}' is not configured")
+
+    cities = [(country, city) for country, names in get_catalog().popular_cities.items()
+              if not args.country or country in args.country for city in names]
+    corpus = InsightsCorpus(args.path, writable=True)
+    stored, attempted = build_corpus(corpus, provider, cities, args.budget or BUDGET_LABELS, args.workers, args.refresh)
+    print(f"Stored {stored} of {attempted} entries with {provider.name} ({provider.model}); corpus now has {len(corpus)}")
+    corpus.close()
+
+
+if __name__ == '__main__':
+    main()
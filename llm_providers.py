@@ -0,0 +1,230 @@
+"""LLM providers for tips and insights.
+
+Every provider offers the same two calls - complete() for a whole answer
+and stream() for text deltas - so the rest of the app does not care where
+the model runs:
+
+- openai:   the OpenAI API through whichever SDK is installed (new or legacy)
+- ollama:   a local Ollama server (/api/chat)
+- llamacpp: a local llama.cpp server or any other OpenAI-compatible HTTP
+            endpoint, spoken to with plain requests instead of the SDK
+
+LLM_PROVIDER picks one; LLM_BASE_URL and LLM_MODEL override its defaults.
+"""
+import json
+import os
+import threading
+import logging
+
+import requests
+
+from request_context import upstream_timeout
+
+logger = logging.getLogger(__name__)
+
+# Longest any one LLM call may take; the current request's deadline caps it further
+LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 60))
+
+
+class LLMProvider:
+    """Interface shared by all providers"""
+
+    name = 'base'
+
+    def __init__(self, model, base_url=None):
+        self.model = model
+        self.base_url = base_url.rstrip('/') if base_url else None
+
+    @property
+    def available(self):
+        return True
+
+    def complete(self, messages, max_tokens, temperature=0.7, json_mode=False):
+        """Full completion text"""
+        raise NotImplementedError
+
+    def stream(self, messages, max_tokens, temperature=0.7):
+        """Yield completion text deltas as they arrive"""
+        raise NotImplementedError
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI API via the new client or the legacy module-level SDK"""
+
+    name = 'openai'
+
+    def __init__(self, model, base_url=None, api_key=None):
+        super().__init__(model, base_url)
+        self.api_key = api_key
+        self._api = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def client(self):
+        """('new', client), ('legacy', openai module) or (None, None); the SDK is imported on first use"""
+        if self._api is None:
+            with self._lock:
+                if self._api is None:
+                    self._api = self._build_client()
+        return self._api
+
+    def _build_client(self):
+        if not self.api_key:
+            return None, None
+        try:
+            from openai import OpenAI
+            logger.info("Using new OpenAI client")
+            return 'new', OpenAI(api_key=self.api_key, base_url=self.base_url)
+        except ImportError:
+            pass
+        try:
+            import openai
+            openai.api_key = self.api_key
+            if self.base_url:
+                openai.api_base = self.base_url
+            logger.info("Using legacy OpenAI client")
+            return 'legacy', openai
+        except ImportError:
+            logger.warning("OpenAI not available")
+            return None, None
+
+    def _create(self, **request_args):
+        api, llm = self.client()
+        if api == 'new':
+            return api, llm.chat.completions.create(model=self.model, timeout=upstream_timeout(LLM_TIMEOUT),
+                                                    **request_args)
+        if api == 'legacy':
+            return api, llm.ChatCompletion.create(model=self.model, request_timeout=upstream_timeout(LLM_TIMEOUT),
+                                                  **request_args)
+        raise RuntimeError("OpenAI client not available")
+
+    def complete(self, messages, max_tokens, temperature=0.7, json_mode=False):
+        request_args = {'messages': messages, 'max_tokens': max_tokens, 'temperature': temperature}
+        if json_mode:
+            request_args['response_format'] = {'type': 'json_object'}
+        _, response = self._create(**request_args)
+        usage = getattr(response, 'usage', None)
+        if usage:
+            logger.info(f"Completion used {usage.total_tokens} tokens (budget {max_tokens})")
+        return response.choices[0].message.content
+
+    def stream(self, messages, max_tokens, temperature=0.7):
+        api, chunks = self._create(messages=messages, max_tokens=max_tokens, temperature=temperature, stream=True)
+        for chunk in chunks:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            content = delta.content if api == 'new' else delta.get('content')
+            if content:
+                yield content
+
+
+class LocalHTTPProvider(LLMProvider):
+    """Base for model servers reached over plain HTTP with a per-process session"""
+
+    def __init__(self, model, base_url):
+        super().__init__(model, base_url)
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def _post(self, path, payload, stream=False):
+        response = self.session.post(f"{self.base_url}{path}", json=payload, stream=stream,
+                                     timeout=upstream_timeout(LLM_TIMEOUT))
+        response.raise_for_status()
+        return response
+
+
+class OllamaProvider(LocalHTTPProvider):
+    """Ollama's native chat API; streams newline-delimited JSON"""
+
+    name = 'ollama'
+
+    def _payload(self, messages, max_tokens, temperature, stream):
+        return {
+            'model': self.model,
+            'messages': messages,
+            'stream': stream,
+            'options': {'num_predict': max_tokens, 'temperature': temperature}
+        }
+
+    def complete(self, messages, max_tokens, temperature=0.7, json_mode=False):
+        payload = self._payload(messages, max_tokens, temperature, stream=False)
+        if json_mode:
+            payload['format'] = 'json'
+        return self._post('/api/chat', payload).json()['message']['content']
+
+    def stream(self, messages, max_tokens, temperature=0.7):
+        with self._post('/api/chat', self._payload(messages, max_tokens, temperature, stream=True), stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                content = chunk.get('message', {}).get('content')
+                if content:
+                    yield content
+                if chunk.get('done'):
+                    break
+
+
+class LlamaCppProvider(LocalHTTPProvider):
+    """llama.cpp server (or any OpenAI-compatible endpoint) without the SDK"""
+
+    name = 'llamacpp'
+
+    def complete(self, messages, max_tokens, temperature=0.7, json_mode=False):
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens, 'temperature': temperature}
+        if json_mode:
+            payload['response_format'] = {'type': 'json_object'}
+        return self._post('/v1/chat/completions', payload).json()['choices'][0]['message']['content']
+
+    def stream(self, messages, max_tokens, temperature=0.7):
+        payload = {'model': self.model, 'messages': messages, 'max_tokens': max_tokens,
+                   'temperature': temperature, 'stream': True}
+        with self._post('/v1/chat/completions', payload, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                choices = json.loads(data).get('choices') or [{}]
+                content = choices[0].get('delta', {}).get('content')
+                if content:
+                    yield content
+
+
+PROVIDER_DEFAULTS = {
+    'openai': {'model': 'gpt-3.5-turbo', 'base_url': None},
+    'ollama': {'model': 'llama3.2:3b', 'base_url': 'http://127.0.0.1:11434'},
+    'llamacpp': {'model': 'local', 'base_url': 'http://127.0.0.1:8080'},
+}
+
+
+def build_provider(name, model=None, base_url=None, api_key=None):
+    """Provider instance by name, filling in the defaults for anything not given"""
+    if name not in PROVIDER_DEFAULTS:
+        raise ValueError(f"Unknown LLM provider '{name}'; expected one of {', '.join(PROVIDER_DEFAULTS)}")
+    defaults = PROVIDER_DEFAULTS[name]
+    model = model or defaults['model']
+    base_url = base_url or defaults['base_url']
+    if name == 'openai':
+        return OpenAIProvider(model, base_url, api_key)
+    if name == 'ollama':
+        return OllamaProvider(model, base_url)
+    return LlamaCppProvider(model, base_url)
+
+
+def provider_from_env(environ=os.environ):
+    """The provider configured through LLM_PROVIDER and the OPENAI_* / LLM_* variables"""
+    name = environ.get('LLM_PROVIDER', 'openai').lower()
+    if name == 'openai':
+        return build_provider('openai', environ.get('OPENAI_MODEL'), environ.get('OPENAI_BASE_URL'), environ.get('OPENAI_API_KEY'))
+    return build_provider(name, environ.get('LLM_MODEL'), environ.get('LLM_BASE_URL'))
@@ -0,0 +1,378 @@
+"""Local stand-in for the upstream APIs used by app.py.
+
+Emulates the OpenWeatherMap geocoding/weather endpoints, Google Places
+nearby search and place details, restcountries.com, OpenAI chat completions, an
+Ollama-style /api/chat and a slippy-map tile server so the app can be benchmarked
+and load-tested without live keys.
+
+Run standalone:
+    python mock_upstream.py --port 8099 --latency-ms 80 --error-rate 0.01
+
+then start the app pointed at it:
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8099 \
+    GOOGLE_PLACES_BASE_URL=http://127.0.0.1:8099 \
+    RESTCOUNTRIES_BASE_URL=http://127.0.0.1:8099 \
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 \
+    OPENWEATHER_API_KEY=mock GOOGLE_PLACES_API_KEY=mock OPENAI_API_KEY=mock \
+    python app.py
+"""
+from flask import Flask, Response, request, jsonify
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import struct
+import time
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+mock_app = Flask(__name__)
+
+# Behaviour knobs - can be changed at runtime through /__mock__/config
+MOCK_CONFIG = {
+    'latency_ms': float(os.environ.get('MOCK_LATENCY_MS', 50)),
+    'latency_jitter_ms': float(os.environ.get('MOCK_LATENCY_JITTER_MS', 20)),
+    'error_rate': float(os.environ.get('MOCK_ERROR_RATE', 0.0)),
+    'payload_scale': float(os.environ.get('MOCK_PAYLOAD_SCALE', 1.0)),
+    'places_per_page': int(os.environ.get('MOCK_PLACES_PER_PAGE', 20)),
+    'places_pages': int(os.environ.get('MOCK_PLACES_PAGES', 3)),
+    'stream_chunk_ms': float(os.environ.get('MOCK_STREAM_CHUNK_MS', 10)),
+}
+
+# Per-endpoint call counters, exposed through /__mock__/stats
+call_stats = {}
+_stats_lock = threading.Lock()
+
+PLACE_NAME_PARTS = {
+    'tourist_attraction': ['Old Town Square', 'Harbour Walk', 'Cathedral', 'Botanical Garden', 'Castle Hill', 'River Promenade'],
+    'museum': ['History Museum', 'Modern Art Gallery', 'Science Centre', 'Maritime Museum', 'Folk Museum'],
+    'restaurant': ['Bistro', 'Trattoria', 'Grill House', 'Noodle Bar', 'Seafood Kitchen', 'Tapas Bar'],
+    'lodging': ['Grand Hotel', 'City Inn', 'Boutique Suites', 'Hostel', 'Riverside Lodge'],
+}
+UNTYPED_MIX = {'tourist_attraction': 0.3, 'museum': 0.1, 'restaurant': 0.4, 'lodging': 0.2}
+
+
+def _seeded_random(*parts):
+    """Deterministic RNG so repeated queries return the same payload"""
+    digest = hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _record_call(endpoint):
+    with _stats_lock:
+        call_stats[endpoint] = call_stats.get(endpoint, 0) + 1
+
+
+def _simulate_upstream(endpoint):
+    """Apply configured latency and error rate; returns an error response or None"""
+    _record_call(endpoint)
+    delay = MOCK_CONFIG['latency_ms'] + random.uniform(-1, 1) * MOCK_CONFIG['latency_jitter_ms']
+    if delay > 0:
+        time.sleep(delay / 1000.0)
+    if MOCK_CONFIG['error_rate'] and random.random() < MOCK_CONFIG['error_rate']:
+        return jsonify({"error": "mock upstream failure"}), 500
+    return None
+
+
+def _scaled(count):
+    return max(1, int(round(count * MOCK_CONFIG['payload_scale'])))
+
+
+def _coordinates_for(query):
+    rng = _seeded_random('geo', query.lower())
+    return round(rng.uniform(-60, 60), 4), round(rng.uniform(-170, 170), 4)
+
+
+@mock_app.route('/geo/1.0/direct')
+def geo_direct():
+    error = _simulate_upstream('geo')
+    if error:
+        return error
+    query = request.args.get('q', '')
+    city, _, country = query.partition(',')
+    lat, lon = _coordinates_for(city.strip())
+    return jsonify([{
+        'name': city.strip().title(),
+        'lat': lat,
+        'lon': lon,
+        'country': country.strip()[:2].upper() or 'XX',
+        'state': ''
+    }])
+
+
+@mock_app.route('/data/2.5/weather')
+def weather():
+    error = _simulate_upstream('weather')
+    if error:
+        return error
+    rng = _seeded_random('weather', request.args.get('lat'), request.args.get('lon'))
+    temp = rng.uniform(5, 32)
+    return jsonify({
+        'main': {'temp': temp, 'feels_like': temp - 1.5, 'humidity': rng.randint(30, 90)},
+        'weather': [{'description': rng.choice(['clear sky', 'few clouds', 'light rain', 'overcast clouds'])}]
+    })
+
+
+def _mock_place(rng, place_type, lat, lon, index):
+    if place_type is None:
+        # Untyped searches return a realistic mix of categories
+        place_type = rng.choices(list(UNTYPED_MIX), weights=list(UNTYPED_MIX.values()))[0]
+    names = PLACE_NAME_PARTS.get(place_type, ['Point of Interest'])
+    place_id = f"mock_{place_type}_{lat:.3f}_{lon:.3f}_{index}"
+    types = [place_type, 'point_of_interest', 'establishment']
+    if place_type == 'museum':
+        types.insert(1, 'tourist_attraction')
+    return {
+        'name': f"{rng.choice(names)} {index + 1}",
+        'rating': round(rng.uniform(3.2, 5.0), 1),
+        'user_ratings_total': rng.randint(1, 50000),
+        'price_level': rng.randint(0, 4),
+        'vicinity': f"{rng.randint(1, 400)} Mock Street",
+        'place_id': place_id,
+        'types': types,
+        'geometry': {'location': {'lat': lat + rng.uniform(-0.05, 0.05), 'lng': lon + rng.uniform(-0.05, 0.05)}},
+        'opening_hours': {'open_now': rng.random() > 0.2}
+    }
+
+
+@mock_app.route('/maps/api/place/nearbysearch/json')
+def places_nearby():
+    error = _simulate_upstream('places_nearby')
+    if error:
+        return error
+
+    page_token = request.args.get('pagetoken')
+    if page_token:
+        place_type, lat, lon, page = page_token.split('|')
+        lat, lon, page = float(lat), float(lon), int(page)
+    else:
+        lat_str, _, lon_str = request.args.get('location', '0,0').partition(',')
+        lat, lon, page = float(lat_str), float(lon_str), 0
+        place_type = request.args.get('type', '')
+
+    rng = _seeded_random('places', place_type, lat, lon, page)
+    per_page = _scaled(MOCK_CONFIG['places_per_page'])
+    results = [_mock_place(rng, place_type or None, lat, lon, page * per_page + i) for i in range(per_page)]
+
+    data = {'status': 'OK', 'results': results}
+    if page + 1 < MOCK_CONFIG['places_pages']:
+        data['next_page_token'] = f"{place_type}|{lat}|{lon}|{page + 1}"
+    return jsonify(data)
+
+
+@mock_app.route('/maps/api/place/details/json')
+def place_details():
+    error = _simulate_upstream('place_details')
+    if error:
+        return error
+    place_id = request.args.get('place_id', '')
+    rng = _seeded_random('details', place_id)
+    # Mock place ids encode the search centre: mock_<type>_<lat>_<lon>_<index>
+    try:
+        _, lat, lon, _ = place_id.rsplit('_', 3)
+        lat, lon = float(lat), float(lon)
+    except ValueError:
+        lat, lon = 0.0, 0.0
+    opens = rng.choice(['0800', '0900', '1000', '1100'])
+    closes = rng.choice(['1700', '1800', '2100', '2300'])
+    return jsonify({
+        'status': 'OK',
+        'result': {
+            'place_id': place_id,
+            'geometry': {'location': {'lat': lat + rng.uniform(-0.05, 0.05), 'lng': lon + rng.uniform(-0.05, 0.05)}},
+            'opening_hours': {
+                'open_now': True,
+                'periods': [{'open': {'day': day, 'time': opens}, 'close': {'day': day, 'time': closes}} for day in range(7)]
+            },
+            'photos': [{'photo_reference': f"{place_id}_photo_{i}", 'width': 1600, 'height': 1200} for i in range(_scaled(3))]
+        }
+    })
+
+
+@mock_app.route('/v3.1/all')
+def rest_countries():
+    error = _simulate_upstream('countries')
+    if error:
+        return error
+    count = _scaled(250)
+    return jsonify([{'name': {'common': f"Mockland {i:03d}", 'official': f"Republic of Mockland {i:03d}"}} for i in range(count)])
+
+
+def _mock_answer(max_tokens):
+    """(tips, insights, token count) for a mock completion"""
+    words = ['Explore', 'local', 'markets', 'early', 'and', 'use', 'transit', 'passes', 'to', 'save']
+    # Roughly one word per token, capped by the requested budget
+    length = min(max_tokens, _scaled(60))
+    lines = []
+    for i in range(6):
+        lines.append(f"✨ Tip {i + 1}: " + ' '.join(words[(i + j) % len(words)] for j in range(max(3, length // 6))))
+    insights = ' '.join(words * max(1, length // 20))
+    return lines, insights, length
+
+
+@mock_app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    error = _simulate_upstream('chat_completions')
+    if error:
+        return error
+    payload = request.get_json(silent=True) or {}
+    lines, insights, length = _mock_answer(int(payload.get('max_tokens') or 200))
+    if payload.get('stream'):
+        return _stream_completion(payload, f"{insights}\nTIPS:\n" + '\n'.join(lines))
+    if (payload.get('response_format') or {}).get('type') == 'json_object':
+        content = json.dumps({'tips': lines, 'insights': insights}, ensure_ascii=False)
+    else:
+        content = '\n'.join(lines)
+    return jsonify({
+        'id': 'chatcmpl-mock',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': payload.get('model', 'gpt-3.5-turbo'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': 50, 'completion_tokens': length, 'total_tokens': 50 + length}
+    })
+
+
+@mock_app.route('/api/chat', methods=['POST'])
+def ollama_chat():
+    """Ollama-style chat: one JSON object, or newline-delimited JSON chunks when streaming"""
+    error = _simulate_upstream('ollama_chat')
+    if error:
+        return error
+    payload = request.get_json(silent=True) or {}
+    lines, insights, length = _mock_answer(int((payload.get('options') or {}).get('num_predict') or 200))
+    model = payload.get('model', 'llama3.2:3b')
+
+    if payload.get('stream', True):
+        content = f"{insights}\nTIPS:\n" + '\n'.join(lines)
+
+        def chunks():
+            for start in range(0, len(content), 12):
+                time.sleep(MOCK_CONFIG['stream_chunk_ms'] / 1000.0)
+                yield json.dumps({'model': model, 'message': {'role': 'assistant', 'content': content[start:start + 12]}, 'done': False}) + '\n'
+            yield json.dumps({'model': model, 'message': {'role': 'assistant', 'content': ''}, 'done': True, 'eval_count': length}) + '\n'
+
+        return Response(chunks(), mimetype='application/x-ndjson')
+
+    if payload.get('format') == 'json':
+        content = json.dumps({'tips': lines, 'insights': insights}, ensure_ascii=False)
+    else:
+        content = '\n'.join(lines)
+    return jsonify({'model': model, 'message': {'role': 'assistant', 'content': content}, 'done': True, 'eval_count': length})
+
+
+def _stream_completion(payload, content):
+    """Server-sent chat.completion.chunk events, a few characters per chunk"""
+    def chunk(delta, finish_reason=None):
+        data = {
+            'id': 'chatcmpl-mock',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': payload.get('model', 'gpt-3.5-turbo'),
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+        }
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def events():
+        yield chunk({'role': 'assistant'})
+        for start in range(0, len(content), 12):
+            time.sleep(MOCK_CONFIG['stream_chunk_ms'] / 1000.0)
+            yield chunk({'content': content[start:start + 12]})
+        yield chunk({}, 'stop')
+        yield "data: [DONE]\n\n"
+
+    return Response(events(), mimetype='text/event-stream')
+
+
+@mock_app.route('/__mock__/config', methods=['GET', 'POST'])
+def mock_config():
+    if request.method == 'POST':
+        updates = request.get_json(silent=True) or {}
+        for key, value in updates.items():
+            if key in MOCK_CONFIG:
+                MOCK_CONFIG[key] = type(MOCK_CONFIG[key])(value)
+    return jsonify(MOCK_CONFIG)
+
+
+@mock_app.route('/__mock__/stats', methods=['GET', 'DELETE'])
+def mock_stats():
+    with _stats_lock:
+        if request.method == 'DELETE':
+            call_stats.clear()
+        return jsonify(dict(call_stats))
+
+
+# A handful of solid colours, so neighbouring tiles often share content like real sea or park tiles
+TILE_COLOURS = ((170, 211, 223), (242, 239, 233), (200, 250, 204), (255, 255, 255))
+
+
+def _png(colour, size=256):
+    """A valid PNG filled with one colour"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    row = b'\x00' + bytes(colour) * size
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * size, 9)) + chunk(b'IEND', b''))
+
+
+@mock_app.route('/tiles/<int:z>/<int:x>/<int:y>.png')
+def map_tile(z, x, y):
+    error = _simulate_upstream('tiles')
+    if error:
+        return error
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"error": "tile out of range"}), 404
+    colour = TILE_COLOURS[_seeded_random('tile', z, x, y).randrange(len(TILE_COLOURS))]
+    return Response(_png(colour), mimetype='image/png')
+
+
+def upstream_env(base_url):
+    """Environment variables that point app.py at a mock server on base_url"""
+    return {
+        'OPENWEATHER_BASE_URL': base_url,
+        'GOOGLE_PLACES_BASE_URL': base_url,
+        'RESTCOUNTRIES_BASE_URL': base_url,
+        'OPENAI_BASE_URL': f"{base_url}/v1",
+        'TILE_SERVER_URL': f"{base_url}/tiles/{{z}}/{{x}}/{{y}}.png",
+        'OPENWEATHER_API_KEY': 'mock',
+        'GOOGLE_PLACES_API_KEY': 'mock',
+        'OPENAI_API_KEY': 'mock',
+        'PLACES_PAGE_TOKEN_DELAY': '0.05',
+        'AUTH_TOKEN_KEYS': 'mock:mock-token-secret',
+    }
+
+
+def start_in_thread(host='127.0.0.1', port=0):
+    """Start the mock server in a daemon thread; returns (server, base_url)"""
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, mock_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_port}"
+    logger.info(f"Mock upstream listening on {base_url}")
+    return server, base_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local mock of the TripCraft upstream APIs')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=MOCK_CONFIG['latency_ms'])
+    parser.add_argument('--jitter-ms', type=float, default=MOCK_CONFIG['latency_jitter_ms'])
+    parser.add_argument('--error-rate', type=float, default=MOCK_CONFIG['error_rate'])
+    parser.add_argument('--payload-scale', type=float, default=MOCK_CONFIG['payload_scale'])
+    args = parser.parse_args()
+
+    MOCK_CONFIG.update({
+        'latency_ms': args.latency_ms,
+        'latency_jitter_ms': args.jitter_ms,
+        'error_rate': args.error_rate,
+        'payload_scale': args.payload_scale,
+    })
+    logging.basicConfig(level=logging.INFO)
+    mock_app.run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,179 @@
+"""Multi-city trips: "7 days across Spain".
+
+The planner picks the cities (the traveller's, or the catalog's most
+popular for the country), gives each a share of the days, orders them into
+the shortest route between their coordinates and plans every leg with the
+single-city pipeline, legs running concurrently. Leg planning itself fans
+out to the upstream pool, so legs need an executor of their own; waiting
+on upstream work from inside an upstream worker could deadlock the pool.
+"""
+from datetime import datetime, timedelta
+import itertools
+import logging
+
+from geo import haversine_km
+from request_context import wait_result
+
+logger = logging.getLogger(__name__)
+
+MAX_CITIES = 6
+MIN_DAYS_PER_CITY = 2
+# Days a city gets before another one is added when the traveller does not choose
+DAYS_PER_CITY = 3
+# Later catalog cities (less popular) get a smaller share of the days
+POPULARITY_DECAY = 0.85
+# Held-Karp is exact and instant up to here; longer routes use 2-opt
+EXACT_ROUTE_LIMIT = 9
+
+# Rough door-to-door speeds for the transfer between legs
+TRANSFER_MODES = (
+    (300, 'train or bus', 70),
+    (700, 'train', 110),
+    (float('inf'), 'flight', 450),
+)
+TRANSFER_OVERHEAD_HOURS = {'train or bus': 0.5, 'train': 0.75, 'flight': 3.0}
+
+
+def choose_cities(popular, days, requested=None):
+    """Cities for the trip: the requested ones, else the most popular that the days allow"""
+    if requested:
+        seen = []
+        for city in requested:
+            if city and city not in seen:
+                seen.append(city)
+        return seen[:MAX_CITIES]
+    count = max(1, min(MAX_CITIES, days // DAYS_PER_CITY, len(popular)))
+    return list(popular[:count])
+
+
+def allocate_days(cities, days):
+    """[(city, days)] in the given order of preference, dropping cities the days cannot cover.
+
+    Every city gets MIN_DAYS_PER_CITY (or all the days, for a single city);
+    the rest is split by popularity weight with largest remainders.
+    """
+    count = max(1, min(len(cities), days // MIN_DAYS_PER_CITY))
+    cities = cities[:count]
+    if count == 1:
+        return [(cities[0], days)]
+
+    weights = [POPULARITY_DECAY ** rank for rank in range(count)]
+    spare = days - MIN_DAYS_PER_CITY * count
+    shares = [spare * weight / sum(weights) for weight in weights]
+    allocation = [MIN_DAYS_PER_CITY + int(share) for share in shares]
+    by_remainder = sorted(range(count), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_remainder[:days - sum(allocation)]:
+        allocation[i] += 1
+    return list(zip(cities, allocation))
+
+
+def _distance_matrix(points):
+    return [[haversine_km(a['lat'], a['lon'], b['lat'], b['lon']) for b in points] for a in points]
+
+
+def _path_length(order, distances):
+    return sum(distances[a][b] for a, b in zip(order, order[1:]))
+
+
+def _held_karp(distances, start):
+    """Shortest open path from `start` through every point (exact, O(2^n n^2))"""
+    n = len(distances)
+    others = [i for i in range(n) if i != start]
+    best = {(1 << i, i): (distances[start][i], start) for i in others}
+    for size in range(2, len(others) + 1):
+        for subset in itertools.combinations(others, size):
+            mask = sum(1 << i for i in subset)
+            for last in subset:
+                previous = mask & ~(1 << last)
+                best[(mask, last)] = min(
+                    (best[(previous, k)][0] + distances[k][last], k) for k in subset if k != last
+                )
+    full = sum(1 << i for i in others)
+    last = min(others, key=lambda i: best[(full, i)][0])
+    order = []
+    mask = full
+    while last != start:
+        order.append(last)
+        mask, last = mask & ~(1 << last), best[(mask, last)][1]
+    return [start] + order[::-1]
+
+
+def _two_opt(order, distances):
+    """Nearest-neighbour path improved by reversing segments while that shortens it"""
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                if _path_length(candidate, distances) < _path_length(order, distances) - 1e-9:
+                    order, improved = candidate, True
+    return order
+
+
+def order_route(stops, start=0):
+    """Indexes of `stops` (dicts with lat/lon) in visiting order, beginning at `start`"""
+    if len(stops) <= 2:
+        return [start] + [i for i in range(len(stops)) if i != start]
+    distances = _distance_matrix(stops)
+    if len(stops) <= EXACT_ROUTE_LIMIT:
+        return _held_karp(distances, start)
+    order, remaining = [start], set(range(len(stops))) - {start}
+    while remaining:
+        nearest = min(remaining, key=lambda i: distances[order[-1]][i])
+        order.append(nearest)
+        remaining.discard(nearest)
+    return _two_opt(order, distances)
+
+
+def transfer(origin, destination):
+    """Distance, likely mode and rough hours between two consecutive cities"""
+    distance = haversine_km(origin['lat'], origin['lon'], destination['lat'], destination['lon'])
+    for limit, mode, speed in TRANSFER_MODES:
+        if distance <= limit:
+            break
+    return {
+        'from': origin['name'],
+        'to': destination['name'],
+        'distance_km': round(distance, 1),
+        'mode': mode,
+        'hours': round(distance / speed + TRANSFER_OVERHEAD_HOURS[mode], 1)
+    }
+
+
+def plan_route(country, cities, days, locate, executor):
+    """Locate the cities concurrently, allocate days and order them; returns [(city, location, days)].
+
+    locate(city, country) returns a location dict with lat/lon/name or None;
+    cities that cannot be located are left out. The first city keeps its
+    place as the start of the route.
+    """
+    locations = [(city, wait_result(future)) for city, future in
+                 [(city, executor.submit(locate, city, country)) for city in cities]]
+    located = [(city, location) for city, location in locations if location]
+    for city, location in locations:
+        if not location:
+            logger.warning(f"Leaving {city}, {country} out of the route: no coordinates")
+    if not located:
+        return []
+
+    allocation = dict(allocate_days([city for city, _ in located], days))
+    stops = [(city, location, allocation[city]) for city, location in located if city in allocation]
+    return [stops[i] for i in order_route([location for _, location, _ in stops])]
+
+
+def build_legs(route, budget, start_date, build_leg, executor):
+    """Plan every leg concurrently with build_leg(city, days, budget, start_date, first_day).
+
+    The budget is split by days; each leg's dates follow the previous one.
+    Returns the legs' results in route order.
+    """
+    total_days = sum(days for _, _, days in route)
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    futures = []
+    first_day = 1
+    for city, _, days in route:
+        leg_start = (start + timedelta(days=first_day - 1)).strftime("%Y-%m-%d")
+        futures.append(executor.submit(build_leg, city, days, budget * days / total_days, leg_start, first_day))
+        first_day += days
+    return [wait_result(future) for future in futures]
@@ -0,0 +1,252 @@
+"""Place acquisition planning for itinerary generation.
+
+Chooses how to fetch the attractions, museums, restaurants and hotels an
+itinerary needs with the fewest Google Places calls:
+
+- per_type: one typed Nearby Search per category (the original behaviour)
+- combined: one untyped Nearby Search, classified locally by result types,
+  topped up with typed searches only for categories that came back short
+- tiles:    results cached per map cell, reused by any request in that cell
+"""
+import math
+import threading
+import logging
+
+from cache import TTLCache
+from request_context import wait_result
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+MAX_PAGES = 3
+
+# Map cell used for the tile cache; searches are centred on the cell so nearby requests share results
+TILE_DEGREES = 0.02
+tile_cache = TTLCache(max_entries=2048, default_ttl=24 * 3600)
+# A cell whose searches found nothing at all is asked again sooner
+EMPTY_TILE_TTL = 600
+
+ACTIVITY_TYPES = {
+    'tourist_attraction', 'museum', 'art_gallery', 'park', 'amusement_park', 'aquarium',
+    'zoo', 'church', 'hindu_temple', 'mosque', 'synagogue', 'stadium', 'natural_feature'
+}
+RESTAURANT_TYPES = {'restaurant', 'cafe', 'bakery', 'bar', 'meal_takeaway'}
+
+# Share of untyped results expected to land in each category; refined as searches come back
+observed_yields = {'activities': 0.35, 'restaurants': 0.35, 'hotels': 0.15}
+_yields_lock = threading.Lock()
+YIELD_SMOOTHING = 0.2
+
+
+class CallCounter:
+    """Thread-safe tally of upstream calls made while building one itinerary, and of failed searches"""
+
+    def __init__(self):
+        self.counts = {}
+        self.failed_searches = 0
+        self._lock = threading.Lock()
+
+    def add(self, kind, count=1):
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + count
+
+    def add_failure(self):
+        """A search that failed (on any page); its calls are already counted by add()"""
+        with self._lock:
+            self.failed_searches += 1
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def as_dict(self):
+        with self._lock:
+            report = dict(self.counts)
+            failed = self.failed_searches
+        report['total'] = sum(report.values())
+        # Failures are not calls of their own, so they stay out of the total
+        report['failed_searches'] = failed
+        return report
+
+
+def classify_place(place):
+    """Bucket a place into attractions, museums, restaurants or hotels by its types"""
+    types = set(place.get('types', []))
+    if 'lodging' in types:
+        return 'hotels'
+    if 'museum' in types or 'art_gallery' in types:
+        return 'museums'
+    if types & RESTAURANT_TYPES:
+        return 'restaurants'
+    if types & ACTIVITY_TYPES:
+        return 'attractions'
+    return None
+
+
+def _pages_for(count, per_page_yield=1.0):
+    if count <= 0:
+        return 0
+    return max(1, math.ceil(count / (PAGE_SIZE * max(per_page_yield, 0.01))))
+
+
+def _tile_key(lat, lon, radius):
+    return (round(lat / TILE_DEGREES), round(lon / TILE_DEGREES), radius)
+
+
+def _tile_center(lat, lon):
+    return round(lat / TILE_DEGREES) * TILE_DEGREES, round(lon / TILE_DEGREES) * TILE_DEGREES
+
+
+def _tile_covers(tile, needs):
+    """A cached tile can serve a request when each category has enough places or was exhausted"""
+    activities = tile['places']['attractions'] + tile['places']['museums']
+    counts = {
+        'activities': len(activities),
+        'restaurants': len(tile['places']['restaurants']),
+        'hotels': len(tile['places']['hotels'])
+    }
+    return all(counts[category] >= need or category in tile['exhausted'] for category, need in needs.items())
+
+
+def estimate_costs(needs):
+    """Estimated Nearby Search calls for the per_type and combined strategies"""
+    per_type = (
+        min(MAX_PAGES, _pages_for(needs['activities'])) * 2  # attractions + museums
+        + min(MAX_PAGES, _pages_for(needs['restaurants']))
+        + min(MAX_PAGES, _pages_for(needs['hotels']))
+    )
+
+    with _yields_lock:
+        yields = dict(observed_yields)
+    combined_pages = min(MAX_PAGES, max(_pages_for(need, yields[category]) for category, need in needs.items()))
+    top_ups = 0
+    for category, need in needs.items():
+        # Typed results overlap the mixed ones, so a top-up has to fetch the full need
+        if need > int(combined_pages * PAGE_SIZE * yields[category]):
+            top_ups += min(MAX_PAGES, _pages_for(need))
+    return {'per_type': per_type, 'combined': combined_pages + top_ups}
+
+
+def plan_acquisition(lat, lon, needs, radius=15000):
+    """Pick the cheapest strategy given the cache state; returns (strategy, estimated_calls)"""
+    tile = tile_cache.get(_tile_key(lat, lon, radius))
+    if tile and _tile_covers(tile, needs):
+        return 'tiles', 0
+
+    costs = estimate_costs(needs)
+    if costs['combined'] < costs['per_type']:
+        return 'combined', costs['combined']
+    return 'per_type', costs['per_type']
+
+
+def _record_yields(places, page_count):
+    total = page_count * PAGE_SIZE
+    if not total:
+        return
+    counts = {'activities': 0, 'restaurants': 0, 'hotels': 0}
+    for place in places:
+        category = classify_place(place)
+        if category in ('attractions', 'museums'):
+            counts['activities'] += 1
+        elif category:
+            counts[category] += 1
+    with _yields_lock:
+        for category, count in counts.items():
+            observed_yields[category] += YIELD_SMOOTHING * (count / total - observed_yields[category])
+
+
+def _merge_unique(existing, extra):
+    seen = {place.get('place_id') or place['name'] for place in existing}
+    for place in extra:
+        key = place.get('place_id') or place['name']
+        if key not in seen:
+            existing.append(place)
+            seen.add(key)
+
+
+def _acquire_per_type(lat, lon, needs, search, executor, radius, counter):
+    futures = {
+        'attractions': executor.submit(search, lat, lon, 'tourist_attraction', radius, needs['activities'], counter),
+        'museums': executor.submit(search, lat, lon, 'museum', radius, needs['activities'], counter),
+        'restaurants': executor.submit(search, lat, lon, 'restaurant', radius, needs['restaurants'], counter),
+        'hotels': executor.submit(search, lat, lon, 'lodging', radius, needs['hotels'], counter)
+    }
+    places = {category: wait_result(future) for category, future in futures.items()}
+
+    exhausted = set()
+    if len(places['attractions']) < needs['activities'] and len(places['museums']) < needs['activities']:
+        exhausted.add('activities')
+    for category in ('restaurants', 'hotels'):
+        if len(places[category]) < needs[category]:
+            exhausted.add(category)
+    return places, exhausted
+
+
+def _acquire_combined(lat, lon, needs, search, executor, radius, counter):
+    with _yields_lock:
+        yields = dict(observed_yields)
+    pages = min(MAX_PAGES, max(_pages_for(need, yields[category]) for category, need in needs.items()))
+    mixed = search(lat, lon, None, radius, pages * PAGE_SIZE, counter)
+    _record_yields(mixed, pages)
+
+    places = {'attractions': [], 'museums': [], 'restaurants': [], 'hotels': []}
+    for place in mixed:
+        category = classify_place(place)
+        if category:
+            places[category].append(place)
+
+    # Typed top-ups only for the categories the mixed results could not cover;
+    # they ask for the full need because their best results overlap the mixed ones
+    top_up_types = {'activities': ('attractions', 'tourist_attraction'), 'restaurants': ('restaurants', 'restaurant'), 'hotels': ('hotels', 'lodging')}
+    have = {
+        'activities': len(places['attractions']) + len(places['museums']),
+        'restaurants': len(places['restaurants']),
+        'hotels': len(places['hotels'])
+    }
+    top_ups = {}
+    for category, need in needs.items():
+        if have[category] < need:
+            target, place_type = top_up_types[category]
+            top_ups[target] = executor.submit(search, lat, lon, place_type, radius, need, counter)
+
+    exhausted = set()
+    for target, future in top_ups.items():
+        extra = wait_result(future)
+        _merge_unique(places[target], extra)
+        category = 'activities' if target == 'attractions' else target
+        if len(extra) < needs[category]:
+            exhausted.add(category)
+    return places, exhausted
+
+
+def acquire_places(lat, lon, needs, search, executor, radius=15000, counter=None):
+    """Fetch the candidate pools for an itinerary using the planned strategy.
+
+    needs maps 'activities', 'restaurants' and 'hotels' to the number of
+    places wanted; search has the signature of app.search_places_nearby and
+    records each search that fails, on any page, with counter.add_failure().
+    Returns ({'attractions', 'museums', 'restaurants', 'hotels'}, report).
+    """
+    counter = counter or CallCounter()
+    key = _tile_key(lat, lon, radius)
+    strategy, estimated_calls = plan_acquisition(lat, lon, needs, radius)
+
+    tile = tile_cache.get(key) if strategy == 'tiles' else None
+    if tile:
+        places = {category: list(pool) for category, pool in tile['places'].items()}
+    else:
+        # A tile that expired between planning and use falls back to typed searches
+        strategy = 'per_type' if strategy == 'tiles' else strategy
+        center_lat, center_lon = _tile_center(lat, lon)
+        acquire = _acquire_combined if strategy == 'combined' else _acquire_per_type
+        failures = counter.failed_searches
+        places, exhausted = acquire(center_lat, center_lon, needs, search, executor, radius, counter)
+        # Short results from failed searches say nothing about the cell, so only clean tiles are kept
+        if counter.failed_searches == failures:
+            empty = not any(places.values())
+            tile_cache.set(key, {'places': places, 'exhausted': exhausted}, EMPTY_TILE_TTL if empty else None)
+        else:
+            logger.warning(f"Not caching place tile {key}: some searches failed")
+        places = {category: list(pool) for category, pool in places.items()}
+
+    logger.info(f"Place acquisition via {strategy}: estimated {estimated_calls} calls, made {counter.counts.get('nearby_search', 0)}")
+    return places, {'strategy': strategy, 'estimated_calls': estimated_calls}
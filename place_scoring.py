@@ -0,0 +1,197 @@
+"""Ranking of candidate places for an itinerary.
+
+Raw Google ratings make a place with one 5.0 review beat a 4.7 with tens
+of thousands. Each candidate instead gets a score made of
+
+- a Bayesian rating: the rating shrunk towards the candidate set's mean,
+  weighted by how many reviews back it up,
+- a boost when its types (or, for dietary needs, its name) match the
+  traveller's style, interests and dietary preferences,
+- a diversity penalty growing with the number of better-scored places of
+  the same primary type, so a day is not three museums in a row.
+
+Scores are computed for the whole candidate set at once (numpy when
+installed, plain Python otherwise). rank_places() attaches them to the
+places as 'score', which is what the budget optimizer maximizes via
+place_value(), and keeps the best with a partial selection instead of a
+full sort.
+"""
+from collections import defaultdict
+import heapq
+import re
+
+# Reviews a place needs before its own rating outweighs the candidate set's mean
+PRIOR_WEIGHT = 50
+DEFAULT_PRIOR_MEAN = 4.0
+PREFERENCE_BOOST = 0.25
+MAX_PREFERENCE_BOOST = 0.5
+DIVERSITY_PENALTY = 0.12
+
+# Types too generic to say what kind of place it is
+GENERIC_TYPES = frozenset({'point_of_interest', 'establishment', 'tourist_attraction', 'food'})
+
+# Google place types favoured by each travel style
+STYLE_TYPES = {
+    'adventure': {'park', 'natural_feature', 'campground', 'amusement_park', 'stadium'},
+    'cultural': {'museum', 'art_gallery', 'church', 'hindu_temple', 'mosque', 'synagogue', 'library', 'city_hall'},
+    'relaxation': {'spa', 'park', 'cafe', 'beauty_salon'},
+    'foodie': {'restaurant', 'cafe', 'bakery', 'meal_takeaway', 'bar'},
+    'nightlife': {'night_club', 'bar', 'casino', 'movie_theater'},
+    'family': {'zoo', 'aquarium', 'amusement_park', 'park', 'bowling_alley'},
+    'romantic': {'park', 'art_gallery', 'spa', 'restaurant'},
+    'business': {'cafe', 'restaurant', 'museum'},
+}
+
+# Words from the free-text interests field and the place types they point to
+INTEREST_TYPES = {
+    'museum': {'museum'},
+    'art': {'art_gallery', 'museum'},
+    'galler': {'art_gallery'},
+    'histor': {'museum', 'church', 'city_hall'},
+    'architecture': {'church', 'city_hall', 'mosque', 'synagogue'},
+    'religio': {'church', 'hindu_temple', 'mosque', 'synagogue'},
+    'nature': {'park', 'natural_feature', 'campground'},
+    'hiking': {'park', 'natural_feature', 'campground'},
+    'park': {'park'},
+    'beach': {'natural_feature', 'park'},
+    'photo': {'park', 'natural_feature', 'art_gallery'},
+    'shop': {'shopping_mall', 'store', 'clothing_store', 'book_store'},
+    'market': {'shopping_mall', 'store'},
+    'book': {'book_store', 'library'},
+    'food': {'restaurant', 'cafe', 'bakery'},
+    'coffee': {'cafe'},
+    'wine': {'bar', 'liquor_store'},
+    'music': {'night_club', 'bar'},
+    'nightlife': {'night_club', 'bar'},
+    'animal': {'zoo', 'aquarium'},
+    'wellness': {'spa', 'gym'},
+    'sport': {'stadium', 'gym'},
+}
+
+# Dietary needs have no Google type; restaurants advertising them in the name get the boost
+DIETARY_TERMS = {
+    'vegetarian': ('vegetarian', 'veggie', 'vegan'),
+    'vegan': ('vegan', 'plant'),
+    'gluten-free': ('gluten',),
+    'halal': ('halal',),
+    'kosher': ('kosher',),
+    'dairy-free': ('vegan', 'dairy'),
+}
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def preference_types(preferences):
+    """Place types matching the traveller's style and interests"""
+    preferences = preferences or {}
+    types = set(STYLE_TYPES.get((preferences.get('travelStyle') or '').strip().lower(), ()))
+    interests = (preferences.get('interests') or '').lower()
+    for word in re.findall(r'[a-z]+', interests):
+        for stem, matched in INTEREST_TYPES.items():
+            if word.startswith(stem):
+                types |= matched
+    return frozenset(types)
+
+
+def dietary_terms(preferences):
+    dietary = ((preferences or {}).get('dietary') or '').strip().lower()
+    return DIETARY_TERMS.get(dietary, ())
+
+
+def primary_type(place):
+    for place_type in place.get('types') or ():
+        if place_type not in GENERIC_TYPES:
+            return place_type
+    return 'other'
+
+
+class PlaceScorer:
+    """Scores candidate places for one traveller's preferences"""
+
+    def __init__(self, preferences=None, prior_weight=PRIOR_WEIGHT):
+        self.boost_types = preference_types(preferences)
+        self.dietary_terms = dietary_terms(preferences)
+        self.prior_weight = prior_weight
+
+    def _matches(self, place):
+        matches = len(self.boost_types.intersection(place.get('types') or ()))
+        if self.dietary_terms:
+            name = (place.get('name') or '').lower()
+            matches += any(term in name for term in self.dietary_terms)
+        return matches
+
+    def score(self, places, diversity=True):
+        """Scores for places, in order"""
+        if not places:
+            return []
+        ratings = [float(place.get('rating') or 0) for place in places]
+        counts = [float(place.get('user_ratings_total') or 0) for place in places]
+        matches = [self._matches(place) for place in places]
+
+        np = _import_numpy()
+        if np is not None:
+            scores = self._score_vectorized(np, ratings, counts, matches).tolist()
+        else:
+            scores = self._score_python(ratings, counts, matches)
+
+        return self._diversify(places, scores) if diversity else scores
+
+    def _score_vectorized(self, np, ratings, counts, matches):
+        ratings, counts = np.array(ratings), np.array(counts)
+        reviewed = counts > 0
+        prior = float(ratings[reviewed].mean()) if reviewed.any() else DEFAULT_PRIOR_MEAN
+        bayesian = (self.prior_weight * prior + counts * ratings) / (self.prior_weight + counts)
+        return bayesian + np.minimum(np.array(matches) * PREFERENCE_BOOST, MAX_PREFERENCE_BOOST)
+
+    def _score_python(self, ratings, counts, matches):
+        reviewed = [rating for rating, count in zip(ratings, counts) if count > 0]
+        prior = sum(reviewed) / len(reviewed) if reviewed else DEFAULT_PRIOR_MEAN
+        return [
+            (self.prior_weight * prior + count * rating) / (self.prior_weight + count)
+            + min(match * PREFERENCE_BOOST, MAX_PREFERENCE_BOOST)
+            for rating, count, match in zip(ratings, counts, matches)
+        ]
+
+    @staticmethod
+    def _diversify(places, scores):
+        """Penalize each place by how many better places share its primary type"""
+        by_type = defaultdict(list)
+        for index, place in enumerate(places):
+            by_type[primary_type(place)].append(index)
+        penalized = list(scores)
+        for indexes in by_type.values():
+            if len(indexes) < 2:
+                continue
+            indexes.sort(key=lambda index: scores[index], reverse=True)
+            for rank, index in enumerate(indexes):
+                penalized[index] -= rank * DIVERSITY_PENALTY
+        return penalized
+
+
+def place_value(place):
+    """Value of a place for the budget optimizer: its score, or its rating if never scored"""
+    score = place.get('score')
+    return score if score is not None else place.get('rating', 0) or 0
+
+
+def top_k(places, k):
+    """The k best places by place_value(), best first, without sorting the rest"""
+    if k >= len(places):
+        return sorted(places, key=place_value, reverse=True)
+    return heapq.nlargest(k, places, key=place_value)
+
+
+def rank_places(places, k, preferences=None, diversity=True):
+    """The best k places for these preferences, as copies carrying their 'score'.
+
+    Candidate dicts can be shared with the tile cache, so they are not
+    modified; the copies keep the score with a stored trip's planning.
+    """
+    scores = PlaceScorer(preferences).score(places, diversity=diversity)
+    return top_k([dict(place, score=round(score, 4)) for place, score in zip(places, scores)], k)
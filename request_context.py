@@ -0,0 +1,188 @@
+"""Deadlines and cancellation for the upstream work of one request.
+
+A request that plans an itinerary fans out into Places, weather and LLM
+calls on the shared pools. Its RequestContext lives in a context variable
+that ContextExecutor copies into every task it runs, so those calls know
+which request they serve. Before each upstream call check() stops work
+that nobody will read: when the deadline has passed, or when the client
+socket has closed (the body has been read by then, so a readable socket
+with nothing to peek means the client hung up). Cancelling also drops
+the request's queued tasks, freeing the pools for requests still waiting.
+
+RequestCancelled derives from BaseException, like asyncio.CancelledError,
+so the "except Exception" fallbacks around upstream calls let it through.
+"""
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+import os
+import select
+import socket
+import threading
+import time
+
+# Just inside gunicorn's worker timeout, so the request gives up before its worker is killed
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', int(os.environ.get('GUNICORN_TIMEOUT', 120)) - 5))
+# How often waits and checks look at the client socket
+POLL_INTERVAL = 0.1
+
+
+class RequestCancelled(BaseException):
+    """The request's client went away or its deadline passed"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def client_socket(environ):
+    """The client connection of a WSGI request, where the server exposes it"""
+    return environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+
+
+def client_gone(sock):
+    """True when the client closed its end of the connection"""
+    try:
+        if sock.fileno() < 0:
+            return True
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except ValueError:
+        # TLS sockets cannot peek; their disconnects show up as failed writes instead
+        return False
+    except OSError:
+        return True
+
+
+class RequestContext:
+    """Deadline, client connection and outstanding tasks of one request"""
+
+    def __init__(self, timeout=None, connection=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.connection = connection
+        self.reason = None
+        self._cancelled = threading.Event()
+        self._futures = []
+        self._lock = threading.Lock()
+        self._probed_at = 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        """Seconds until the deadline, or None without one"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def cancel(self, reason):
+        """Stop the request's work: queued tasks are dropped, running ones stop at their next check"""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.reason = reason
+            self._cancelled.set()
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.cancel()
+
+    def track(self, future):
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._futures.append(future)
+                return
+        future.cancel()
+
+    def check(self):
+        """Raise RequestCancelled when the request has been cancelled, run out of time or lost its client"""
+        if not self._cancelled.is_set():
+            remaining = self.remaining()
+            if remaining is not None and remaining <= 0:
+                self.cancel('deadline')
+            elif self.connection is not None:
+                now = time.monotonic()
+                if now - self._probed_at >= POLL_INTERVAL:
+                    self._probed_at = now
+                    if client_gone(self.connection):
+                        self.cancel('disconnected')
+        if self._cancelled.is_set():
+            raise RequestCancelled(self.reason)
+
+
+_current = contextvars.ContextVar('request_context', default=None)
+
+
+@contextmanager
+def request_scope(timeout=REQUEST_DEADLINE, connection=None):
+    """Run the block as a request with this deadline and client connection; cancels leftovers on exit"""
+    context = RequestContext(timeout, connection)
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+        context.cancel(context.reason or 'finished')
+
+
+def check_cancelled():
+    """check() the current request, if there is one"""
+    context = _current.get()
+    if context is not None:
+        context.check()
+
+
+def upstream_timeout(seconds):
+    """An HTTP timeout capped by the time the current request has left"""
+    check_cancelled()
+    context = _current.get()
+    remaining = context.remaining() if context is not None else None
+    return seconds if remaining is None else max(0.1, min(seconds, remaining))
+
+
+def cancellable_sleep(seconds):
+    """time.sleep that ends early, raising RequestCancelled, when the current request is cancelled"""
+    context = _current.get()
+    if context is None:
+        time.sleep(seconds)
+        return
+    ends = time.monotonic() + seconds
+    while True:
+        context.check()
+        left = ends - time.monotonic()
+        if left <= 0:
+            return
+        context._cancelled.wait(min(left, POLL_INTERVAL))
+
+
+def wait_result(future):
+    """future.result() that keeps checking the current request while it waits.
+
+    The request is checked at least once, so one whose upstream calls all
+    failed fast on their capped timeouts still notices a passed deadline.
+    """
+    context = _current.get()
+    try:
+        while context is not None:
+            context.check()
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except TimeoutError:
+                continue
+        return future.result()
+    except CancelledError:
+        # Queued tasks are cancelled along with their request; report that, not the bare CancelledError
+        if context is not None and context.cancelled:
+            raise RequestCancelled(context.reason) from None
+        raise
+
+
+class ContextExecutor(ThreadPoolExecutor):
+    """Thread pool whose tasks run in the submitting request's context and are cancelled with it"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = _current.get()
+        if context is None:
+            return super().submit(fn, *args, **kwargs)
+        context.check()
+        future = super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        context.track(future)
+        return future
@@ -0,0 +1,110 @@
+"""Cache of generated itineraries, addressed by their inputs.
+
+A /generate response depends on the validated request (destination, days,
+people, budget, preferences and response options), on the data it was
+built from (the catalog, the cost-of-living table, the insights corpus and
+the LLM) and on the day it was planned (check-in dates count from today).
+Hashing all of these gives a key under which identical requests - repeats,
+or the same trip planned by several people - share one plan.
+
+Everything in a plan except the weather holds for GENERATE_CACHE_TTL. The
+weather is only served for WEATHER_MAX_AGE; after that a hit refetches it
+and the entry carries the new reading for the rest of its life.
+"""
+from datetime import date
+import hashlib
+import json
+import os
+import time
+
+from cache import SingleFlight, TTLCache
+from catalog import CATALOG_PATH
+from cost_model import COST_TABLE_PATH
+from insights_corpus import CORPUS_PATH
+
+GENERATE_CACHE_TTL = int(os.environ.get('GENERATE_CACHE_TTL', 3600))
+WEATHER_MAX_AGE = int(os.environ.get('WEATHER_MAX_AGE', 1800))
+
+DATA_FILES = {'catalog': CATALOG_PATH, 'costs': COST_TABLE_PATH, 'insights': CORPUS_PATH}
+
+_data_versions = None
+
+
+def file_version(path):
+    """Size and modification time of a data file, or None when it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def data_versions():
+    """Versions of the data files itineraries are built from, read once per process"""
+    global _data_versions
+    if _data_versions is None:
+        _data_versions = {name: file_version(path) for name, path in DATA_FILES.items()}
+    return _data_versions
+
+
+def canonical(value):
+    """Strings case- and whitespace-folded so equivalent requests hash alike"""
+    if isinstance(value, str):
+        return ' '.join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {key: canonical(item) for key, item in value.items()}
+    return value
+
+
+def plan_key(inputs, versions):
+    """Hex key for validated request inputs plus the versions of everything behind the answer"""
+    material = {'inputs': canonical(inputs), 'versions': versions, 'day': date.today().isoformat()}
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class CachedPlan:
+    """A generated itinerary with its planning state, when its weather was read and when it expires"""
+
+    def __init__(self, itinerary, planning, weather_at, expires_at):
+        self.itinerary = itinerary
+        self.planning = planning
+        self.weather_at = weather_at
+        self.expires_at = expires_at
+
+    def etag(self, key, variant=''):
+        """Validator for this plan as served with the given response variant (unquoted)"""
+        return hashlib.sha256(f"{key}|{self.weather_at}|{variant}".encode('utf-8')).hexdigest()[:32]
+
+
+class PlanCache:
+    """Plans by key; concurrent misses for one key share a single generation"""
+
+    def __init__(self, ttl=GENERATE_CACHE_TTL, weather_max_age=WEATHER_MAX_AGE, max_entries=512):
+        self.ttl = ttl
+        self.weather_max_age = weather_max_age
+        self.plans = TTLCache(max_entries=max_entries, default_ttl=ttl)
+        self.flight = SingleFlight()
+
+    def get(self, key):
+        return self.plans.get(key) if self.ttl > 0 else None
+
+    def put(self, key, itinerary, planning):
+        now = time.time()
+        plan = CachedPlan(itinerary, planning, now, now + self.ttl)
+        if self.ttl > 0 and "error" not in itinerary:
+            self.plans.set(key, plan)
+        return plan
+
+    def weather_stale(self, plan):
+        return time.time() - plan.weather_at > self.weather_max_age
+
+    def with_weather(self, key, plan, weather_info):
+        """Replace a plan's weather, keeping its original expiry"""
+        now = time.time()
+        fresh = CachedPlan(dict(plan.itinerary, weather_info=weather_info), plan.planning, now, plan.expires_at)
+        if plan.expires_at > now:
+            self.plans.set(key, fresh, plan.expires_at - now)
+        return fresh
+
+    def clear(self):
+        self.plans.clear()
@@ -0,0 +1,245 @@
+"""Time-slot scheduling for itinerary days.
+
+Places each day's activities and restaurant into morning, afternoon and
+evening slots using Google opening_hours periods, a typical visit length
+per place type and an estimate of travel time between stops. Days are
+filled greedily; activities that do not fit (closed that weekday, no time
+left) are then repaired by moving or swapping them with another day.
+"""
+from datetime import datetime
+import logging
+
+from geo import haversine_km, has_coordinates
+
+logger = logging.getLogger(__name__)
+
+DAY_START = 9 * 60
+DAY_END = 22 * 60
+SLOTS = (('morning', 0, 12 * 60), ('afternoon', 12 * 60, 18 * 60), ('evening', 18 * 60, 24 * 60))
+MEAL_WINDOWS = (('dinner', 19 * 60, 21 * 60 + 30), ('lunch', 12 * 60 + 30, 14 * 60))
+MEAL_MINUTES = 75
+
+# Typical visit length in minutes, by the first matching place type
+VISIT_MINUTES = {
+    'amusement_park': 240, 'zoo': 180, 'museum': 150, 'aquarium': 120, 'art_gallery': 120,
+    'park': 90, 'church': 45, 'place_of_worship': 45, 'tourist_attraction': 90
+}
+DEFAULT_VISIT_MINUTES = 90
+
+# Urban door-to-door travel: fixed overhead plus average transit speed
+TRAVEL_OVERHEAD_MINUTES = 10
+TRAVEL_SPEED_KMH = 18
+DEFAULT_TRAVEL_MINUTES = 20
+ALWAYS_OPEN = ((0, 24 * 60),)
+
+
+def visit_minutes(place):
+    for place_type in place.get('types', []):
+        if place_type in VISIT_MINUTES:
+            return VISIT_MINUTES[place_type]
+    return DEFAULT_VISIT_MINUTES
+
+
+def travel_minutes(origin, destination):
+    """Estimated travel time between two stops; unknown coordinates get a flat default"""
+    if not has_coordinates(origin) or not has_coordinates(destination):
+        return DEFAULT_TRAVEL_MINUTES
+    distance = haversine_km(origin['lat'], origin['lng'], destination['lat'], destination['lng'])
+    return int(round(TRAVEL_OVERHEAD_MINUTES + distance / TRAVEL_SPEED_KMH * 60))
+
+
+def _to_minutes(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[2:4])
+
+
+def opening_intervals(place, google_weekday):
+    """Open intervals (minutes from midnight) on a Google weekday (0 = Sunday)"""
+    periods = (place.get('opening_hours') or {}).get('periods')
+    if not periods:
+        return ALWAYS_OPEN
+
+    intervals = []
+    for period in periods:
+        opens = period.get('open') or {}
+        closes = period.get('close')
+        if closes is None:
+            # Google encodes 24/7 places as a single open period with no close
+            return ALWAYS_OPEN
+        open_day, close_day = opens.get('day'), closes.get('day')
+        start, end = _to_minutes(opens.get('time', '0000')), _to_minutes(closes.get('time', '0000'))
+        if open_day == google_weekday:
+            intervals.append((start, end if close_day == open_day else 24 * 60))
+        elif close_day == google_weekday and close_day != open_day:
+            intervals.append((0, end))
+    return tuple(intervals)
+
+
+def _slot_name(minute):
+    for name, start, end in SLOTS:
+        if start <= minute < end:
+            return name
+    return 'evening'
+
+
+def _format(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _earliest_start(earliest, duration, intervals, busy, latest_end=DAY_END):
+    """Earliest start >= earliest that fits an open interval and avoids busy blocks"""
+    candidates = {earliest}
+    candidates.update(start for start, _ in intervals if start > earliest)
+    candidates.update(end + DEFAULT_TRAVEL_MINUTES for _, end in busy if end + DEFAULT_TRAVEL_MINUTES > earliest)
+    for start in sorted(candidates):
+        end = start + duration
+        if end > latest_end:
+            break
+        if not any(open_start <= start and end <= open_end for open_start, open_end in intervals):
+            continue
+        if any(start < busy_end + DEFAULT_TRAVEL_MINUTES and busy_start < end + DEFAULT_TRAVEL_MINUTES for busy_start, busy_end in busy):
+            continue
+        return start
+    return None
+
+
+class DayTimeline:
+    """Blocks placed on one itinerary day"""
+
+    def __init__(self, day_plan, origin):
+        date = datetime.strptime(day_plan['date'], "%Y-%m-%d")
+        self.google_weekday = (date.weekday() + 1) % 7
+        self.origin = origin
+        self.blocks = []  # (start, end, entry, place)
+        self._hours = {}
+
+    def intervals(self, place):
+        key = place.get('place_id') or place.get('name')
+        if key not in self._hours:
+            self._hours[key] = opening_intervals(place, self.google_weekday)
+        return self._hours[key]
+
+    def busy(self):
+        return [(start, end) for start, end, _, _ in self.blocks]
+
+    def place_meal(self, restaurant):
+        for meal, window_start, window_end in MEAL_WINDOWS:
+            start = _earliest_start(window_start, MEAL_MINUTES, self.intervals(restaurant), self.busy(), window_end + MEAL_MINUTES)
+            if start is not None:
+                self._add(start, MEAL_MINUTES, restaurant, {'type': 'meal', 'meal': meal})
+                return True
+        return False
+
+    def place_activity(self, activity):
+        """Append an activity after the last daytime stop, travelling from the previous one"""
+        previous = self.origin
+        earliest = DAY_START
+        for start, end, entry, place in self.blocks:
+            if entry['type'] == 'activity':
+                previous, earliest = place, end
+        earliest += travel_minutes(previous, activity)
+        start = _earliest_start(earliest, visit_minutes(activity), self.intervals(activity), self.busy())
+        if start is None:
+            return False
+        self._add(start, visit_minutes(activity), activity, {'type': 'activity', 'travel_minutes': travel_minutes(previous, activity)})
+        return True
+
+    def remove(self, place):
+        self.blocks = [block for block in self.blocks if block[3] is not place]
+
+    def _add(self, start, duration, place, entry):
+        entry.update({
+            'slot': _slot_name(start),
+            'start': _format(start),
+            'end': _format(start + duration),
+            'name': place.get('name', ''),
+            'place_id': place.get('place_id', '')
+        })
+        self.blocks.append((start, start + duration, entry, place))
+        self.blocks.sort(key=lambda block: block[0])
+
+    def schedule(self):
+        return [entry for _, _, entry, _ in self.blocks]
+
+
+def _nearest_neighbour_order(activities, origin):
+    remaining = list(activities)
+    ordered = []
+    current = origin
+    while remaining:
+        nearest = min(remaining, key=lambda place: travel_minutes(current, place))
+        remaining.remove(nearest)
+        ordered.append(nearest)
+        current = nearest
+    return ordered
+
+
+def _build_timeline(day_plan, origin):
+    timeline = DayTimeline(day_plan, origin)
+    if day_plan.get('restaurant'):
+        timeline.place_meal(day_plan['restaurant'])
+    unplaced = []
+    for activity in _nearest_neighbour_order(day_plan['activities'], origin):
+        if not timeline.place_activity(activity):
+            unplaced.append(activity)
+    return timeline, unplaced
+
+
+def _repair(itinerary, timelines, unplaced):
+    """Move or swap activities that did not fit their day; returns those still unplaced"""
+    still_unplaced = []
+    for day_index, activity in unplaced:
+        moved = False
+        # Other days by distance in the trip, nearest first
+        for other_index in sorted(range(len(itinerary)), key=lambda i: abs(i - day_index)):
+            if other_index == day_index:
+                continue
+            other_day = itinerary[other_index]
+            if timelines[other_index].place_activity(activity):
+                itinerary[day_index]['activities'].remove(activity)
+                other_day['activities'].append(activity)
+                moved = True
+                break
+            # Swap with an activity from the other day that fits this day instead
+            for candidate in list(other_day['activities']):
+                saved_other, saved_this = list(timelines[other_index].blocks), list(timelines[day_index].blocks)
+                timelines[other_index].remove(candidate)
+                if timelines[other_index].place_activity(activity) and timelines[day_index].place_activity(candidate):
+                    other_day['activities'].remove(candidate)
+                    other_day['activities'].append(activity)
+                    itinerary[day_index]['activities'].remove(activity)
+                    itinerary[day_index]['activities'].append(candidate)
+                    moved = True
+                    break
+                timelines[other_index].blocks, timelines[day_index].blocks = saved_other, saved_this
+            if moved:
+                break
+        if not moved:
+            still_unplaced.append((day_index, activity))
+    return still_unplaced
+
+
+def schedule_itinerary(itinerary, origin=None):
+    """Add a time-slotted 'schedule' to every day_plan in the itinerary, in place.
+
+    origin is where each day starts (e.g. the city centre or hotel) as a dict
+    with lat/lng. Activities the repair pass could not fit anywhere stay on
+    their day and are listed under 'unscheduled'.
+    """
+    timelines = []
+    unplaced = []
+    for day_index, day_plan in enumerate(itinerary):
+        timeline, day_unplaced = _build_timeline(day_plan, origin)
+        timelines.append(timeline)
+        unplaced.extend((day_index, activity) for activity in day_unplaced)
+
+    if unplaced:
+        unplaced = _repair(itinerary, timelines, unplaced)
+        if unplaced:
+            logger.info(f"{len(unplaced)} activities could not be fitted around opening hours")
+
+    for day_plan, timeline in zip(itinerary, timelines):
+        day_plan['schedule'] = timeline.schedule()
+        day_plan['unscheduled'] = []
+    for day_index, activity in unplaced:
+        itinerary[day_index]['unscheduled'].append(activity.get('name', ''))
+    return itinerary
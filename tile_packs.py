@@ -0,0 +1,337 @@
+"""Offline map tile packs for premium trips.
+
+A pack holds the slippy-map tiles covering a trip's places (their bounding
+box plus a margin) from zoom MIN_ZOOM up to the deepest zoom that keeps
+the pack under MAX_TILES_PER_PACK. Tiles come from TILE_SERVER_URL (an
+{z}/{x}/{y} template) through a small, bounded fetch pool. There is no
+default: public servers such as tile.openstreetmap.org forbid bulk
+prefetching for offline use, so offline maps stay off until a server that
+allows it (a commercial provider or your own) is configured.
+
+Fetched tiles live in a content-addressed store: blobs named by their
+SHA-256 and an index from (z, x, y) to the blob. Trips in the same city
+need mostly the same tiles, so later packs reuse the index instead of
+refetching, and identical tiles (open sea, parks) are stored once.
+Concurrent builds asking for the same tile share one fetch.
+
+Packs are written as MBTiles (SQLite, with the deduplicating map/images
+layout) or as a zip of {z}/{x}/{y}.png files, named by a hash of what they
+contain - the tile plan and the pack's name - so workers sharing the disk
+never hand one trip another trip's pack, and identical trips share a file.
+Packs nobody has downloaded for PACK_MAX_AGE are removed. Building runs in
+the background; the API answers 202 until it is done.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+import logging
+
+import requests
+
+from cache import SingleFlight, TTLCache
+from exports import trip_days, trip_hotels
+
+logger = logging.getLogger(__name__)
+
+TILE_SERVER_URL = os.environ.get('TILE_SERVER_URL')
+TILE_STORE_PATH = os.environ.get('TILE_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tiles'))
+# Tile servers ask for modest parallelism
+TILE_FETCH_CONCURRENCY = int(os.environ.get('TILE_FETCH_CONCURRENCY', 2))
+TILE_PACK_BUILDS = int(os.environ.get('TILE_PACK_BUILDS', 2))
+TILE_TIMEOUT = float(os.environ.get('TILE_TIMEOUT', 15))
+TILE_USER_AGENT = os.environ.get('TILE_USER_AGENT', 'TripCraft offline maps')
+# Stored tiles are reused for this long before being fetched again
+TILE_MAX_AGE = float(os.environ.get('TILE_MAX_AGE_DAYS', 30)) * 24 * 3600
+# Packs not downloaded for this long are deleted
+PACK_MAX_AGE = float(os.environ.get('TILE_PACK_MAX_AGE_DAYS', 7)) * 24 * 3600
+
+MIN_ZOOM = 10
+MAX_ZOOM = 16
+MAX_TILES_PER_PACK = int(os.environ.get('MAX_TILES_PER_PACK', 3000))
+MARGIN_KM = 1.0
+
+PACK_FORMATS = {'mbtiles': 'application/vnd.sqlite3', 'zip': 'application/zip'}
+
+
+# Tile maths
+
+def bounding_box(places, margin_km=MARGIN_KM):
+    """(south, west, north, east) around the located places, or None"""
+    located = [(place['lat'], place['lng']) for place in places
+               if place and place.get('lat') is not None and place.get('lng') is not None]
+    if not located:
+        return None
+    lats, lngs = [lat for lat, _ in located], [lng for _, lng in located]
+    lat_margin = margin_km / 111.32
+    lng_margin = margin_km / (111.32 * max(0.01, math.cos(math.radians(sum(lats) / len(lats)))))
+    return (max(-85.0511, min(lats) - lat_margin), max(-180.0, min(lngs) - lng_margin),
+            min(85.0511, max(lats) + lat_margin), min(180.0, max(lngs) + lng_margin))
+
+
+def tile_xy(lat, lng, zoom):
+    n = 2 ** zoom
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_for_zoom(bbox, zoom):
+    south, west, north, east = bbox
+    x_min, y_min = tile_xy(north, west, zoom)
+    x_max, y_max = tile_xy(south, east, zoom)
+    return [(zoom, x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)]
+
+
+def plan_tiles(bbox, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, limit=MAX_TILES_PER_PACK):
+    """Tiles from min_zoom down to the deepest zoom that keeps the pack within `limit`"""
+    tiles = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        level = tiles_for_zoom(bbox, zoom)
+        if tiles and len(tiles) + len(level) > limit:
+            break
+        tiles.extend(level)
+    return tiles
+
+
+def pack_digest(tiles, name):
+    """Hash naming a pack by its contents"""
+    material = name + '|' + ';'.join(f"{z}/{x}/{y}" for z, x, y in sorted(tiles))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:32]
+
+
+def trip_places(trip):
+    places = []
+    for day_plan in trip_days(trip):
+        places.extend(day_plan['activities'])
+        places.append(day_plan.get('restaurant'))
+    return places + trip_hotels(trip)
+
+
+# Content-addressed store
+
+class TileStore:
+    """Tile blobs by SHA-256 plus a (z, x, y) index, shared by every pack"""
+
+    def __init__(self, root=TILE_STORE_PATH):
+        self.root = root
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite'), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tiles (z INTEGER, x INTEGER, y INTEGER, hash TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, PRIMARY KEY (z, x, y)) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def lookup(self, z, x, y, max_age=TILE_MAX_AGE):
+        """Hash of a stored, fresh tile or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT hash, fetched_at FROM tiles WHERE z = ? AND x = ? AND y = ?", (z, x, y)).fetchone()
+        if row and time.time() - row[1] <= max_age and os.path.exists(self._blob_path(row[0])):
+            return row[0]
+        return None
+
+    def put(self, z, x, y, data):
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?)", (z, x, y, digest, time.time()))
+            self._conn.commit()
+        return digest
+
+    def read(self, digest):
+        with open(self._blob_path(digest), 'rb') as f:
+            return f.read()
+
+
+# Pack files
+
+def write_mbtiles(path, tiles, store, name):
+    """MBTiles 1.3 with the map/images layout, so repeated tiles are stored once"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE metadata (name TEXT, value TEXT);
+        CREATE TABLE images (tile_id TEXT PRIMARY KEY, tile_data BLOB);
+        CREATE TABLE map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT);
+        CREATE UNIQUE INDEX map_index ON map (zoom_level, tile_column, tile_row);
+        CREATE VIEW tiles AS SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+            map.tile_row AS tile_row, images.tile_data AS tile_data
+            FROM map JOIN images ON images.tile_id = map.tile_id;
+    """)
+    zooms = [z for z, _, _ in tiles]
+    conn.executemany("INSERT INTO metadata VALUES (?, ?)", [
+        ('name', name), ('format', 'png'), ('type', 'baselayer'), ('version', '1'),
+        ('minzoom', str(min(zooms))), ('maxzoom', str(max(zooms)))
+    ])
+    for digest in sorted(set(tiles.values())):
+        conn.execute("INSERT INTO images VALUES (?, ?)", (digest, store.read(digest)))
+    # MBTiles rows count from the south (TMS)
+    conn.executemany("INSERT INTO map VALUES (?, ?, ?, ?)",
+                     [(z, x, 2 ** z - 1 - y, digest) for (z, x, y), digest in tiles.items()])
+    conn.commit()
+    conn.close()
+
+
+def write_zip(path, tiles, store, name):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as pack:
+        for (z, x, y), digest in sorted(tiles.items()):
+            pack.writestr(f"{z}/{x}/{y}.png", store.read(digest))
+
+
+PACK_WRITERS = {'mbtiles': write_mbtiles, 'zip': write_zip}
+
+
+# Building
+
+class TilePackBuilder:
+    """Builds and keeps packs named by their contents; one builder per process"""
+
+    def __init__(self, store, tile_url=TILE_SERVER_URL, fetch_concurrency=TILE_FETCH_CONCURRENCY,
+                 builds=TILE_PACK_BUILDS, max_tiles=MAX_TILES_PER_PACK):
+        self.store = store
+        self.tile_url = tile_url
+        self.max_tiles = max_tiles
+        self.pack_dir = os.path.join(store.root, 'packs')
+        os.makedirs(self.pack_dir, exist_ok=True)
+        # Builds wait on fetches, so the two never share a pool
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_concurrency)
+        self.build_pool = ThreadPoolExecutor(max_workers=builds)
+        self._fetches = SingleFlight()
+        self._session = None
+        # Builds in progress; a finished one leaves its pack on disk or, when it failed, an error to report once
+        self._builds = {}
+        self._failures = TTLCache(max_entries=1024, default_ttl=600)
+        self._lock = threading.RLock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers['User-Agent'] = TILE_USER_AGENT
+        return self._session
+
+    def pack_path(self, digest, fmt):
+        return os.path.join(self.pack_dir, f"{digest}.{fmt}")
+
+    def prune(self, max_age=PACK_MAX_AGE):
+        """Delete packs (and abandoned partial files) untouched for max_age"""
+        cutoff = time.time() - max_age
+        for entry in os.scandir(self.pack_dir):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _tile(self, z, x, y):
+        """Hash of the tile, fetching it unless the store already has it"""
+        digest = self.store.lookup(z, x, y)
+        if digest:
+            return digest
+
+        def fetch():
+            response = self.session.get(self.tile_url.format(z=z, x=x, y=y), timeout=TILE_TIMEOUT)
+            response.raise_for_status()
+            return self.store.put(z, x, y, response.content)
+
+        return self._fetches.do((z, x, y), fetch)
+
+    def _build(self, trip_id, digest, needed, name, fmt, progress):
+        progress['tiles'] = len(needed)
+        started = time.perf_counter()
+
+        tiles = {}
+        futures = {tile: self.fetch_pool.submit(self._tile, *tile) for tile in needed}
+        for tile, future in futures.items():
+            tiles[tile] = future.result()
+            progress['done'] += 1
+
+        path = self.pack_path(digest, fmt)
+        # Another worker may be writing the same pack; each writes its own file and the last rename wins
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        PACK_WRITERS[fmt](temporary, tiles, self.store, name)
+        os.replace(temporary, path)
+        logger.info(f"Built {fmt} tile pack {digest} for {trip_id}: {len(tiles)} tiles, "
+                    f"{len(set(tiles.values()))} unique, {os.path.getsize(path)} bytes in {time.perf_counter() - started:.1f}s")
+        self.prune()
+        return path
+
+    def request(self, trip_id, version, trip, fmt):
+        """('ready', path), ('building', progress) or ('failed', message); starts a build if needed"""
+        bbox = bounding_box(trip_places(trip))
+        if bbox is None:
+            return 'failed', "This trip has no mapped places"
+        needed = plan_tiles(bbox, limit=self.max_tiles)
+        name = trip.get('destination', trip_id)
+        digest = pack_digest(needed, name)
+        path = self.pack_path(digest, fmt)
+        if os.path.exists(path):
+            # Downloads keep a pack from being pruned
+            os.utime(path)
+            return 'ready', path
+
+        key = (digest, fmt)
+        with self._lock:
+            error = self._failures.get(key)
+            if error is not None:
+                # Report the failure once, then let the next request try again
+                self._failures.delete(key)
+            else:
+                build = self._builds.get(key)
+                if build is None:
+                    progress = {'tiles': None, 'done': 0, 'started_at': datetime.now().isoformat(timespec='seconds')}
+                    future = self.build_pool.submit(self._build, trip_id, digest, needed, name, fmt, progress)
+                    build = self._builds[key] = {'future': future, 'progress': progress}
+                    future.add_done_callback(lambda done: self._finished(key, done))
+
+        if error is None:
+            future = build['future']
+            # A failure is reported from _failures once _finished has recorded it
+            if future.done() and future.exception() is None:
+                return 'ready', future.result()
+            return 'building', dict(build['progress'])
+        logger.error(f"Tile pack for {trip_id} v{version} failed: {error}")
+        return 'failed', "Map tiles could not be downloaded"
+
+    def _finished(self, key, future):
+        """Forget a finished build; only a failure is kept, until it has been reported"""
+        with self._lock:
+            self._builds.pop(key, None)
+            if future.exception() is not None:
+                self._failures.set(key, future.exception())
+
+
+_builder = None
+_builder_lock = threading.Lock()
+
+
+def get_tile_pack_builder():
+    """The process's builder, or None when no TILE_SERVER_URL is configured"""
+    global _builder
+    if _builder is None:
+        if not TILE_SERVER_URL:
+            return None
+        with _builder_lock:
+            if _builder is None:
+                _builder = TilePackBuilder(TileStore())
+    return _builder
+
+
+def reset_tile_pack_builder():
+    """Forget the builder after a fork; its pools and connections belong to the parent"""
+    global _builder
+    _builder = None
@@ -0,0 +1,182 @@
+"""Incremental edits to stored trips.
+
+/generate keeps a signed-in user's candidate pools and cost context with
+the trip ('planning'), so replacing a day, rerolling one place or adding
+days only re-runs the budget optimizer over the candidates not already in
+the plan. No geocoding, Places searches or AI calls are repeated; the
+caller reschedules just the days returned as changed.
+"""
+import itertools
+from datetime import datetime, timedelta
+
+from budget_optimizer import optimize_selection, place_cost
+from compact import place_key
+from cost_model import ACTIVITIES_PER_DAY, DINNER_SHARE, estimate_trip_costs
+from place_scoring import place_value
+
+MAX_TRIP_DAYS = 30
+EDIT_KINDS = ('activity', 'restaurant')
+
+
+def new_planning(candidates, cost_request, trip_costs, price_tables, origin, city, start_date, booking_links=True):
+    """Everything an edit needs to build days without going back upstream; start_date dates day 1"""
+    planning = {
+        'candidates': candidates,
+        'cost_request': cost_request,
+        'price_tables': price_tables,
+        'origin': origin,
+        'city': city,
+        'start_date': start_date,
+        'people': cost_request['people'],
+        'booking_links': booking_links
+    }
+    set_daily_costs(planning, trip_costs)
+    return planning
+
+
+def set_daily_costs(planning, trip_costs):
+    """Lodging and non-dinner food per day; the day's restaurant pays for dinner"""
+    planning['lodging'] = trip_costs['lodging']
+    planning['fixed_food'] = [food * (1 - DINNER_SHARE) for food in trip_costs['food']]
+
+
+def fixed_cost(planning, day):
+    return planning['lodging'][day - 1] + planning['fixed_food'][day - 1]
+
+
+def planned_keys(itinerary):
+    keys = set()
+    for day_plan in itinerary:
+        keys.update(place_key(activity) for activity in day_plan['activities'])
+        if day_plan['restaurant']:
+            keys.add(place_key(day_plan['restaurant']))
+    return keys
+
+
+def _unused(pool, used):
+    return [place for place in pool if place_key(place) not in used]
+
+
+def _find_day(trip_data, day):
+    for index, day_plan in enumerate(trip_data['itinerary']):
+        if day_plan['day'] == day:
+            return index
+    raise ValueError(f"Day {day} is not part of this trip")
+
+
+def _places_budget(trip_data, planning, days):
+    """Money left for places on `days` once the rest of the trip and their fixed costs are paid"""
+    other_days = sum(day_plan['estimated_cost'] for day_plan in trip_data['itinerary'] if day_plan['day'] not in days)
+    return trip_data['budget'] - other_days - sum(fixed_cost(planning, day) for day in days)
+
+
+def _select(planning, used, activity_slots, meal_slots, budget):
+    candidates = planning['candidates']
+    return optimize_selection(
+        _unused(candidates['activities'], used), _unused(candidates['restaurants'], used),
+        activity_slots=activity_slots, meal_slots=meal_slots,
+        budget=budget, people=planning['people'], price_tables=planning['price_tables'],
+        value=place_value
+    )
+
+
+def _candidate_index(planning):
+    index = {}
+    for pool in planning['candidates'].values():
+        for place in pool:
+            index.setdefault(place_key(place), place)
+    return index
+
+
+def replace_day(trip_data, planning, day, build_day):
+    """Plan `day` again from places not used anywhere in the trip"""
+    index = _find_day(trip_data, day)
+    used = planned_keys(trip_data['itinerary'])
+    selection = _select(planning, used, ACTIVITIES_PER_DAY, 1, _places_budget(trip_data, planning, {day}))
+    if not selection['activities'] and not selection['restaurants']:
+        raise ValueError("No unused places left to plan this day with")
+
+    restaurant = selection['restaurants'][0] if selection['restaurants'] else None
+    day_plan = build_day(day, selection['activities'], restaurant, planning)
+    trip_data['itinerary'][index] = day_plan
+    return [day_plan]
+
+
+def reroll_place(trip_data, planning, day, kind, position, build_day):
+    """Swap one activity (by position) or the restaurant of `day` for the best unused alternative"""
+    if kind not in EDIT_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(EDIT_KINDS)}")
+    index = _find_day(trip_data, day)
+    current = trip_data['itinerary'][index]
+    places = _candidate_index(planning)
+    activities = [places.get(place_key(activity), activity) for activity in current['activities']]
+    restaurant = places.get(place_key(current['restaurant']), current['restaurant']) if current['restaurant'] else None
+
+    if kind == 'activity':
+        if not 0 <= position < len(activities):
+            raise ValueError(f"Day {day} has no activity at position {position}")
+        kept = activities[:position] + activities[position + 1:]
+        kept_cost = sum(place_cost(place, planning['price_tables']['activities'], planning['people']) for place in kept)
+        if restaurant:
+            kept_cost += place_cost(restaurant, planning['price_tables']['meals'], planning['people'])
+    else:
+        if not restaurant:
+            raise ValueError(f"Day {day} has no restaurant to reroll")
+        kept = activities
+        kept_cost = sum(place_cost(place, planning['price_tables']['activities'], planning['people']) for place in kept)
+
+    budget = _places_budget(trip_data, planning, {day}) - kept_cost
+    used = planned_keys(trip_data['itinerary'])
+    if kind == 'activity':
+        chosen = _select(planning, used, 1, 0, budget)['activities']
+        if not chosen:
+            raise ValueError("No other activity left to swap in")
+        activities = kept[:position] + chosen + kept[position:]
+    else:
+        chosen = _select(planning, used, 0, 1, budget)['restaurants']
+        if not chosen:
+            raise ValueError("No other restaurant left to swap in")
+        restaurant = chosen[0]
+
+    day_plan = build_day(day, activities, restaurant, planning)
+    trip_data['itinerary'][index] = day_plan
+    return [day_plan]
+
+
+def extend_trip(trip_data, planning, extra_days, build_day):
+    """Append `extra_days` days planned from the unused candidates"""
+    current_days = len(trip_data['itinerary'])
+    total_days = current_days + extra_days
+    if extra_days < 1 or total_days > MAX_TRIP_DAYS:
+        raise ValueError(f"Trips can have between 1 and {MAX_TRIP_DAYS} days")
+
+    trip_costs = estimate_trip_costs([dict(planning['cost_request'], days=total_days)])[0]
+    set_daily_costs(planning, trip_costs)
+    planning['cost_request']['days'] = total_days
+
+    new_days = range(current_days + 1, total_days + 1)
+    used = planned_keys(trip_data['itinerary'])
+    selection = _select(planning, used, extra_days * ACTIVITIES_PER_DAY, extra_days,
+                        _places_budget(trip_data, planning, set(new_days)))
+
+    activities = iter(selection['activities'])
+    restaurants = iter(selection['restaurants'])
+    added = []
+    for day in new_days:
+        day_plan = build_day(day, list(itertools.islice(activities, ACTIVITIES_PER_DAY)), next(restaurants, None), planning)
+        trip_data['itinerary'].append(day_plan)
+        added.append(day_plan)
+
+    trip_data['total_days'] = total_days
+    trip_data['daily_budget'] = round(trip_data['budget'] / total_days, 2)
+    if trip_data.get('check_in_date'):
+        check_in = datetime.strptime(trip_data['check_in_date'], "%Y-%m-%d")
+        trip_data['check_out_date'] = (check_in + timedelta(days=total_days)).strftime("%Y-%m-%d")
+    return added
+
+
+def update_totals(trip_data):
+    total_estimated_cost = sum(day_plan['estimated_cost'] for day_plan in trip_data['itinerary'])
+    trip_data['total_estimated_cost'] = round(total_estimated_cost, 2)
+    trip_data['budget_status'] = "Within Budget" if total_estimated_cost <= trip_data['budget'] else "Over Budget"
+    return trip_data
@@ -0,0 +1,108 @@
+"""Saved trips with a per-user index.
+
+Trips are still held in memory by id, but each user also has an index of
+(created_at, sequence) keys kept in order, so listing someone's trips is
+a binary search to the cursor plus one step per trip returned - the size
+of the store never matters. Listings return summaries kept alongside each
+trip, so a page of history never touches itinerary_data.
+
+Cursors are opaque tokens for the last key of the previous page (keyset
+pagination), so trips saved while a client pages through stay out of the
+pages it has not reached yet instead of shifting them.
+"""
+import base64
+import bisect
+import itertools
+import threading
+
+MAX_PAGE_SIZE = 100
+
+SUMMARY_FIELDS = ('destination', 'days', 'budget', 'created_at', 'updated_at', 'version')
+
+
+def encode_cursor(key):
+    created, sequence = key
+    return base64.urlsafe_b64encode(f"{created!r}:{sequence}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Index key from a cursor; ValueError when it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created, sequence = raw.split(':')
+        return float(created), int(sequence)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def summarize(trip_id, trip):
+    """The listing projection of a trip record"""
+    itinerary = trip['itinerary_data']
+    summary = {field: trip.get(field) for field in SUMMARY_FIELDS}
+    summary.update({
+        'trip_id': trip_id,
+        'multi_city': bool(itinerary.get('multi_city')),
+        'total_estimated_cost': itinerary.get('total_estimated_cost'),
+        'check_in_date': itinerary.get('check_in_date'),
+        'editable': bool(trip.get('planning'))
+    })
+    return summary
+
+
+class TripStore:
+    """Trip records by id, with summaries and per-user keyset indexes"""
+
+    def __init__(self):
+        self._trips = {}
+        self._summaries = {}
+        # user_id -> ascending [(created_at timestamp, sequence)] and the trip id for each key
+        self._index = {}
+        self._ids = {}
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._trips)
+
+    def __contains__(self, trip_id):
+        return trip_id in self._trips
+
+    def __getitem__(self, trip_id):
+        return self._trips[trip_id]
+
+    def get(self, trip_id, default=None):
+        return self._trips.get(trip_id, default)
+
+    def add(self, record):
+        """Save a new trip record (with user_id and created_at); returns its trip_id"""
+        with self._lock:
+            sequence = next(self._sequence)
+            trip_id = f"trip_{sequence}"
+            key = (record['created_at'].timestamp(), sequence)
+            self._trips[trip_id] = record
+            self._summaries[trip_id] = summarize(trip_id, record)
+            bisect.insort(self._index.setdefault(record['user_id'], []), key)
+            self._ids[key] = trip_id
+        return trip_id
+
+    def refresh(self, trip_id):
+        """Rebuild a trip's summary after its record changed"""
+        with self._lock:
+            self._summaries[trip_id] = summarize(trip_id, self._trips[trip_id])
+
+    def summary(self, trip_id):
+        return self._summaries.get(trip_id)
+
+    def count_for_user(self, user_id):
+        return len(self._index.get(user_id, ()))
+
+    def list_for_user(self, user_id, limit=20, cursor=None):
+        """(summaries newest first, next cursor or None)"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        with self._lock:
+            keys = self._index.get(user_id, [])
+            end = bisect.bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+            page = keys[max(0, end - limit):end][::-1]
+            summaries = [dict(self._summaries[self._ids[key]]) for key in page]
+        next_cursor = encode_cursor(page[-1]) if page and end - limit > 0 else None
+        return summaries, next_cursor